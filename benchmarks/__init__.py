@@ -0,0 +1,23 @@
+"""
+Benchmarks for dbtools
+
+This package measures how the dbtools functions scale with the size of the
+database. It builds a throwaway PostgreSQL database from sql/database.sql,
+fills it with synthetic data at a configurable scale factor, times the public
+functions and writes the results to a JSON report that can be compared with
+the report of another run. benchmarks.micro times the DataFrame functions on
+synthetic frames alone, without a database, benchmarks.load_test drives
+the web interface with concurrent simulated users and benchmarks.imports
+measures the import time of the package.
+
+Usage:
+    python -m benchmarks.run --scale 1 --output report.json
+    python -m benchmarks.compare baseline.json report.json
+    python -m benchmarks.micro --sizes 1000 10000 100000
+    python -m benchmarks.load_test --users 8 --duration 60
+    python -m benchmarks.imports
+
+The PostgreSQL server and credentials are read from the same .env file as
+dbtools.connect(); the user needs the CREATEDB privilege. The benchmarks are
+not installed with the dbtools package.
+"""
@@ -0,0 +1,91 @@
+"""
+Benchmark Report Comparison
+
+Compares two JSON reports written by benchmarks.run and flags the benchmarks
+that got slower than a threshold. The exit status is 1 when there is any
+regression, so the comparison can gate a CI job.
+
+Usage:
+    python -m benchmarks.compare baseline.json report.json [--threshold 0.1]
+"""
+
+import argparse
+import json
+import sys
+
+# Relative slowdown of the median time above which a benchmark is a regression
+DEFAULT_THRESHOLD = 0.1
+
+
+def compare(baseline, report, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare the results of two benchmark reports.
+
+    Parameters:
+    -----------
+    baseline : dict
+        The reference report.
+    report : dict
+        The report to compare with the reference.
+    threshold : float
+        Relative slowdown above which a benchmark is flagged (0.1 = 10% slower).
+
+    Returns:
+    --------
+    list
+        One dict per benchmark present in both reports with the name, the
+        median seconds of both runs, the time ratio (report / baseline), the
+        peak memory of both runs and a 'regression' flag.
+    """
+    rows = []
+    for name, new in report['results'].items():
+        old = baseline['results'].get(name)
+        if old is None or 'error' in old or 'error' in new:
+            continue
+        ratio = new['seconds_median'] / old['seconds_median'] if old['seconds_median'] > 0 else float('inf')
+        rows.append({
+            'name': name,
+            'baseline_seconds': old['seconds_median'],
+            'seconds': new['seconds_median'],
+            'ratio': ratio,
+            'baseline_peak_memory_mb': old.get('peak_memory_mb'),
+            'peak_memory_mb': new.get('peak_memory_mb'),
+            'regression': ratio > 1 + threshold,
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two dbtools benchmark reports.")
+    parser.add_argument('baseline', help="reference report")
+    parser.add_argument('report', help="report to compare")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown flagged as a regression (default 0.1)")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.report) as f:
+        report = json.load(f)
+
+    if baseline.get('scale') != report.get('scale'):
+        print(f"Warning: the reports use different scale factors ({baseline.get('scale')} and {report.get('scale')})")
+
+    rows = compare(baseline, report, args.threshold)
+
+    print(f"{'benchmark':<50} {'baseline ms':>12} {'ms':>10} {'ratio':>7} {'MB':>8}")
+    for row in rows:
+        flag = '  SLOWER' if row['regression'] else ''
+        memory = '' if row['peak_memory_mb'] is None else f"{row['peak_memory_mb']:.1f}"
+        print(f"{row['name']:<50} {row['baseline_seconds'] * 1000:>12.1f} {row['seconds'] * 1000:>10.1f}"
+              f" {row['ratio']:>7.2f} {memory:>8}{flag}")
+
+    regressions = [row['name'] for row in rows if row['regression']]
+    if regressions:
+        print(f"{len(regressions)} benchmarks are more than {args.threshold:.0%} slower: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Throwaway benchmark databases
+
+Functions to create a database with the schema of sql/database.sql and the
+migrations of sql/migrations, point dbtools at it and drop it when the
+benchmarks are done.
+"""
+
+import os
+import re
+import time
+from pathlib import Path
+
+import psycopg2
+from psycopg2 import sql
+
+import dbtools as dbt
+
+# Schema dump of the production database
+SCHEMA_PATH = Path(__file__).resolve().parent.parent / 'sql' / 'database.sql'
+
+# Migrations applied to the production database after the dump, in file name order
+MIGRATIONS_PATH = Path(__file__).resolve().parent.parent / 'sql' / 'migrations'
+
+# Statements of the dump that depend on the roles, extensions or server
+# version of the production server and are not needed to benchmark
+_SKIPPED_STATEMENTS = re.compile(
+    r"^(ALTER .* OWNER TO|GRANT |REVOKE |ALTER DEFAULT PRIVILEGES|SET transaction_timeout"
+    r"|CREATE SCHEMA pgagent|COMMENT ON SCHEMA pgagent)",
+    re.DOTALL,
+)
+
+
+def schema_statements(schema_path=SCHEMA_PATH):
+    """
+    Read the schema dump and split it into the statements to execute.
+
+    Parameters:
+    -----------
+    schema_path : str or Path
+        Path to the plain-text pg_dump of the schema.
+
+    Returns:
+    --------
+    list
+        List of SQL statements without comments, owners and privileges.
+    """
+    text = Path(schema_path).read_text(encoding='utf-8')
+    lines = [line for line in text.splitlines() if line.strip() and not line.startswith('--')]
+
+    statements = []
+    for statement in '\n'.join(lines).split(';\n'):
+        statement = statement.strip().rstrip(';')
+        if statement and not _SKIPPED_STATEMENTS.match(statement):
+            statements.append(statement)
+    return statements
+
+
+def _server_connection():
+    """Connect to the maintenance database of the server configured for dbtools."""
+    credentials = dbt.load_credentials()
+    conn = psycopg2.connect(
+        host=credentials['host'],
+        database='postgres',
+        user=credentials['user'],
+        password=credentials['password'])
+    # CREATE/DROP DATABASE cannot run inside a transaction
+    conn.autocommit = True
+    return conn
+
+
+def create_database(name=None, schema_path=SCHEMA_PATH):
+    """
+    Create a database with the dbtools schema and migrations and make dbtools.connect() use it.
+
+    Parameters:
+    -----------
+    name : str, optional
+        Name of the database. Defaults to 'dbtools_bench_<timestamp>'.
+    schema_path : str or Path
+        Path to the schema dump.
+
+    Returns:
+    --------
+    str
+        The name of the created database.
+    """
+    if name is None:
+        name = f"dbtools_bench_{int(time.time())}"
+
+    conn = _server_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(name)))
+        cursor.close()
+    finally:
+        conn.close()
+
+    # dbtools reads DB_NAME from the environment, which takes precedence over .env
+    os.environ['DB_NAME'] = name
+
+    conn = dbt.connect()
+    try:
+        cursor = conn.cursor()
+        for statement in schema_statements(schema_path):
+            cursor.execute(statement)
+        for migration_path in sorted(MIGRATIONS_PATH.glob('*.sql')):
+            for statement in schema_statements(migration_path):
+                cursor.execute(statement)
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+    return name
+
+
+def drop_database(name):
+    """
+    Drop a benchmark database.
+
+    Parameters:
+    -----------
+    name : str
+        Name of the database created by create_database.
+    """
+    conn = _server_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(name)))
+        cursor.close()
+    finally:
+        conn.close()
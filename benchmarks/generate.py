@@ -0,0 +1,259 @@
+"""
+Synthetic Data Generator
+
+Fills a benchmark database with materials, panels, samples, measurements,
+registrations, datasets, experiments, models and their metadata. The number of
+rows of every table grows linearly with the scale factor, and the shape of the
+data (samples per panel, measurements per sample, metadata keys per entity)
+follows the production database.
+
+Rows are inserted in bulk with execute_values, so generating the data takes a
+small fraction of the time of the benchmarks themselves.
+"""
+
+import json
+import random
+
+from psycopg2.extras import execute_values
+
+# Rows generated per unit of scale factor
+ROWS_PER_SCALE = {
+    'materials': 2,
+    'panels': 20,
+    'samples': 200,
+    'datasets': 10,
+    'experiments': 2,
+}
+
+# Samples per panel, measurements per sample and registrations per dataset
+SAMPLES_PER_PANEL = 10
+DERIVED_FRACTION = 0.1
+REGISTRATIONS_PER_DATASET = 20
+DATASETS_PER_EXPERIMENT = 5
+MODELS_PER_EXPERIMENT = 2
+
+# Metadata keys generated for every entity of a table, besides the ones the loaders add
+DEFAULT_EXTRA_KEYS = 4
+
+
+def _insert(cursor, table_name, columns, rows):
+    """
+    Insert many rows at once and return their ids in insertion order.
+
+    Parameters:
+    -----------
+    cursor : psycopg2.cursor
+        An active database cursor object.
+    table_name : str
+        The name of the table.
+    columns : list
+        The column names.
+    rows : list
+        List of tuples of values, one per row.
+
+    Returns:
+    --------
+    list
+        The ids of the inserted rows.
+    """
+    if not rows:
+        return []
+    query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES %s RETURNING id"
+    return [row[0] for row in execute_values(cursor, query, rows, page_size=1000, fetch=True)]
+
+
+def _insert_metadata(cursor, table_name, ids, make_metadata, extra_keys, rng):
+    """
+    Insert the metadata of the entities of a table.
+
+    Parameters:
+    -----------
+    cursor : psycopg2.cursor
+        An active database cursor object.
+    table_name : str
+        The name of the main table (e.g. 'samples').
+    ids : list
+        The ids of the entities.
+    make_metadata : callable
+        Function returning the list of (key, value, type) tuples of an entity from its position.
+    extra_keys : int
+        Number of additional random numeric keys per entity.
+    rng : random.Random
+        Random number generator.
+
+    Returns:
+    --------
+    int
+        The number of metadata rows inserted.
+    """
+    rows = []
+    for position, row_id in enumerate(ids):
+        for key, value, value_type in make_metadata(position):
+            rows.append((row_id, key, str(value), value_type))
+        for k in range(extra_keys):
+            rows.append((row_id, f"extra_{k}", str(round(rng.uniform(0, 100), 3)), 'float'))
+
+    metadata_table_name = table_name[:-1] + '_metadata'
+    execute_values(cursor, f"INSERT INTO {metadata_table_name} ({table_name[:-1]}_id, key, value, type) VALUES %s",
+                   rows, page_size=5000)
+    return len(rows)
+
+
+def generate(conn, scale=1, extra_keys=DEFAULT_EXTRA_KEYS, seed=0):
+    """
+    Fill the database with synthetic data.
+
+    Parameters:
+    -----------
+    conn : psycopg2.connection
+        Connection to an empty benchmark database.
+    scale : int or float
+        Scale factor. Scale 1 generates 200 samples and 440 measurements.
+    extra_keys : int
+        Number of additional metadata keys per entity.
+    seed : int
+        Seed of the random number generator, so runs are reproducible.
+
+    Returns:
+    --------
+    dict
+        Number of rows generated per table.
+    """
+    assert scale > 0, "scale must be positive"
+
+    rng = random.Random(seed)
+    counts = {}
+
+    def count(table_name):
+        return max(1, int(round(ROWS_PER_SCALE[table_name] * scale)))
+
+    cursor = conn.cursor()
+    conn.autocommit = False  # Start transaction
+
+    fabrication_ids = _insert(cursor, 'fabrications', ['name', 'description'],
+                              [(f"fabrication_{i}", 'synthetic') for i in range(3)])
+    measurementtype_ids = _insert(cursor, 'measurementtypes', ['name', 'description'],
+                                  [('UT', 'Ultrasonic testing'), ('XCT', 'X-ray computed tomography')])
+    datasettype_ids = _insert(cursor, 'datasettypes', ['description'],
+                              [('segmentation',), ('regression',)])
+    counts.update(fabrications=len(fabrication_ids), measurementtypes=len(measurementtype_ids),
+                  datasettypes=len(datasettype_ids))
+
+    # Materials and panels
+    material_ids = _insert(cursor, 'materials', ['name'], [(f"material_{i}",) for i in range(count('materials'))])
+    counts['materials'] = len(material_ids)
+    counts['material_metadata'] = _insert_metadata(
+        cursor, 'materials', material_ids, lambda i: [('layer_thickness', 0.125 + 0.05 * (i % 3), 'mm')], extra_keys, rng)
+
+    n_panels = count('panels')
+    panel_ids = _insert(cursor, 'panels', ['name', 'material_id', 'fabrication_id'],
+                        [(f"panel_{i}", material_ids[i % len(material_ids)], fabrication_ids[i % len(fabrication_ids)])
+                         for i in range(n_panels)])
+    counts['panels'] = len(panel_ids)
+    counts['panel_metadata'] = _insert_metadata(
+        cursor, 'panels', panel_ids,
+        lambda i: [('height', 300, 'mm'), ('width', 300, 'mm'), ('thickness', 4.5, 'mm'),
+                   ('layer_layout', json.dumps([0, 45, 90, -45]), 'json')], extra_keys, rng)
+
+    # Samples
+    n_samples = max(count('samples'), len(panel_ids))
+    sample_names = [f"sample_{i}" for i in range(n_samples)]
+    sample_ids = _insert(cursor, 'samples', ['name', 'panel_id'],
+                         [(name, panel_ids[(i // SAMPLES_PER_PANEL) % len(panel_ids)])
+                          for i, name in enumerate(sample_names)])
+    counts['samples'] = len(sample_ids)
+    counts['sample_metadata'] = _insert_metadata(
+        cursor, 'samples', sample_ids,
+        lambda i: [('height', 150, 'mm'), ('width', 25, 'mm'), ('thickness', 4.5, 'mm'),
+                   ('keyhole', bool(i % 2), 'bool'), ('parallel_faces', True, 'bool')], extra_keys, rng)
+
+    # One UT and one XCT measurement per sample, and some derived measurements
+    measurement_rows = []
+    measurement_samples = []
+    for i, sample_id in enumerate(sample_ids):
+        for kind, measurementtype_id in zip(('ut', 'xct'), measurementtype_ids):
+            measurement_rows.append((f"/data/{kind}/{sample_names[i]}.tif", None, measurementtype_id))
+            measurement_samples.append(sample_id)
+    measurement_ids = _insert(cursor, 'measurements', ['file_path', 'parent_measurement_id', 'measurementtype_id'],
+                              measurement_rows)
+
+    n_derived = int(len(measurement_ids) * DERIVED_FRACTION)
+    parents = rng.sample(range(len(measurement_ids)), n_derived)
+    derived_rows = [(measurement_rows[p][0].replace('.tif', '_derived.tif'), measurement_ids[p], measurement_rows[p][2])
+                    for p in parents]
+    measurement_ids += _insert(cursor, 'measurements', ['file_path', 'parent_measurement_id', 'measurementtype_id'],
+                               derived_rows)
+    measurement_samples += [measurement_samples[p] for p in parents]
+    counts['measurements'] = len(measurement_ids)
+
+    def measurement_metadata(i):
+        metadata = [('height', 512, 'int'), ('width', 512, 'int'), ('depth', 1024, 'int'),
+                    ('dtype', 'uint16', 'string'), ('file_type', '.tif', 'string'),
+                    ('axes_order', json.dumps(['z', 'y', 'x']), 'json')]
+        if i % 2 == 0:
+            metadata.append(('signal_type', 'Amplitude', 'string'))
+        else:
+            metadata += [('aligned', False, 'bool'), ('equalized', False, 'bool')]
+        return metadata
+
+    counts['measurement_metadata'] = _insert_metadata(
+        cursor, 'measurements', measurement_ids, measurement_metadata, extra_keys, rng)
+
+    counts['sample_measurements'] = len(_insert(cursor, 'sample_measurements', ['sample_id', 'measurement_id'],
+                                                list(zip(measurement_samples, measurement_ids))))
+
+    # Registrations of the XCT measurement of each sample onto its UT measurement
+    identity = json.dumps([[1, 0, 0], [0, 1, 0], [0, 0, 1]])
+    registration_ids = _insert(cursor, 'registrations',
+                               ['reference_measurement_id', 'registered_measurement_id', 'registration_matrix'],
+                               [(measurement_ids[2 * i], measurement_ids[2 * i + 1], identity)
+                                for i in range(len(sample_ids))])
+    counts['registrations'] = len(registration_ids)
+    counts['registration_metadata'] = _insert_metadata(
+        cursor, 'registrations', registration_ids,
+        lambda i: [('registration_type', 'rigid', 'string'), ('axes', json.dumps(['z', 'y', 'x']), 'json')],
+        extra_keys, rng)
+
+    # Datasets built from groups of registrations
+    dataset_ids = _insert(cursor, 'datasets', ['file_path', 'description', 'datasettype_id'],
+                          [(f"/data/datasets/dataset_{i}.h5", 'synthetic', datasettype_ids[i % len(datasettype_ids)])
+                           for i in range(count('datasets'))])
+    counts['datasets'] = len(dataset_ids)
+    counts['dataset_metadata'] = _insert_metadata(
+        cursor, 'datasets', dataset_ids,
+        lambda i: [('rows', 10000, 'int'), ('patch_size', '64x64', 'string'),
+                   ('targets', json.dumps(['porosity']), 'json')], extra_keys, rng)
+    counts['dataset_registrations'] = len(_insert(
+        cursor, 'dataset_registrations', ['dataset_id', 'registration_id'],
+        [(dataset_id, registration_id)
+         for dataset_id in dataset_ids
+         for registration_id in rng.sample(registration_ids, min(REGISTRATIONS_PER_DATASET, len(registration_ids)))]))
+
+    # Experiments over groups of datasets, and their models
+    experiment_ids = _insert(cursor, 'experiments', ['folder_path', 'description'],
+                             [(f"/data/experiments/experiment_{i}", 'synthetic') for i in range(count('experiments'))])
+    counts['experiments'] = len(experiment_ids)
+    counts['experiment_metadata'] = _insert_metadata(
+        cursor, 'experiments', experiment_ids, lambda i: [('author', 'benchmark', 'string')], 0, rng)
+    counts['experiment_datasets'] = len(_insert(
+        cursor, 'experiment_datasets', ['experiment_id', 'dataset_id'],
+        [(experiment_id, dataset_id)
+         for experiment_id in experiment_ids
+         for dataset_id in rng.sample(dataset_ids, min(DATASETS_PER_EXPERIMENT, len(dataset_ids)))]))
+
+    model_ids = _insert(cursor, 'models', ['experiment_id', 'model_folder_path', 'description'],
+                        [(experiment_id, f"/data/experiments/experiment_{i}/model_{m}", 'synthetic')
+                         for i, experiment_id in enumerate(experiment_ids) for m in range(MODELS_PER_EXPERIMENT)])
+    counts['models'] = len(model_ids)
+    counts['model_metadata'] = _insert_metadata(
+        cursor, 'models', model_ids, lambda i: [('architecture', 'unet', 'string')], 0, rng)
+
+    conn.commit()
+
+    # Fresh statistics so the planner behaves as on a long-lived database
+    conn.autocommit = True
+    cursor.execute("ANALYZE")
+    conn.autocommit = False
+    cursor.close()
+
+    return counts
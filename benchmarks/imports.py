@@ -0,0 +1,184 @@
+"""
+Import-time Benchmark
+
+Measures how long importing dbtools and its modules takes in a fresh Python
+interpreter, and which third-party modules each import pulls in. Scripts and
+the web server pay this time at every start, so `import dbtools` must stay
+cheap: it may not import any of HEAVY_MODULES, which the package only loads on
+first use.
+
+Each target is imported repeat times, every time in a new interpreter. The
+report gives the median time of each import, the number of modules it loaded,
+the heavy modules among them and the slowest modules according to
+`python -X importtime`. The exit status is 1 when `import dbtools` exceeds the
+time budget or imports a heavy module, so the benchmark can gate a CI job.
+
+Usage:
+    python -m benchmarks.imports [--repeat 5] [--budget 0.1] [--output imports.json]
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+REPORT_VERSION = 1
+
+# Modules imported by each benchmark
+DEFAULT_TARGETS = ['dbtools', 'dbtools.load', 'dbtools.delete', 'dbtools.export', 'dbtools.tracing']
+
+# Modules that `import dbtools` must not load
+HEAVY_MODULES = ('pandas', 'numpy', 'psycopg2', 'dotenv')
+
+# Time budget of `import dbtools`, in seconds
+DEFAULT_BUDGET = 0.1
+
+# Number of slowest modules kept per import
+TOP_MODULES = 10
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Run in the fresh interpreter: time the import and list the modules it loaded
+_PROBE = """
+import importlib, json, sys, time
+before = set(sys.modules)
+start = time.perf_counter()
+importlib.import_module({target!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'modules': sorted(set(sys.modules) - before)}}))
+"""
+
+
+def _parse_importtime(stderr, modules):
+    """
+    Cumulative import time of the given modules from the output of -X importtime.
+
+    Returns:
+    --------
+    list
+        (module, seconds) tuples, slowest first.
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        if name in modules:
+            times[name] = int(parts[1]) / 1e6
+    return sorted(times.items(), key=lambda item: item[1], reverse=True)
+
+
+def measure(target, repeat=5):
+    """
+    Time the import of a module in fresh interpreters.
+
+    Parameters:
+    -----------
+    target : str
+        Name of the module to import.
+    repeat : int
+        Number of interpreters started.
+
+    Returns:
+    --------
+    dict
+        Median and minimum seconds, number of modules loaded, heavy modules
+        loaded and the slowest modules of the import.
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', _PROBE.format(target=target)],
+            cwd=ROOT, capture_output=True, text=True)
+        if completed.returncode != 0:
+            return {'error': completed.stderr.strip().splitlines()[-1]}
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        times.append(result['seconds'])
+
+    modules = set(result['modules'])
+    return {
+        'seconds_median': statistics.median(times),
+        'seconds_min': min(times),
+        'modules': len(modules),
+        'heavy_modules': sorted(name for name in modules if name in HEAVY_MODULES),
+        'slowest_modules': _parse_importtime(completed.stderr, modules)[:TOP_MODULES],
+    }
+
+
+def run(targets=DEFAULT_TARGETS, repeat=5, budget=DEFAULT_BUDGET):
+    """
+    Measure the import of every target and return the report.
+
+    Parameters:
+    -----------
+    targets : list
+        Names of the modules to import.
+    repeat : int
+        Number of fresh interpreters per target.
+    budget : float
+        Time budget of `import dbtools` in seconds.
+
+    Returns:
+    --------
+    dict
+        The report. 'within_budget' is False when `import dbtools` is slower
+        than the budget or loads a heavy module.
+    """
+    results = {}
+    for target in targets:
+        result = measure(target, repeat)
+        results[f"import {target}"] = result
+        if 'error' in result:
+            print(f"import {target:<30} failed: {result['error']}")
+            continue
+        heavy = ', '.join(result['heavy_modules']) or '-'
+        print(f"import {target:<30} {result['seconds_median'] * 1000:>8.1f} ms {result['modules']:>5} modules"
+              f"   heavy: {heavy}")
+
+    package = results.get('import dbtools', {})
+    within_budget = ('error' not in package and package.get('seconds_median', 0) <= budget
+                     and not package.get('heavy_modules'))
+
+    return {
+        'version': REPORT_VERSION,
+        'kind': 'imports',
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'repeat': repeat,
+        'budget': budget,
+        'python': platform.python_version(),
+        'within_budget': within_budget,
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the import time of dbtools.")
+    parser.add_argument('--targets', nargs='+', default=DEFAULT_TARGETS, help="modules to import")
+    parser.add_argument('--repeat', type=int, default=5, help="fresh interpreters per module (default 5)")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help="time budget of 'import dbtools' in seconds (default 0.1)")
+    parser.add_argument('--output', help="path of the JSON report (default imports_<date>.json)")
+    args = parser.parse_args(argv)
+
+    report = run(targets=args.targets, repeat=args.repeat, budget=args.budget)
+
+    output = args.output or f"imports_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+    if not report['within_budget']:
+        print(f"'import dbtools' is over budget ({args.budget * 1000:.0f} ms) or imports a heavy module")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
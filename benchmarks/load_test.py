@@ -0,0 +1,387 @@
+"""
+HTTP Load Test of the Web Interface
+
+Starts server/app.py against a seeded throwaway database and drives it with
+concurrent simulated users. Each user repeatedly picks a request from a
+weighted mix of table views, form pages and /get_file_info calls, and the
+report gives, per route, the number of requests, the error rate, the
+throughput and the latency percentiles.
+
+The report keeps the p50 latency of every route as 'seconds_median', so two
+load-test reports can be compared with benchmarks.compare.
+
+Usage:
+    python -m benchmarks.load_test [--users 8] [--duration 60] [--scale 1] [--output load.json]
+    python -m benchmarks.load_test --url http://localhost:5000 --users 8 --duration 60
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+
+import dbtools as dbt
+
+from benchmarks import database
+from benchmarks.generate import generate
+
+REPORT_VERSION = 1
+
+SERVER_PATH = Path(__file__).resolve().parent.parent / 'server' / 'app.py'
+
+# Weighted request mix: (weight, method, path). Paths of /get_file_info are filled in per request.
+DEFAULT_MIX = [
+    (2, 'GET', '/'),
+    (1, 'GET', '/materials'),
+    (1, 'GET', '/panels'),
+    (1, 'GET', '/samples'),
+    (1, 'GET', '/ut_measurements'),
+    (1, 'GET', '/xct_measurements'),
+    (1, 'GET', '/fabrication'),
+    (1, 'GET', '/measurementtype'),
+    (2, 'GET', '/view_table/materials'),
+    (2, 'GET', '/view_table/panels'),
+    (2, 'GET', '/view_table/samples'),
+    (1, 'GET', '/view_table/measurements'),
+    (1, 'GET', '/view_relational_table/measurements/samples/sample_measurements'),
+    (4, 'GET', '/search/samples?q=sample_1'),
+    (2, 'GET', '/search/panels?q=panel'),
+    (4, 'POST', '/get_file_info'),
+]
+
+# Number of synthetic volume files served to /get_file_info
+FILE_COUNT = 50
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Return redirects as responses: the views redirect to the index page on error."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def _free_port():
+    """Find a free local TCP port."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url, timeout):
+    """Wait until the server answers, or raise RuntimeError."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with _opener.open(url, timeout=5) as response:
+                response.read()
+                return
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.2)
+    raise RuntimeError(f"The server did not answer at {url} within {timeout} s")
+
+
+def start_server(db_name, port, log_file):
+    """
+    Start the web interface in a subprocess, using the given database.
+
+    The Flask development server runs threaded and without the reloader, so it
+    can be stopped with the subprocess.
+
+    Parameters:
+    -----------
+    db_name : str
+        Name of the database the server connects to.
+    port : int
+        Port to listen on.
+    log_file : file object
+        Open file receiving the output of the server.
+
+    Returns:
+    --------
+    subprocess.Popen
+        The server process.
+    """
+    env = dict(os.environ, DB_NAME=db_name)
+    return subprocess.Popen(
+        [sys.executable, '-m', 'flask', '--app', str(SERVER_PATH), 'run',
+         '--host', '127.0.0.1', '--port', str(port), '--no-reload', '--no-debugger', '--with-threads'],
+        env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def make_volume_files(folder, count=FILE_COUNT):
+    """
+    Write raw volume headers for /get_file_info.
+
+    Each volume is an empty .raw file with a JSON sidecar describing its
+    shape, which is all the header-only file information reader looks at.
+
+    Parameters:
+    -----------
+    folder : str or Path
+        Folder where the files are written.
+    count : int
+        Number of volumes.
+
+    Returns:
+    --------
+    list
+        Paths of the .raw files.
+    """
+    paths = []
+    for i in range(count):
+        path = Path(folder) / f"volume_{i}.raw"
+        path.touch()
+        path.with_suffix('.json').write_text(json.dumps({'shape': [256 + i, 512, 512], 'dtype': 'uint16'}))
+        paths.append(str(path))
+    return paths
+
+
+def _percentile(sorted_values, q):
+    """Nearest-rank percentile of a sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(int(round(q / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def _user(base_url, mix, file_paths, stop, warmup_until, samples, lock, seed, think):
+    """Simulated user: send requests from the mix until stop is set."""
+    rng = random.Random(seed)
+    weights = [weight for weight, _, _ in mix]
+    while not stop.is_set():
+        _, method, path = rng.choices(mix, weights)[0]
+        data = None
+        headers = {}
+        if path == '/get_file_info':
+            data = json.dumps({'file_path': rng.choice(file_paths)}).encode()
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(base_url + path, data=data, headers=headers, method=method)
+
+        start = time.perf_counter()
+        error = None
+        size = 0
+        try:
+            with _opener.open(request, timeout=120) as response:
+                size = len(response.read())
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except Exception as e:
+            status = None
+            error = type(e).__name__
+        elapsed = time.perf_counter() - start
+
+        # Every route of the mix answers 200 directly: redirects mean the view failed
+        if error is None and status != 200:
+            error = f"HTTP {status}"
+
+        if time.monotonic() >= warmup_until:
+            with lock:
+                samples.append((f"{method} {path}", elapsed, size, error))
+
+        if think:
+            time.sleep(rng.expovariate(1 / think))
+
+
+def drive(base_url, users, duration, file_paths, mix=DEFAULT_MIX, warmup=2, think=0, seed=0):
+    """
+    Drive a running server with concurrent simulated users.
+
+    Parameters:
+    -----------
+    base_url : str
+        URL of the server, e.g. 'http://127.0.0.1:5000'.
+    users : int
+        Number of concurrent users.
+    duration : float
+        Measured duration in seconds, after the warmup.
+    file_paths : list
+        File paths sent to /get_file_info.
+    mix : list
+        Weighted request mix of (weight, method, path) tuples.
+    warmup : float
+        Seconds of requests left out of the results at the start.
+    think : float
+        Mean think time of the users between requests, in seconds.
+    seed : int
+        Seed of the random request choices.
+
+    Returns:
+    --------
+    dict
+        Results per route and overall.
+    """
+    samples = []
+    lock = threading.Lock()
+    stop = threading.Event()
+    warmup_until = time.monotonic() + warmup
+
+    threads = [
+        threading.Thread(target=_user, daemon=True,
+                         args=(base_url, mix, file_paths, stop, warmup_until, samples, lock, seed + i, think))
+        for i in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(warmup + duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=130)
+
+    routes = {}
+    for route, elapsed, size, error in samples:
+        routes.setdefault(route, []).append((elapsed, size, error))
+    routes['overall'] = [(elapsed, size, error) for _, elapsed, size, error in samples]
+
+    results = {}
+    for route, items in routes.items():
+        if not items:
+            continue
+        latencies = sorted(elapsed for elapsed, _, _ in items)
+        errors = {}
+        for _, _, error in items:
+            if error is not None:
+                errors[error] = errors.get(error, 0) + 1
+        results[route] = {
+            'requests': len(items),
+            'errors': sum(errors.values()),
+            'error_rate': sum(errors.values()) / len(items),
+            'error_kinds': errors,
+            'requests_per_second': len(items) / duration,
+            'seconds_median': _percentile(latencies, 50),
+            'seconds_p90': _percentile(latencies, 90),
+            'seconds_p99': _percentile(latencies, 99),
+            'seconds_max': latencies[-1],
+            'mean_bytes': sum(size for _, size, _ in items) / len(items),
+        }
+    return results
+
+
+def run(users=8, duration=60, scale=1, url=None, warmup=2, think=0, keep=False):
+    """
+    Seed a database, start the server, run the load test and return the report.
+
+    Parameters:
+    -----------
+    users : int
+        Number of concurrent users.
+    duration : float
+        Measured duration in seconds.
+    scale : int or float
+        Scale factor of the synthetic data.
+    url : str, optional
+        URL of an already running server. If given, no database is seeded and
+        no server is started; /get_file_info is then only driven if the server
+        can read the local temporary files.
+    warmup : float
+        Seconds of requests left out of the results at the start.
+    think : float
+        Mean think time of the users between requests, in seconds.
+    keep : bool
+        If True, the benchmark database is not dropped at the end.
+
+    Returns:
+    --------
+    dict
+        The report.
+    """
+    name = None
+    server = None
+    counts = None
+    with tempfile.TemporaryDirectory() as folder:
+        file_paths = make_volume_files(folder)
+        try:
+            if url is None:
+                name = database.create_database()
+                conn = dbt.connect()
+                try:
+                    counts = generate(conn, scale=scale)
+                finally:
+                    conn.close()
+
+                port = _free_port()
+                url = f"http://127.0.0.1:{port}"
+                log_path = Path(folder) / 'server.log'
+                server = start_server(name, port, open(log_path, 'w'))
+                try:
+                    _wait_for(url + '/', timeout=60)
+                except RuntimeError:
+                    print(log_path.read_text()[-2000:])
+                    raise
+                print(f"Server running at {url} on database '{name}'")
+
+            results = drive(url, users, duration, file_paths, warmup=warmup, think=think)
+        finally:
+            if server is not None:
+                server.terminate()
+                try:
+                    server.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+            if name is not None:
+                if keep:
+                    print(f"Kept benchmark database '{name}'")
+                else:
+                    database.drop_database(name)
+
+    print(f"{'route':<70} {'req':>6} {'err%':>6} {'req/s':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}")
+    for route, result in sorted(results.items(), key=lambda item: item[0] == 'overall'):
+        print(f"{route:<70} {result['requests']:>6} {result['error_rate'] * 100:>6.1f}"
+              f" {result['requests_per_second']:>7.1f} {result['seconds_median'] * 1000:>8.1f}"
+              f" {result['seconds_p90'] * 1000:>8.1f} {result['seconds_p99'] * 1000:>8.1f}")
+
+    return {
+        'version': REPORT_VERSION,
+        'kind': 'load_test',
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'users': users,
+        'duration': duration,
+        'scale': scale,
+        'think': think,
+        'python': platform.python_version(),
+        'database_rows': counts,
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the dbtools web interface.")
+    parser.add_argument('--users', type=int, default=8, help="concurrent simulated users (default 8)")
+    parser.add_argument('--duration', type=float, default=60, help="measured seconds (default 60)")
+    parser.add_argument('--warmup', type=float, default=2, help="seconds left out of the results at the start")
+    parser.add_argument('--think', type=float, default=0, help="mean think time between requests, in seconds")
+    parser.add_argument('--scale', type=float, default=1, help="scale factor of the synthetic data (default 1)")
+    parser.add_argument('--url', help="drive an already running server instead of starting one")
+    parser.add_argument('--output', help="path of the JSON report (default load_<date>.json)")
+    parser.add_argument('--keep', action='store_true', help="do not drop the benchmark database")
+    parser.add_argument('--env', help="path to the .env file with the server credentials")
+    args = parser.parse_args(argv)
+
+    if args.env is not None:
+        dbt.load_credentials(args.env)
+
+    report = run(users=args.users, duration=args.duration, scale=args.scale, url=args.url,
+                 warmup=args.warmup, think=args.think, keep=args.keep)
+
+    output = args.output or f"load_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == '__main__':
+    main()
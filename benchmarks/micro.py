@@ -0,0 +1,362 @@
+"""
+DataFrame Micro-benchmarks
+
+Times the pandas transformation layer of dbtools (metadata_add, parent_add and
+the merges of data_parent, multiple_parents and relation_metadata) on
+synthetic frames of growing size, without any database. The functions that
+read tables are patched to return the synthetic frames, so only the DataFrame
+work is measured.
+
+For every function the harness records the time and the peak memory allocated
+at each size, and fits the slope of log(time) against log(rows): a slope of 1
+is linear scaling, and a slope above SUPER_LINEAR_SLOPE is flagged (e.g. the
+per-id loop of metadata_add is quadratic). Larger sizes are skipped once the
+time projected from the measured slope would exceed the time budget of the
+function.
+
+Usage:
+    python -m benchmarks.micro [--sizes 1000 10000 100000 1000000] [--keys 5]
+                               [--budget 60] [--repeat 3] [--only REGEX] [--output micro.json]
+"""
+
+import argparse
+import contextlib
+import json
+import platform
+import re
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import dbtools.dbtools as qrs
+
+REPORT_VERSION = 1
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000, 10000000]
+
+# Metadata keys per entity in the synthetic frames
+DEFAULT_KEYS = 5
+
+# Time budget per function, in seconds
+DEFAULT_BUDGET = 60
+
+# Slope of log(time) against log(rows) above which scaling is flagged as super-linear
+SUPER_LINEAR_SLOPE = 1.2
+
+# Points faster than this are dominated by fixed overheads and left out of the slope fit
+_MIN_FIT_SECONDS = 1e-3
+
+
+def _entity_frame(n, keys, rng):
+    """
+    Build the main table and the metadata table of n synthetic entities.
+
+    Parameters:
+    -----------
+    n : int
+        Number of entities.
+    keys : int
+        Number of metadata keys per entity.
+    rng : numpy.random.Generator
+        Random number generator.
+
+    Returns:
+    --------
+    tuple
+        (data, metadata) DataFrames with the columns returned by the database.
+    """
+    ids = np.arange(1, n + 1)
+    data = pd.DataFrame({
+        'id': ids,
+        'name': pd.Series(ids).map('entity_{}'.format),
+    })
+    metadata = pd.DataFrame({
+        'id': np.arange(1, n * keys + 1),
+        'entity_id': np.repeat(ids, keys),
+        'key': np.tile([f"key_{k}" for k in range(keys)], n).astype(object),
+        'value': rng.uniform(0, 100, n * keys).round(3).astype(str).astype(object),
+        'type': 'mm',
+        'extra_info': None,
+    })
+    return data, metadata
+
+
+def _wide_frame(entity, n, keys, rng, references=None):
+    """
+    Build a frame shaped like get_data_metadata(): suffixed columns and one column per metadata key.
+
+    Parameters:
+    -----------
+    entity : str
+        Singular table name used as column suffix (e.g. 'sample').
+    n : int
+        Number of rows.
+    keys : int
+        Number of metadata columns.
+    rng : numpy.random.Generator
+        Random number generator.
+    references : dict, optional
+        Foreign key columns: {column name: number of referenced rows}.
+
+    Returns:
+    --------
+    pd.DataFrame
+        The frame.
+    """
+    n = max(int(n), 1)
+    ids = np.arange(1, n + 1)
+    columns = {
+        f"id_{entity}": ids,
+        f"name_{entity}": pd.Series(ids).map((entity + '_{}').format),
+    }
+    for column, referenced in (references or {}).items():
+        columns[f"{column}_{entity}"] = rng.integers(1, max(int(referenced), 1) + 1, n)
+    for k in range(keys):
+        columns[f"key_{k}_{entity}"] = pd.Series(rng.uniform(0, 100, n).round(3).astype(str)) + ' mm'
+    return pd.DataFrame(columns)
+
+
+def _patched(frames):
+    """Patch the table readers of dbtools to return copies of synthetic frames."""
+    def read(table_name, *args, **kwargs):
+        # The readers also take the method, compact and backend options of the retrieval functions
+        return frames[table_name].copy()
+
+    stack = contextlib.ExitStack()
+    stack.enter_context(mock.patch.object(qrs, 'get_data_metadata', read))
+    stack.enter_context(mock.patch.object(qrs, 'get_data', read))
+    return stack
+
+
+def _cases(keys):
+    """
+    The benchmarked functions.
+
+    Returns:
+    --------
+    dict
+        {name: setup}, where setup(n, rng) builds the inputs for n rows and
+        returns a function without arguments that runs the benchmarked call.
+    """
+    def metadata_add(n, rng):
+        data, metadata = _entity_frame(n, keys, rng)
+
+        def run():
+            # metadata_add modifies data in place: give every run a fresh copy
+            return qrs.metadata_add(data.copy(), metadata, 'entity_id')
+        return run
+
+    def parent_add(n, rng):
+        data = _wide_frame('sample', n, keys, rng, {'panel_id': n // 10})
+        parent_data = _wide_frame('panel', n // 10, keys, rng)
+
+        def run():
+            return qrs.parent_add(data, parent_data, 'panel_id_sample', suffixes=('_sample', '_panel'))
+        return run
+
+    def data_parent(n, rng):
+        frames = {
+            'samples': _wide_frame('sample', n, keys, rng, {'panel_id': n // 10}),
+            'panels': _wide_frame('panel', n // 10, keys, rng),
+        }
+
+        def run():
+            with _patched(frames):
+                return qrs.data_parent('samples', 'panels')
+        return run
+
+    def multiple_parents(n, rng):
+        frames = {
+            'panels': _wide_frame('panel', n, keys, rng, {'material_id': n // 100, 'fabrication_id': 3}),
+            'materials': _wide_frame('material', n // 100, keys, rng),
+            'fabrications': _wide_frame('fabrication', 3, keys, rng),
+        }
+
+        def run():
+            with _patched(frames):
+                return qrs.multiple_parents('panels', ['materials', 'fabrications'],
+                                            ['material_id_panel', 'fabrication_id_panel'])
+        return run
+
+    def relation_metadata(n, rng):
+        n_samples = max(n // 2, 1)
+        frames = {
+            'measurements': _wide_frame('measurement', n, keys, rng),
+            'samples': _wide_frame('sample', n_samples, keys, rng),
+            'sample_measurements': pd.DataFrame({
+                'id_sample_measurement': np.arange(1, n + 1),
+                'sample_id_sample_measurement': rng.integers(1, n_samples + 1, n),
+                'measurement_id_sample_measurement': np.arange(1, n + 1),
+            }),
+        }
+
+        def run():
+            with _patched(frames):
+                return qrs.relation_metadata('measurements', 'samples', 'sample_measurements')
+        return run
+
+    return {
+        'metadata_add': metadata_add,
+        'parent_add': parent_add,
+        'data_parent': data_parent,
+        'multiple_parents': multiple_parents,
+        'relation_metadata': relation_metadata,
+    }
+
+
+def _slope(points):
+    """
+    Least-squares slope of log(seconds) against log(rows).
+
+    Parameters:
+    -----------
+    points : list
+        List of (rows, seconds) tuples.
+
+    Returns:
+    --------
+    float or None
+        The slope, or None if fewer than two points are slow enough to fit.
+    """
+    points = [(n, t) for n, t in points if t >= _MIN_FIT_SECONDS]
+    if len(points) < 2:
+        return None
+    x = np.log([n for n, _ in points])
+    y = np.log([t for _, t in points])
+    return float(np.polyfit(x, y, 1)[0])
+
+
+def _measure(run, repeat):
+    """Time run() repeat times, then measure its peak memory in a separate run."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'seconds_median': statistics.median(times),
+        'seconds_min': min(times),
+        'peak_memory_mb': peak / 2 ** 20,
+    }
+
+
+def run(sizes=DEFAULT_SIZES, keys=DEFAULT_KEYS, budget=DEFAULT_BUDGET, repeat=3, only=None, seed=0):
+    """
+    Run the micro-benchmarks and return the report.
+
+    Parameters:
+    -----------
+    sizes : list
+        Numbers of rows of the main frame, in increasing order.
+    keys : int
+        Number of metadata keys per entity.
+    budget : float
+        Time budget per function in seconds; larger sizes are skipped once they
+        are projected to exceed it.
+    repeat : int
+        Number of timed runs per function and size.
+    only : str, optional
+        Regular expression; only the functions whose name matches are run.
+    seed : int
+        Seed of the random number generator.
+
+    Returns:
+    --------
+    dict
+        The report, with the results per function and size and the scaling per function.
+    """
+    sizes = sorted(int(n) for n in sizes)
+    results = {}
+    scaling = {}
+
+    for name, setup in _cases(keys).items():
+        if only is not None and not re.search(only, name):
+            continue
+
+        points = []
+        spent = 0.0
+        skipped = []
+        for n in sizes:
+            if points:
+                # Project the time of this size from the slope so far (at least linear)
+                last_n, last_seconds = points[-1]
+                slope = max(_slope(points) or 1.0, 1.0)
+                projected = last_seconds * (n / last_n) ** slope * (repeat + 1)
+                if spent + projected > budget:
+                    skipped = [size for size in sizes if size >= n]
+                    print(f"{name}: skipping sizes {skipped}, {n} rows would take about {projected:.0f} s")
+                    break
+
+            rng = np.random.default_rng(seed)
+            result = _measure(setup(n, rng), repeat)
+            result['rows'] = n
+            result['rows_per_second'] = n / result['seconds_median'] if result['seconds_median'] > 0 else None
+            results[f"{name}[{n}]"] = result
+            points.append((n, result['seconds_median']))
+            spent += result['seconds_median'] * (repeat + 1)
+
+            print(f"{name + '[' + str(n) + ']':<30} {result['seconds_median'] * 1000:>12.1f} ms"
+                  f" {result['rows_per_second'] or 0:>14.0f} rows/s {result['peak_memory_mb']:>10.1f} MB")
+
+        slope = _slope(points)
+        scaling[name] = {
+            'slope': slope,
+            'super_linear': slope is not None and slope > SUPER_LINEAR_SLOPE,
+            'sizes': [n for n, _ in points],
+            'skipped_sizes': skipped,
+        }
+        if scaling[name]['super_linear']:
+            print(f"{name}: super-linear scaling, time grows as rows^{slope:.2f}")
+
+    return {
+        'version': REPORT_VERSION,
+        'kind': 'micro',
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'keys': keys,
+        'repeat': repeat,
+        'budget': budget,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'results': results,
+        'scaling': scaling,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmark the DataFrame functions of dbtools.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="rows of the main frame")
+    parser.add_argument('--keys', type=int, default=DEFAULT_KEYS, help="metadata keys per entity (default 5)")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help="time budget per function in seconds (default 60)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per function and size (default 3)")
+    parser.add_argument('--only', help="only run the functions whose name matches this regular expression")
+    parser.add_argument('--output', help="path of the JSON report (default micro_<date>.json)")
+    args = parser.parse_args(argv)
+
+    report = run(sizes=args.sizes, keys=args.keys, budget=args.budget, repeat=args.repeat, only=args.only)
+
+    output = args.output or f"micro_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+    if any(item['super_linear'] for item in report['scaling'].values()):
+        flagged = [name for name, item in report['scaling'].items() if item['super_linear']]
+        print(f"Super-linear scaling in: {', '.join(flagged)}")
+
+
+if __name__ == '__main__':
+    main()
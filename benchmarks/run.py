@@ -0,0 +1,299 @@
+"""
+Benchmark Runner
+
+Creates a throwaway database, fills it with synthetic data and times the
+public dbtools functions on it. Each benchmark is run several times and the
+report records, per function, the median and minimum wall time, the number of
+rows processed, the throughput in rows per second and the peak Python memory
+allocated during one run (measured with tracemalloc in a separate run, so it
+does not slow down the timed ones).
+
+Usage:
+    python -m benchmarks.run [--scale 1] [--repeat 3] [--calls 50] [--only REGEX]
+                             [--output report.json] [--keep] [--env .env]
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import platform
+import re
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+
+import dbtools as dbt
+import dbtools.export as export
+import dbtools.load as load
+
+from benchmarks import database
+from benchmarks.generate import DEFAULT_EXTRA_KEYS, generate
+
+REPORT_VERSION = 1
+
+
+def _rows(result):
+    """Number of rows of a benchmark result: a count, a DataFrame or a single value (1)."""
+    if isinstance(result, int):
+        return result
+    if hasattr(result, '__len__'):
+        return len(result)
+    return 1
+
+
+def measure(func, repeat):
+    """
+    Time a function and measure its peak memory.
+
+    Parameters:
+    -----------
+    func : callable
+        Function without arguments to benchmark.
+    repeat : int
+        Number of timed runs.
+
+    Returns:
+    --------
+    dict
+        Median and minimum seconds, rows, rows per second and peak memory in MB.
+    """
+    times = []
+    result = None
+    # The functions print progress messages that would dominate the output
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    rows = _rows(result)
+    median = statistics.median(times)
+    return {
+        'seconds_median': median,
+        'seconds_min': min(times),
+        'rows': rows,
+        'rows_per_second': rows / median if median > 0 else None,
+        'peak_memory_mb': peak / 2 ** 20,
+    }
+
+
+def _retrieval_benchmarks(conn):
+    """Benchmarks of the retrieval functions: name -> function."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM samples ORDER BY id LIMIT 1")
+    sample_name = cursor.fetchone()[0]
+    cursor.close()
+
+    def stream(table_name, fmt):
+        def run():
+            return sum(len(chunk) for chunk in export.stream_table(table_name, fmt))
+        return run
+
+    return {
+        'get_data[samples]': lambda: dbt.get_data('samples'),
+        'get_data[measurements]': lambda: dbt.get_data('measurements'),
+        'get_data_metadata[samples]': lambda: dbt.get_data_metadata('samples'),
+        'get_data_metadata[measurements]': lambda: dbt.get_data_metadata('measurements'),
+        'get_data_metadata[registrations]': lambda: dbt.get_data_metadata('registrations'),
+        'get_data[measurements,copy]': lambda: dbt.get_data('measurements', method='copy'),
+        'get_data_metadata[measurements,copy]': lambda: dbt.get_data_metadata('measurements', method='copy'),
+        'relation_metadata[measurements,samples,copy]': lambda: dbt.relation_metadata(
+            'measurements', 'samples', 'sample_measurements', method='copy'),
+        'relation_metadata[measurements,samples,compact]': lambda: dbt.relation_metadata(
+            'measurements', 'samples', 'sample_measurements', compact=True),
+        'get_data_metadata[measurements,polars]': lambda: dbt.get_data_metadata('measurements', backend='polars'),
+        'relation_metadata[measurements,samples,polars]': lambda: dbt.relation_metadata(
+            'measurements', 'samples', 'sample_measurements', backend='polars'),
+        'data_parent[samples,panels]': lambda: dbt.data_parent('samples', 'panels'),
+        'multiple_parents[panels,materials+fabrications]': lambda: dbt.multiple_parents(
+            'panels', ['materials', 'fabrications'], ['material_id', 'fabrication_id']),
+        'relation_metadata[measurements,samples]': lambda: dbt.relation_metadata(
+            'measurements', 'samples', 'sample_measurements'),
+        'get_id[samples]': lambda: dbt.get_id('samples', ['name_sample'], [sample_name]),
+        # Rows of the export benchmarks are the bytes produced
+        'export.stream_table[measurements,csv]': stream('measurements', 'csv'),
+        'export.stream_table[measurements,ndjson]': stream('measurements', 'ndjson'),
+    }
+
+
+def _load_benchmarks(conn, calls):
+    """Benchmarks of the loaders: name -> function loading calls entities."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM materials ORDER BY id LIMIT 1")
+    material_id = cursor.fetchone()[0]
+    cursor.execute("SELECT id FROM fabrications ORDER BY id LIMIT 1")
+    fabrication_id = cursor.fetchone()[0]
+    cursor.execute("SELECT name, panel_id FROM samples ORDER BY id LIMIT 1")
+    sample_name, panel_id = cursor.fetchone()
+    cursor.execute("SELECT id FROM measurementtypes ORDER BY id")
+    ut_type_id, xct_type_id = [row[0] for row in cursor.fetchall()][:2]
+    cursor.execute("SELECT id FROM datasettypes ORDER BY id LIMIT 1")
+    datasettype_id = cursor.fetchone()[0]
+    cursor.execute("SELECT id FROM registrations ORDER BY id LIMIT 5")
+    registration_ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+
+    # Unique names across repeated runs
+    counter = itertools.count()
+
+    def repeated(load_one):
+        def run():
+            for _ in range(calls):
+                load_one(next(counter))
+            return calls
+        return run
+
+    def ut_measurement(i):
+        load.load_ut_measurement(conn, f"/bench/ut_{i}.tif", ut_type_id, 512, 512, 1024, 'uint16', '.tif',
+                                 'Amplitude', ['z', 'y', 'x'], [sample_name])
+
+    def xct_measurement(i):
+        load.load_xct_measurement(conn, f"/bench/xct_{i}", xct_type_id, 512, 512, 1024, 'uint16', 'folder',
+                                  [sample_name], False, False, ['z', 'y', 'x'])
+
+    def registration(i):
+        # Registrations need two existing measurements
+        load.load_ut_measurement(conn, f"/bench/reg_ref_{i}.tif", ut_type_id, 512, 512, 1024, 'uint16', '.tif',
+                                 'Amplitude', ['z', 'y', 'x'], [sample_name])
+        load.load_xct_measurement(conn, f"/bench/reg_mov_{i}", xct_type_id, 512, 512, 1024, 'uint16', 'folder',
+                                  [sample_name], False, False, ['z', 'y', 'x'])
+        load.load_registration(conn, [[1, 0, 0], [0, 1, 0], [0, 0, 1]], f"/bench/reg_ref_{i}.tif",
+                               f"/bench/reg_mov_{i}", 'rigid', ['z', 'y', 'x'])
+
+    def batched(load_one):
+        def run():
+            with load.batch(conn):
+                for _ in range(calls):
+                    load_one(next(counter))
+            return calls
+        return run
+
+    def sample(i):
+        load.load_sample(conn, f"bench_sample_{i}", panel_id, 150, 25, 4.5, False, True)
+
+    return {
+        'load_material': repeated(lambda i: load.load_material(conn, f"bench_material_{i}", 0.125)),
+        'load_panel': repeated(lambda i: load.load_panel(
+            conn, f"bench_panel_{i}", material_id, fabrication_id, 300, 300, 4.5, layer_layout=[0, 90])),
+        'load_sample': repeated(sample),
+        'load_sample[batch]': batched(sample),
+        'load_ut_measurement': repeated(ut_measurement),
+        'load_xct_measurement': repeated(xct_measurement),
+        # Each call also loads the two measurements it registers
+        'load_registration': repeated(registration),
+        'load_dataset': repeated(lambda i: load.load_dataset(
+            conn, datasettype_id, f"/bench/dataset_{i}.h5", 1000, '64x64', ['porosity'], (512, 512, 1024),
+            registration_ids)),
+    }
+
+
+def run(scale=1, repeat=3, calls=50, only=None, extra_keys=DEFAULT_EXTRA_KEYS, keep=False):
+    """
+    Create a benchmark database, run the benchmarks and return the report.
+
+    Parameters:
+    -----------
+    scale : int or float
+        Scale factor of the synthetic data.
+    repeat : int
+        Number of timed runs per benchmark.
+    calls : int
+        Number of entities loaded per run of the loader benchmarks.
+    only : str, optional
+        Regular expression; only the benchmarks whose name matches are run.
+    extra_keys : int
+        Number of additional metadata keys per generated entity.
+    keep : bool
+        If True, the benchmark database is not dropped at the end.
+
+    Returns:
+    --------
+    dict
+        The report.
+    """
+    name = database.create_database()
+    print(f"Created benchmark database '{name}'")
+
+    try:
+        conn = dbt.connect()
+        try:
+            start = time.perf_counter()
+            counts = generate(conn, scale=scale, extra_keys=extra_keys)
+            print(f"Generated {sum(counts.values())} rows in {time.perf_counter() - start:.1f} s")
+
+            benchmarks = {**_retrieval_benchmarks(conn), **_load_benchmarks(conn, calls)}
+            if only is not None:
+                benchmarks = {key: func for key, func in benchmarks.items() if re.search(only, key)}
+
+            results = {}
+            for benchmark_name, func in benchmarks.items():
+                try:
+                    results[benchmark_name] = measure(func, repeat)
+                except Exception as e:
+                    print(f"Error running {benchmark_name}: {e}")
+                    conn.rollback()
+                    results[benchmark_name] = {'error': str(e)}
+                    continue
+                result = results[benchmark_name]
+                print(f"{benchmark_name:<50} {result['seconds_median'] * 1000:>10.1f} ms"
+                      f" {result['rows_per_second'] or 0:>14.0f} rows/s {result['peak_memory_mb']:>8.1f} MB")
+
+            server_version = conn.server_version
+        finally:
+            conn.close()
+    finally:
+        if keep:
+            print(f"Kept benchmark database '{name}'")
+        else:
+            database.drop_database(name)
+
+    return {
+        'version': REPORT_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'scale': scale,
+        'repeat': repeat,
+        'calls': calls,
+        'python': platform.python_version(),
+        'server_version': server_version,
+        'database_rows': counts,
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dbtools on a throwaway synthetic database.")
+    parser.add_argument('--scale', type=float, default=1, help="scale factor of the synthetic data (default 1)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per benchmark (default 3)")
+    parser.add_argument('--calls', type=int, default=50, help="entities loaded per loader run (default 50)")
+    parser.add_argument('--extra-keys', type=int, default=DEFAULT_EXTRA_KEYS,
+                        help="additional metadata keys per generated entity")
+    parser.add_argument('--only', help="only run the benchmarks whose name matches this regular expression")
+    parser.add_argument('--output', help="path of the JSON report (default benchmark_<date>.json)")
+    parser.add_argument('--keep', action='store_true', help="do not drop the benchmark database")
+    parser.add_argument('--env', help="path to the .env file with the server credentials")
+    args = parser.parse_args(argv)
+
+    if args.env is not None:
+        dbt.load_credentials(args.env)
+
+    report = run(scale=args.scale, repeat=args.repeat, calls=args.calls, only=args.only,
+                 extra_keys=args.extra_keys, keep=args.keep)
+
+    output = args.output or f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,43 @@
-from .dbtools import *
\ No newline at end of file
+"""
+dbtools: utilities to load and retrieve the materials database.
+
+The functions of dbtools.dbtools and the query statistics of dbtools.instrument
+are available at the package level (dbtools.connect, dbtools.get_data_metadata,
+dbtools.stats, ...). They are loaded on first access, so `import dbtools` does
+not import pandas, psycopg2 or dotenv until a function that needs them is
+called.
+"""
+
+import importlib
+
+# Package-level names and the submodule that defines them
+_EXPORTS = {
+    'load_credentials': 'dbtools',
+    'connect': 'dbtools',
+    'metadata_add': 'dbtools',
+    'parent_add': 'dbtools',
+    'compact_frame': 'dbtools',
+    'get_data': 'dbtools',
+    'get_data_metadata': 'dbtools',
+    'data_parent': 'dbtools',
+    'multiple_parents': 'dbtools',
+    'relation_metadata': 'dbtools',
+    'get_id': 'dbtools',
+    'stats': 'instrument',
+    'reset_stats': 'instrument',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{_EXPORTS[name]}"), name)
+    # Later lookups find the name directly, without calling __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
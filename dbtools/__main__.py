@@ -0,0 +1,7 @@
+"""Run the dbtools command-line interface with python -m dbtools."""
+
+import sys
+
+from dbtools.cli import main
+
+sys.exit(main())
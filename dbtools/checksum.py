@@ -0,0 +1,379 @@
+"""
+Checksum Module
+
+This module computes content checksums of the files referenced by the
+measurements, datasets and models tables and stores them as metadata, so
+duplicated data and files modified after registration can be detected.
+
+Files are hashed chunkwise through memory-mapped reads in a process pool.
+Folders (TIFF slice folders, model folders) are hashed as the combination of
+the relative names and digests of all the files they contain. The digest is
+stored under the metadata key 'checksum' with the algorithm as type, and the
+size and modification time of the file at hashing time in extra_info, so later
+runs only re-hash files whose size or mtime changed.
+
+Dependencies:
+    - dbtools: Custom database utility module
+"""
+
+import hashlib
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from psycopg2 import sql
+from psycopg2.extras import Json
+
+# Metadata key under which the checksum is stored
+CHECKSUM_KEY = 'checksum'
+
+# Default hashing algorithm (any name accepted by hashlib.new)
+DEFAULT_ALGORITHM = 'sha256'
+
+# Size of the memory-mapped window fed to the hash at a time
+CHUNK_SIZE = 64 * 1024 * 1024
+
+# Tables with files, mapped to (path column, metadata table, metadata id column)
+TARGETS = {
+    'measurements': ('file_path', 'measurement_metadata', 'measurement_id'),
+    'datasets': ('file_path', 'dataset_metadata', 'dataset_id'),
+    'models': ('model_folder_path', 'model_metadata', 'model_id'),
+}
+
+
+def _walk_files(folder_path):
+    """List the files below a folder as sorted (relative path, absolute path) pairs."""
+    files = []
+    for directory, _, names in os.walk(folder_path):
+        for name in names:
+            absolute = os.path.join(directory, name)
+            files.append((os.path.relpath(absolute, folder_path).replace(os.sep, '/'), absolute))
+    return sorted(files)
+
+
+def file_signature(path):
+    """
+    Get the size and modification time used to decide whether to re-hash a path.
+
+    For folders the size is the total size of the contained files and the
+    mtime the most recent one (including the folders themselves, so renamed
+    or removed files are noticed).
+
+    Parameters:
+    -----------
+    path : str
+        Path to a file or folder.
+
+    Returns:
+    --------
+    tuple
+        (size in bytes, mtime in nanoseconds).
+    """
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    size = 0
+    mtime_ns = 0
+    for directory, _, names in os.walk(path):
+        mtime_ns = max(mtime_ns, os.stat(directory).st_mtime_ns)
+        for name in names:
+            stat = os.stat(os.path.join(directory, name))
+            size += stat.st_size
+            mtime_ns = max(mtime_ns, stat.st_mtime_ns)
+    return size, mtime_ns
+
+
+def hash_file(file_path, algorithm=DEFAULT_ALGORITHM, chunk_size=CHUNK_SIZE):
+    """
+    Hash the content of a file through memory-mapped reads.
+
+    Parameters:
+    -----------
+    file_path : str
+        Path to the file.
+    algorithm : str, optional
+        Name of the hashlib algorithm.
+    chunk_size : int, optional
+        Number of bytes fed to the hash at a time.
+
+    Returns:
+    --------
+    str
+        Hexadecimal digest of the file content.
+    """
+    digest = hashlib.new(algorithm)
+    with open(file_path, 'rb') as f:
+        # Empty files cannot be memory-mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return digest.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                for offset in range(0, len(view), chunk_size):
+                    digest.update(view[offset:offset + chunk_size])
+    return digest.hexdigest()
+
+
+def hash_path(path, algorithm=DEFAULT_ALGORITHM):
+    """
+    Hash a file, or a folder as the combination of its files' names and digests.
+
+    Parameters:
+    -----------
+    path : str
+        Path to a file or folder.
+    algorithm : str, optional
+        Name of the hashlib algorithm.
+
+    Returns:
+    --------
+    str
+        Hexadecimal digest.
+    """
+    if not os.path.isdir(path):
+        return hash_file(path, algorithm)
+
+    digest = hashlib.new(algorithm)
+    for relative, absolute in _walk_files(path):
+        digest.update(relative.encode('utf-8') + b'\0')
+        digest.update(hash_file(absolute, algorithm).encode('ascii') + b'\n')
+    return digest.hexdigest()
+
+
+def _hash_task(task):
+    """
+    Hash one path in a worker process.
+
+    Parameters:
+    -----------
+    task : tuple
+        (path, algorithm).
+
+    Returns:
+    --------
+    tuple
+        (path, digest, size, mtime_ns, error) with digest None on error.
+    """
+    path, algorithm = task
+    try:
+        size, mtime_ns = file_signature(path)
+        return path, hash_path(path, algorithm), size, mtime_ns, None
+    except Exception as e:
+        return path, None, None, None, str(e)
+
+
+def _stored_checksums(cursor, table_name):
+    """
+    Get every row of a table with its path and stored checksum, if any.
+
+    Parameters:
+    -----------
+    cursor : psycopg2.cursor
+        An active database cursor object.
+    table_name : str
+        One of the TARGETS tables.
+
+    Returns:
+    --------
+    list
+        List of (id, path, metadata id, digest, algorithm, extra_info) tuples.
+    """
+    path_column, metadata_table, id_column = TARGETS[table_name]
+    query = sql.SQL(
+        "SELECT t.id, t.{path}, md.id, md.value, md.type, md.extra_info "
+        "FROM {table} t LEFT JOIN {metadata} md ON md.{id_column} = t.id AND md.key = %s "
+        "ORDER BY t.id"
+    ).format(path=sql.Identifier(path_column), table=sql.Identifier(table_name),
+             metadata=sql.Identifier(metadata_table), id_column=sql.Identifier(id_column))
+    cursor.execute(query, (CHECKSUM_KEY,))
+    return cursor.fetchall()
+
+
+def _is_current(path, algorithm, stored_algorithm, extra_info):
+    """Check whether a stored checksum still matches the size and mtime of its path."""
+    if stored_algorithm != algorithm or not extra_info:
+        return False
+    size, mtime_ns = file_signature(path)
+    return extra_info.get('size') == size and extra_info.get('mtime_ns') == mtime_ns
+
+
+def update_checksums(conn, table_name='measurements', algorithm=DEFAULT_ALGORITHM, workers=None, force=False):
+    """
+    Compute and store the checksums of the files referenced by a table.
+
+    Only paths without a checksum, or whose size or mtime changed since their
+    checksum was computed, are hashed (all of them if force=True). The digests
+    are written as 'checksum' metadata in a single transaction.
+
+    Parameters:
+    -----------
+    conn : psycopg2.connection
+        Database connection object.
+    table_name : str, optional
+        'measurements', 'datasets' or 'models'.
+    algorithm : str, optional
+        Name of the hashlib algorithm.
+    workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+    force : bool, optional
+        If True, re-hash every path.
+
+    Returns:
+    --------
+    dict
+        Report with the number of 'hashed', 'skipped', 'missing' paths and the
+        list of 'errors' as (path, message) tuples. Returns -1 if the database
+        update fails.
+    """
+    assert table_name in TARGETS, f"table_name must be one of {list(TARGETS)}"
+    hashlib.new(algorithm)  # Fail early on unknown algorithms
+
+    _, metadata_table, id_column = TARGETS[table_name]
+
+    cursor = conn.cursor()
+    rows = _stored_checksums(cursor, table_name)
+
+    # Select the paths that need hashing
+    pending = {}
+    report = {'hashed': 0, 'skipped': 0, 'missing': 0, 'errors': []}
+    for row_id, path, metadata_id, _, stored_algorithm, extra_info in rows:
+        if not os.path.exists(path):
+            report['missing'] += 1
+            continue
+        if not force and metadata_id is not None and _is_current(path, algorithm, stored_algorithm, extra_info):
+            report['skipped'] += 1
+            continue
+        pending.setdefault(path, []).append((row_id, metadata_id))
+
+    print(f"Hashing {len(pending)} paths from {table_name} "
+          f"({report['skipped']} unchanged, {report['missing']} missing)")
+
+    # Hash the pending paths in parallel
+    results = []
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_hash_task, [(path, algorithm) for path in pending]))
+
+    conn.autocommit = False  # Start transaction
+    try:
+        for path, digest, size, mtime_ns, error in results:
+            if digest is None:
+                report['errors'].append((path, error))
+                continue
+            extra_info = Json({'size': size, 'mtime_ns': mtime_ns})
+            for row_id, metadata_id in pending[path]:
+                if metadata_id is None:
+                    cursor.execute(
+                        sql.SQL("INSERT INTO {} ({}, key, value, type, extra_info) VALUES (%s, %s, %s, %s, %s)").format(
+                            sql.Identifier(metadata_table), sql.Identifier(id_column)),
+                        (row_id, CHECKSUM_KEY, digest, algorithm, extra_info))
+                else:
+                    cursor.execute(
+                        sql.SQL("UPDATE {} SET value = %s, type = %s, extra_info = %s WHERE id = %s").format(
+                            sql.Identifier(metadata_table)),
+                        (digest, algorithm, extra_info, metadata_id))
+                report['hashed'] += 1
+    except Exception as e:
+        print(f"Error storing checksums: {e}")
+        conn.rollback()
+        cursor.close()
+        return -1
+
+    # Commit the transaction if everything is successful
+    conn.commit()
+    cursor.close()
+
+    print(f"Stored {report['hashed']} checksums in {metadata_table}, {len(report['errors'])} errors")
+    return report
+
+
+def find_duplicates(conn, table_name='measurements'):
+    """
+    Find rows of a table whose files have identical content.
+
+    Parameters:
+    -----------
+    conn : psycopg2.connection
+        Database connection object.
+    table_name : str, optional
+        'measurements', 'datasets' or 'models'.
+
+    Returns:
+    --------
+    pd.DataFrame
+        One row per duplicated digest with the columns 'checksum', 'count',
+        'ids' and 'paths'.
+    """
+    assert table_name in TARGETS, f"table_name must be one of {list(TARGETS)}"
+    path_column, metadata_table, id_column = TARGETS[table_name]
+
+    query = sql.SQL(
+        "SELECT md.value AS checksum, count(*) AS count, "
+        "array_agg(t.id ORDER BY t.id) AS ids, array_agg(t.{path} ORDER BY t.id) AS paths "
+        "FROM {metadata} md JOIN {table} t ON t.id = md.{id_column} "
+        "WHERE md.key = %s "
+        "GROUP BY md.value, md.type HAVING count(*) > 1 "
+        "ORDER BY count(*) DESC"
+    ).format(path=sql.Identifier(path_column), table=sql.Identifier(table_name),
+             metadata=sql.Identifier(metadata_table), id_column=sql.Identifier(id_column))
+
+    cursor = conn.cursor()
+    cursor.execute(query, (CHECKSUM_KEY,))
+    records = cursor.fetchall()
+    cursor.close()
+
+    return pd.DataFrame(records, columns=['checksum', 'count', 'ids', 'paths'])
+
+
+def find_changed(conn, table_name='measurements', rehash=False, workers=None):
+    """
+    Find rows of a table whose files changed since their checksum was stored.
+
+    By default a file counts as 'modified' when its size or mtime differs from
+    the ones recorded with the checksum. With rehash=True those files are also
+    hashed again and only reported if the content actually differs.
+
+    Parameters:
+    -----------
+    conn : psycopg2.connection
+        Database connection object.
+    table_name : str, optional
+        'measurements', 'datasets' or 'models'.
+    rehash : bool, optional
+        If True, confirm modifications by re-hashing the files.
+    workers : int, optional
+        Number of worker processes used when rehash=True.
+
+    Returns:
+    --------
+    pd.DataFrame
+        One row per changed file with the columns 'id', 'path' and 'status'
+        ('missing', 'unhashed' or 'modified').
+    """
+    assert table_name in TARGETS, f"table_name must be one of {list(TARGETS)}"
+
+    cursor = conn.cursor()
+    rows = _stored_checksums(cursor, table_name)
+    cursor.close()
+
+    changed = []
+    suspects = []
+    for row_id, path, metadata_id, digest, stored_algorithm, extra_info in rows:
+        if not os.path.exists(path):
+            changed.append((row_id, path, 'missing'))
+        elif metadata_id is None:
+            changed.append((row_id, path, 'unhashed'))
+        elif not _is_current(path, stored_algorithm, stored_algorithm, extra_info):
+            suspects.append((row_id, path, digest, stored_algorithm))
+
+    if rehash and suspects:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(_hash_task, [(path, algorithm) for _, path, _, algorithm in suspects])
+            for (row_id, path, digest, _), (_, new_digest, _, _, _) in zip(suspects, results):
+                if new_digest != digest:
+                    changed.append((row_id, path, 'modified'))
+    else:
+        changed.extend((row_id, path, 'modified') for row_id, path, _, _ in suspects)
+
+    return pd.DataFrame(changed, columns=['id', 'path', 'status'])
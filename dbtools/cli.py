@@ -0,0 +1,289 @@
+"""
+Command-line Interface
+
+The `dbtools` console script runs the frequent database operations without a
+notebook or the web interface:
+
+    dbtools export samples --format csv > samples.csv
+    dbtools ids samples sample_1 sample_2            (or names on stdin, one per line)
+    dbtools load samples manifest.csv --on-conflict skip
+    dbtools load ut_measurements manifest.csv --atomic
+    dbtools delete measurements --where signal_type = Amplitude --where height '<' 100 --yes
+    dbtools snapshot backups/2025-01-15
+
+Inputs and outputs are streamed: exports are written chunk by chunk, ids are
+looked up in batches as names are read, and manifests are loaded in chunked
+transactions, so large operations run in constant memory. Results go to
+stdout and messages to stderr, so the commands can be piped in batch jobs.
+
+The modules of each command are imported when it runs, so the script starts
+without loading pandas.
+
+Usage:
+    dbtools [--env PATH] {export,ids,load,delete,snapshot} ...
+    python -m dbtools ...
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import re
+import sys
+
+# Names looked up per query by the ids command
+IDS_CHUNK_SIZE = 1000
+
+
+def _open_input(path):
+    """Open a text input, '-' being stdin."""
+    if path == '-':
+        return contextlib.nullcontext(sys.stdin)
+    return open(path, newline='', encoding='utf-8')
+
+
+def _value(text):
+    """Parse a predicate value given on the command line: a number if it looks like one."""
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def _predicate(parts):
+    """Build a delete_where predicate from the words of a --where option."""
+    import dbtools.delete as delete
+
+    if len(parts) < 2:
+        raise argparse.ArgumentTypeError(f"--where needs NAME OPERATOR [VALUE], got {' '.join(parts)}")
+    # Operators may be several words ('is not null', 'not in')
+    for size in (3, 2, 1):
+        operator = ' '.join(parts[1:1 + size]).lower()
+        if operator in delete.OPERATORS and len(parts) >= 1 + size:
+            break
+    else:
+        raise argparse.ArgumentTypeError(f"Unsupported operator in --where {' '.join(parts)}. "
+                                         f"Use one of {list(delete.OPERATORS)}")
+    values = parts[1 + size:]
+    if operator in ('is null', 'is not null'):
+        return (parts[0], operator)
+    if operator in ('in', 'not in'):
+        return (parts[0], operator, [_value(item) for value in values for item in value.split(',') if item])
+    if len(values) != 1:
+        raise argparse.ArgumentTypeError(f"--where {' '.join(parts)} needs exactly one value")
+    return (parts[0], operator, _value(values[0]))
+
+
+def cmd_export(args):
+    """Stream a table or a relation to stdout or a file."""
+    import dbtools.export as export
+
+    if args.related:
+        stream = export.stream_relation(args.table, args.related[0], args.related[1], args.format, args.chunk_size)
+    else:
+        stream = export.stream_table(args.table, args.format, args.chunk_size)
+
+    with contextlib.ExitStack() as stack:
+        output = sys.stdout.buffer if args.output == '-' else stack.enter_context(open(args.output, 'wb'))
+        for chunk in stream:
+            output.write(chunk)
+    return 0
+
+
+def cmd_ids(args):
+    """Print 'name<TAB>id' for every name, looked up in chunks."""
+    import dbtools as dbt
+    import dbtools.load as load
+
+    # The table and column are interpolated into the lookup query
+    for identifier in (args.table, args.column):
+        if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', identifier):
+            raise argparse.ArgumentTypeError(f"Invalid table or column name: {identifier}")
+
+    def names():
+        if args.values and args.values != ['-']:
+            yield from args.values
+        else:
+            for line in sys.stdin:
+                line = line.rstrip('\n')
+                if line:
+                    yield line
+
+    conn = dbt.connect()
+    missing = 0
+    try:
+        cursor = conn.cursor()
+        chunk = []
+        for name in names():
+            chunk.append(name)
+            if len(chunk) == IDS_CHUNK_SIZE:
+                missing += _print_ids(cursor, load, args, chunk)
+                chunk = []
+        if chunk:
+            missing += _print_ids(cursor, load, args, chunk)
+        cursor.close()
+    finally:
+        conn.close()
+
+    if missing:
+        print(f"{missing} values not found in {args.table}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _print_ids(cursor, load, args, names):
+    """Look up a chunk of names and print 'name<TAB>id' lines; return the number not found."""
+    ids = load._lookup_ids(cursor, args.table, args.column, names)
+    missing = 0
+    for name in names:
+        if name in ids:
+            print(f"{name}\t{ids[name]}")
+        else:
+            print(f"Not found: {name}", file=sys.stderr)
+            missing += 1
+    sys.stdout.flush()
+    return missing
+
+
+def cmd_load(args):
+    """Load a CSV manifest and print 'line<TAB>id' for every loaded row."""
+    import dbtools as dbt
+    import dbtools.manifest as manifest
+
+    output = sys.stdout
+    conn = dbt.connect()
+    failed = 0
+    try:
+        with contextlib.ExitStack() as stack:
+            f = stack.enter_context(_open_input(args.manifest))
+            # The loaders report every entity on stdout: keep stdout for the 'line<TAB>id' results
+            messages = sys.stderr if args.verbose else stack.enter_context(open(os.devnull, 'w'))
+            stack.enter_context(contextlib.redirect_stdout(messages))
+
+            if args.atomic:
+                if args.kind not in manifest.REQUIRED:
+                    raise argparse.ArgumentTypeError(f"--atomic only loads {' and '.join(manifest.REQUIRED)}")
+                report = manifest.load_measurements(conn, args.kind, f, args.on_conflict)
+                results = report['results'] if report['committed'] else [
+                    result for result in report['results'] if result['error'] is not None]
+            else:
+                results = manifest.iter_load(conn, args.kind, f, args.on_conflict, args.chunk_size)
+
+            for result in results:
+                if result['error'] is None:
+                    print(f"{result['line']}\t{result['id']}", file=output)
+                else:
+                    failed += 1
+                    print(f"Line {result['line']}: {result['error']}", file=sys.stderr)
+            output.flush()
+    finally:
+        conn.close()
+
+    return 1 if failed else 0
+
+
+def cmd_delete(args):
+    """Count, or with --yes delete, the rows matching the --where predicates."""
+    import dbtools as dbt
+    import dbtools.delete as delete
+
+    predicates = [_predicate(parts) for parts in args.where]
+    conn = dbt.connect()
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            result = delete.delete_where(conn, args.table, predicates, dry_run=not args.yes)
+    finally:
+        conn.close()
+
+    if result == -1:
+        return 1
+    if args.yes:
+        print(json.dumps(result))
+    else:
+        print(f"{result} rows of {args.table} match; run again with --yes to delete them", file=sys.stderr)
+        print(result)
+    return 0
+
+
+def cmd_snapshot(args):
+    """Dump the tables to CSV files in one consistent transaction."""
+    import dbtools as dbt
+    import dbtools.export as export
+
+    conn = dbt.connect()
+    try:
+        counts = export.snapshot(conn, args.folder, args.tables)
+    finally:
+        conn.close()
+    print(json.dumps(counts))
+    return 0
+
+
+def build_parser():
+    """Build the argument parser of the console script."""
+    parser = argparse.ArgumentParser(prog='dbtools', description="Database operations from the command line.")
+    parser.add_argument('--env', help="path to the .env file with the database credentials")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help="stream a table with its metadata")
+    export.add_argument('table', help="table to export, e.g. samples")
+    export.add_argument('--related', nargs=2, metavar=('TABLE', 'INTERMEDIATE'),
+                        help="export the relation with another table through an intermediate table")
+    export.add_argument('--format', default='csv', choices=['csv', 'ndjson', 'parquet'])
+    export.add_argument('--chunk-size', type=int, default=10000, help="rows fetched per round trip")
+    export.add_argument('--output', '-o', default='-', help="output file (default stdout)")
+    export.set_defaults(func=cmd_export)
+
+    ids = commands.add_parser('ids', help="look up the ids of rows by name")
+    ids.add_argument('table', help="table to search, e.g. samples")
+    ids.add_argument('values', nargs='*', help="values to look up (default: one per line on stdin)")
+    ids.add_argument('--column', default='name', help="unique column to match (default name, e.g. file_path)")
+    ids.set_defaults(func=cmd_ids)
+
+    load = commands.add_parser('load', help="bulk-load a CSV manifest")
+    load.add_argument('kind', choices=['samples', 'ut_measurements', 'xct_measurements'])
+    load.add_argument('manifest', help="CSV manifest, '-' for stdin")
+    load.add_argument('--on-conflict', choices=['skip', 'update'], help="what to do with existing entities")
+    load.add_argument('--chunk-size', type=int, default=1000, help="rows loaded per transaction")
+    load.add_argument('--atomic', action='store_true',
+                      help="measurements only: check every row first, read missing file properties and load "
+                           "all the rows in one transaction, or none if any fails")
+    load.add_argument('--verbose', '-v', action='store_true', help="show the messages of the loaders on stderr")
+    load.set_defaults(func=cmd_load)
+
+    delete = commands.add_parser('delete', help="delete the rows matching predicates (dry run unless --yes)")
+    delete.add_argument('table', help="table to delete from, e.g. measurements")
+    delete.add_argument('--where', nargs='+', action='append', required=True, metavar='WORD',
+                        help="NAME OPERATOR [VALUE]: a column or metadata key, an operator and a value")
+    delete.add_argument('--yes', action='store_true', help="delete the rows instead of counting them")
+    delete.set_defaults(func=cmd_delete)
+
+    snapshot = commands.add_parser('snapshot', help="dump tables to CSV files in one consistent transaction")
+    snapshot.add_argument('folder', help="folder where the files are written")
+    snapshot.add_argument('--tables', nargs='+', help="tables to dump (default all)")
+    snapshot.set_defaults(func=cmd_snapshot)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.env is not None:
+        import dbtools as dbt
+        dbt.load_credentials(args.env)
+
+    try:
+        return args.func(args)
+    except argparse.ArgumentTypeError as e:
+        print(f"dbtools: error: {e}", file=sys.stderr)
+        return 2
+    except BrokenPipeError:
+        # The reader of the output went away (e.g. piped into head)
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,435 @@
+"""
+Columnar Retrieval Module
+
+This module implements the retrieval functions of dbtools (get_data,
+get_data_metadata, data_parent, multiple_parents and relation_metadata) on a
+columnar engine instead of pandas. Every table is streamed with
+COPY (...) TO STDOUT and parsed by the multithreaded CSV reader of pyarrow into
+Arrow buffers, and the metadata widening and the joins run in polars, which
+uses all the cores and creates no Python object per value.
+
+The functions are called through the backend argument of the dbtools
+functions, which returns a polars DataFrame (backend='polars') or a pyarrow
+Table (backend='arrow'):
+
+    data = dbt.relation_metadata('measurements', 'samples', 'sample_measurements', backend='polars')
+    frame = data.to_pandas()            # only if pandas is needed at the end
+
+The results have the same rows and columns as with pandas. Missing values are
+nulls in every column type (integer columns stay integers), JSON columns are
+kept as text and the order of the rows of a join is not guaranteed. All the
+tables of one call are read over a single connection.
+
+Dependencies:
+    - pyarrow: For reading the tables into Arrow buffers
+    - polars (1.0 or later): For the metadata widening and the joins
+"""
+
+import io
+
+import dbtools as dbt
+from dbtools.dbtools import CATEGORY_RATIO, _BOOL_OIDS, _TEXT_OIDS
+
+# Return types of the columnar backends
+BACKENDS = ('arrow', 'polars')
+
+# PostgreSQL type OIDs read with an explicit Arrow type; the other types are inferred
+_TIMESTAMP_TYPES = {
+    1082: ('date32', ()),
+    1114: ('timestamp', ('us',)),
+    1184: ('timestamp', ('us', 'UTC')),
+}
+
+
+def _modules():
+    """Import pyarrow and polars, with a clear message if they are missing."""
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pv
+        import polars as pl
+    except ImportError as e:
+        raise ImportError("The arrow and polars backends require pyarrow and polars: " + str(e))
+    return pa, pv, pl
+
+
+def _read_table(cursor, table_name):
+    """
+    Read a whole table with COPY ... TO STDOUT into a polars DataFrame.
+
+    Parameters:
+    -----------
+    cursor : psycopg2.cursor
+        An active database cursor object.
+    table_name : str
+        The name of the table.
+
+    Returns:
+    --------
+    pl.DataFrame
+        The rows of the table, with its column names.
+    """
+    pa, pv, pl = _modules()
+
+    query = f"SELECT * FROM {table_name}"
+
+    # Column names and types of the table, without reading any rows
+    cursor.execute(f"{query} LIMIT 0")
+    columns = [(desc[0], desc[1]) for desc in cursor.description]
+
+    buffer = io.BytesIO()
+    cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true, NULL '\\N')", buffer)
+    buffer.seek(0)
+
+    column_types = {}
+    for name, oid in columns:
+        if oid in _BOOL_OIDS:
+            column_types[name] = pa.bool_()
+        elif oid in _TEXT_OIDS:
+            # Text (and JSON) is never inferred, so '001' stays a string
+            column_types[name] = pa.string()
+        elif oid in _TIMESTAMP_TYPES:
+            type_name, arguments = _TIMESTAMP_TYPES[oid]
+            column_types[name] = getattr(pa, type_name)(*arguments)
+
+    table = pv.read_csv(buffer, convert_options=pv.ConvertOptions(
+        column_types=column_types,
+        null_values=['\\N'],
+        strings_can_be_null=True,
+        # COPY quotes the text values equal to the NULL marker
+        quoted_strings_can_be_null=False,
+        true_values=['t'],
+        false_values=['f']))
+
+    return pl.from_arrow(table)
+
+
+def _drop_empty(data):
+    """Remove the columns that only hold nulls, as dropna(axis=1, how='all') does."""
+    return data.select([name for name in data.columns if data[name].null_count() < data.height])
+
+
+def _suffix(data, table_name):
+    """Add the singular table name to the column names, e.g. 'id' -> 'id_sample'."""
+    return data.rename({name: name + '_' + table_name[:-1] for name in data.columns})
+
+
+def compact(data, category_ratio=CATEGORY_RATIO):
+    """
+    Reduce the memory used by a polars DataFrame, like dbtools.compact_frame.
+
+    Id columns are cast to the smallest integer type that holds them and text
+    columns with few distinct values become categorical.
+
+    Parameters:
+    -----------
+    data : pl.DataFrame
+        The dataframe to compact.
+    category_ratio : float
+        Text columns with at most this fraction of distinct values become
+        categorical.
+
+    Returns:
+    --------
+    pl.DataFrame
+        The dataframe with the same values in smaller types.
+    """
+    _, _, pl = _modules()
+
+    conversions = []
+    for name in data.columns:
+        column = data[name]
+        present = data.height - column.null_count()
+        if present == 0:
+            continue
+        if 'id' in name.split('_') and column.dtype.is_integer():
+            conversions.append(column.shrink_dtype())
+        elif column.dtype == pl.String and column.n_unique() <= category_ratio * present:
+            conversions.append(pl.col(name).cast(pl.Categorical))
+    return data.with_columns(conversions)
+
+
+def widen(data, metadata, id_column_name):
+    """
+    Add one column per metadata key to the data, like dbtools.metadata_add.
+
+    The metadata rows are pivoted in one pass instead of row by row. Values
+    are rendered as '<value> <type>' and, for a key given several times for
+    the same row, the last value is kept.
+
+    Parameters:
+    -----------
+    data : pl.DataFrame
+        The main data, with an 'id' column.
+    metadata : pl.DataFrame
+        The metadata, with key, value and type columns.
+    id_column_name : str
+        The column of metadata holding the id of the data row.
+
+    Returns:
+    --------
+    pl.DataFrame
+        The data with the metadata columns added.
+    """
+    _, _, pl = _modules()
+
+    if data.height == 0 or metadata.height == 0:
+        return data
+
+    values = metadata.select(
+        pl.col(id_column_name).cast(data.schema['id']).alias('_id'),
+        pl.col('key').cast(pl.String),
+        (pl.col('value').cast(pl.String) + ' ' + pl.col('type').cast(pl.String)).alias('_value'))
+    wide = values.pivot(on='key', index='_id', values='_value', aggregate_function='last')
+
+    merged = data.join(wide, left_on='id', right_on='_id', how='left', suffix='_metadata')
+
+    # Metadata keys named like a column of the table replace its value where they are set
+    replaced = [name for name in wide.columns if name != '_id' and name in data.columns]
+    if replaced:
+        merged = merged.with_columns([
+            pl.coalesce(pl.col(name + '_metadata'), pl.col(name).cast(pl.String)).alias(name)
+            for name in replaced
+        ]).drop([name + '_metadata' for name in replaced])
+
+    return merged
+
+
+def join(data, parent_data, left_on, right_on, suffixes):
+    """
+    Inner join of two dataframes keeping both key columns, like pandas.merge.
+
+    Parameters:
+    -----------
+    data : pl.DataFrame
+        The left dataframe.
+    parent_data : pl.DataFrame
+        The right dataframe.
+    left_on : str
+        The key column of data.
+    right_on : str
+        The key column of parent_data.
+    suffixes : tuple
+        Suffixes added to the column names present in both dataframes.
+
+    Returns:
+    --------
+    pl.DataFrame
+        The joined dataframe.
+    """
+    overlap = set(data.columns) & set(parent_data.columns)
+    if overlap:
+        data = data.rename({name: name + suffixes[0] for name in overlap})
+        parent_data = parent_data.rename({name: name + suffixes[1] for name in overlap})
+        left_on = left_on + suffixes[0] if left_on in overlap else left_on
+        right_on = right_on + suffixes[1] if right_on in overlap else right_on
+
+    return data.join(parent_data, left_on=left_on, right_on=right_on, how='inner', coalesce=False)
+
+
+def _get_data(cursor, table_name, compact_frames):
+    """get_data on an open cursor."""
+    data = _drop_empty(_read_table(cursor, table_name))
+    if compact_frames:
+        data = compact(data)
+    return _suffix(data, table_name)
+
+
+def _get_data_metadata(cursor, table_name, compact_frames):
+    """get_data_metadata on an open cursor."""
+    data = _read_table(cursor, table_name)
+    metadata = _read_table(cursor, table_name[:-1] + '_metadata')
+    data = _drop_empty(widen(data, metadata, table_name[:-1] + '_id'))
+    if compact_frames:
+        data = compact(data)
+    return _suffix(data, table_name)
+
+
+def _run(function, *args):
+    """Call function(cursor, *args) over a new connection."""
+    conn = dbt.connect()
+    try:
+        cursor = conn.cursor()
+        result = function(cursor, *args)
+        cursor.close()
+    finally:
+        conn.close()
+    return result
+
+
+def get_data(table_name, compact_frames=False):
+    """
+    Load a table, as dbtools.get_data does.
+
+    Parameters:
+    -----------
+    table_name : str
+        The name of the table.
+    compact_frames : bool
+        If True, the columns are converted to smaller types (see compact).
+
+    Returns:
+    --------
+    pl.DataFrame
+        The table, with the column names suffixed by the singular table name.
+    """
+    return _run(_get_data, table_name, compact_frames)
+
+
+def get_data_metadata(table_name, compact_frames=False):
+    """
+    Load a table with one column per metadata key, as dbtools.get_data_metadata does.
+
+    Parameters:
+    -----------
+    table_name : str
+        The name of the table.
+    compact_frames : bool
+        If True, the columns are converted to smaller types (see compact).
+
+    Returns:
+    --------
+    pl.DataFrame
+        The table and its metadata, with the column names suffixed by the
+        singular table name.
+    """
+    return _run(_get_data_metadata, table_name, compact_frames)
+
+
+def data_parent(table_name, parent_name, column_parent_id_name=None, compact_frames=False):
+    """
+    Load a table and its parent table, as dbtools.data_parent does.
+
+    Parameters:
+    -----------
+    table_name : str
+        The name of the table.
+    parent_name : str
+        The name of the parent table.
+    column_parent_id_name : str, optional
+        The column of the table holding the id of the parent, by default
+        '<parent>_id'.
+    compact_frames : bool
+        If True, the tables are converted to smaller types before the join.
+
+    Returns:
+    --------
+    pl.DataFrame
+        The joined table and parent table with their metadata.
+    """
+    def run(cursor):
+        data = _get_data_metadata(cursor, table_name, compact_frames)
+        parent_data = _get_data_metadata(cursor, parent_name, compact_frames)
+        parent_column = (column_parent_id_name or parent_name[:-1] + '_id') + '_' + table_name[:-1]
+        suffixes = ('_' + table_name[:-1], '_' + parent_name[:-1])
+        merged = join(data, parent_data, parent_column, 'id' + suffixes[1], suffixes).drop(parent_column)
+        return _drop_empty(merged)
+
+    return _run(run)
+
+
+def multiple_parents(table_name, parents_names, column_parent_id_names, compact_frames=False):
+    """
+    Load a table and several parent tables, as dbtools.multiple_parents does.
+
+    Parameters:
+    -----------
+    table_name : str
+        The name of the table.
+    parents_names : list
+        The names of the parent tables.
+    column_parent_id_names : list
+        The columns of the table holding the ids of the parents.
+    compact_frames : bool
+        If True, the tables are converted to smaller types before the joins.
+
+    Returns:
+    --------
+    pl.DataFrame
+        The table joined with all its parents.
+    """
+    # Same suffixes as the pandas implementation
+    suffixes = [''] + ['_' + name[:-1] for name in parents_names]
+    suffixes_list = []
+    for i, value in enumerate(suffixes):
+        if i == 0:
+            suffixes_list.append([value, suffixes[i + 1]])
+        elif i > 1:
+            suffixes_list.append(['', value])
+
+    def run(cursor):
+        data = _get_data_metadata(cursor, table_name, compact_frames)
+        for parent_name, column_parent_id_name, suffix in zip(parents_names, column_parent_id_names, suffixes_list):
+            parent_data = _get_data_metadata(cursor, parent_name, compact_frames)
+            data = join(data, parent_data, column_parent_id_name, 'id' + suffix[1], suffix).drop(column_parent_id_name)
+        return _drop_empty(data)
+
+    return _run(run)
+
+
+def relation_metadata(table1_name, table2_name, intermediate_table_name, compact_frames=False):
+    """
+    Load two tables related through an intermediate table, as dbtools.relation_metadata does.
+
+    Parameters:
+    -----------
+    table1_name : str
+        The name of the first table.
+    table2_name : str
+        The name of the second table.
+    intermediate_table_name : str
+        The name of the intermediate relationship table.
+    compact_frames : bool
+        If True, the tables are converted to smaller types before the joins.
+
+    Returns:
+    --------
+    pl.DataFrame
+        One row per related pair with the columns and metadata of both tables.
+
+    Raises:
+    -------
+    ValueError
+        If the intermediate table is empty.
+    """
+    intermediate_suffix = '_' + intermediate_table_name[:-1]
+    column_id_1 = table1_name[:-1] + '_id' + intermediate_suffix
+    column_id_2 = table2_name[:-1] + '_id' + intermediate_suffix
+
+    def run(cursor):
+        data1 = _get_data_metadata(cursor, table1_name, compact_frames)
+        data2 = _get_data_metadata(cursor, table2_name, compact_frames)
+        intermediate_data = _get_data(cursor, intermediate_table_name, compact_frames)
+
+        if intermediate_data.height == 0:
+            raise ValueError(f"The intermediate table '{intermediate_table_name}' is empty. "
+                             "Cannot perform relation merge.")
+        intermediate_data = intermediate_data.drop('id' + intermediate_suffix)
+
+        merged = join(data1, intermediate_data, 'id_' + table1_name[:-1], column_id_1,
+                      ('', '_' + table1_name[:-1]))
+        merged = join(merged, data2, column_id_2, 'id_' + table2_name[:-1], ('', '_' + table2_name[:-1]))
+        merged = merged.drop(intermediate_data.columns)
+        return _drop_empty(merged)
+
+    return _run(run)
+
+
+def convert(data, backend):
+    """
+    Convert a polars DataFrame to the type returned by a backend.
+
+    Parameters:
+    -----------
+    data : pl.DataFrame
+        The result of a retrieval function.
+    backend : str
+        'polars' returns data unchanged, 'arrow' returns a pyarrow Table.
+
+    Returns:
+    --------
+    pl.DataFrame or pa.Table
+        The result in the type of the backend.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported backend '{backend}'. Use one of {list(BACKENDS)}")
+    return data.to_arrow() if backend == 'arrow' else data
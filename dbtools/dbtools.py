@@ -1,13 +1,37 @@
 # imports
-import psycopg2
-import pandas as pd
-from dotenv import load_dotenv
+# pandas, psycopg2 and dotenv take most of the startup time of a script, so they
+# are imported by the functions that use them, on first call. The annotations
+# are not evaluated at import time.
+from __future__ import annotations
+
 import os
-from typing import Dict, List, Optional, Any, Union
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Any, Union
+
+import dbtools.tracing as tracing
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import psycopg2
 
 # Global variable to store the environment path
 _ENV_PATH = None
 
+# Ways of reading query results: row by row with fetchall(), or in one COPY ... TO STDOUT
+FETCH_METHODS = ('fetch', 'copy')
+
+# Engines of the retrieval functions: pandas, or dbtools.columnar returning Arrow tables or polars frames
+BACKENDS = ('pandas', 'arrow', 'polars')
+
+# Type OIDs of the columns that the COPY path keeps as text when parsing the CSV
+_BOOL_OIDS = (16,)
+_JSON_OIDS = (114, 3802)
+_TEXT_OIDS = (18, 19, 25, 1042, 1043) + _BOOL_OIDS + _JSON_OIDS
+_TIMESTAMP_OIDS = (1082, 1114, 1184)
+
+# Text columns with at most this fraction of distinct values become categorical in compact frames
+CATEGORY_RATIO = 0.5
+
 def load_credentials(env_path: Optional[str] = None) -> Dict[str, str]:
     """
     Loads the database credentials from a .env file.
@@ -18,6 +42,8 @@ def load_credentials(env_path: Optional[str] = None) -> Dict[str, str]:
     Returns:
     Dict[str, str]: A dictionary containing the database credentials.
     """
+    from dotenv import load_dotenv
+
     global _ENV_PATH
     
     # Update global env_path if a new path is provided
@@ -37,6 +63,7 @@ def load_credentials(env_path: Optional[str] = None) -> Dict[str, str]:
         'password': os.getenv('DB_PASSWORD')
     }
 
+@tracing.traced
 def connect(env_path: Optional[str] = None) -> psycopg2.extensions.connection:
     """
     Establishes a connection to the PostgreSQL database.
@@ -47,20 +74,32 @@ def connect(env_path: Optional[str] = None) -> psycopg2.extensions.connection:
 
     Returns:
     psycopg2.extensions.connection: A connection object to the PostgreSQL database.
+                                    Its cursors record their queries in dbtools.instrument.
     """
+    import psycopg2
+    import dbtools.instrument as instrument
+
     # Load credentials from environment file
     credentials = load_credentials(env_path)
 
-    # Establish database connection using credentials
-    conn = psycopg2.connect(
-        host=credentials['host'],
-        database=credentials['database'],
-        user=credentials['user'],
-        password=credentials['password'])
+    # Establish database connection using credentials, timing the acquisition
+    start = time.perf_counter()
+    try:
+        conn = psycopg2.connect(
+            host=credentials['host'],
+            database=credentials['database'],
+            user=credentials['user'],
+            password=credentials['password'],
+            cursor_factory=instrument.InstrumentedCursor)
+    except Exception as e:
+        instrument.record_connect(time.perf_counter() - start, e)
+        raise
+    instrument.record_connect(time.perf_counter() - start)
     return conn
 
 # DATAFRAME MANAGEMENT
 
+@tracing.traced
 def metadata_add(data: pd.DataFrame, metadata: pd.DataFrame, id_column_name: str) -> pd.DataFrame:
     """
     Adds metadata to the data dataframe.
@@ -73,6 +112,8 @@ def metadata_add(data: pd.DataFrame, metadata: pd.DataFrame, id_column_name: str
     Returns:
     pd.DataFrame: The data dataframe with metadata added.
     """
+    import pandas as pd
+
     # Get the id column of data
     ids = data['id']
 
@@ -91,6 +132,7 @@ def metadata_add(data: pd.DataFrame, metadata: pd.DataFrame, id_column_name: str
 
     return data
 
+@tracing.traced
 def parent_add(data: pd.DataFrame, parent_data: pd.DataFrame, 
                column_parent_id_name: str, suffixes: tuple = ('_data', '_parent')) -> pd.DataFrame:
     """
@@ -105,6 +147,8 @@ def parent_add(data: pd.DataFrame, parent_data: pd.DataFrame,
     Returns:
     pd.DataFrame: The concatenated dataframe with parent data joined.
     """
+    import pandas as pd
+
     # Merge the data and parent_data dataframes based on the specified column
     merged_data = pd.merge(data, parent_data, left_on=column_parent_id_name, 
                           right_on='id' + suffixes[1], how='inner', suffixes=suffixes)
@@ -114,18 +158,169 @@ def parent_add(data: pd.DataFrame, parent_data: pd.DataFrame,
 
     return merged_data
 
+def _compact_column(values: pd.Series, category_ratio: float) -> pd.Series:
+    """
+    Converts a column to a smaller dtype if it has one (see compact_frame).
+    """
+    import numpy as np
+    from pandas.api import types
+
+    non_null = values.dropna()
+    if non_null.empty:
+        return values
+
+    # Id columns ('id', 'sample_id', ...) become the smallest integer type holding them,
+    # a nullable one if they have missing values (which made them floats)
+    if 'id' in str(values.name).split('_'):
+        if not (types.is_integer_dtype(values) or types.is_float_dtype(values)) or types.is_bool_dtype(values):
+            return values
+        if not (non_null == non_null.round()).all():
+            return values
+        low, high = non_null.min(), non_null.max()
+        for dtype in ('int8', 'int16', 'int32', 'int64'):
+            if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+                break
+        return values.astype(dtype.capitalize() if values.isna().any() else dtype)
+
+    if not (values.dtype == object or types.is_string_dtype(values)):
+        return values
+
+    kinds = set(non_null.map(type))
+    # Booleans with missing values are stored as objects
+    if kinds == {bool}:
+        return values.astype('boolean')
+    # Repeated strings (types, units, metadata values) are stored once per distinct value
+    if kinds == {str} and non_null.nunique() <= category_ratio * len(non_null):
+        return values.astype('category')
+    return values
+
+@tracing.traced
+def compact_frame(data: pd.DataFrame, category_ratio: float = CATEGORY_RATIO) -> pd.DataFrame:
+    """
+    Reduces the memory used by a dataframe returned by the retrieval functions.
+
+    Id columns are downcast to the smallest integer type that holds them (nullable Int8 to
+    Int64 if they have missing values), text columns with few distinct values (e.g. the
+    metadata values and nominal columns such as signal_type, dtype or file_type) become
+    categorical and object columns of booleans become the nullable boolean type.
+    Other columns are unchanged.
+
+    Parameters:
+    data (pd.DataFrame): The dataframe to compact.
+    category_ratio (float): Text columns with at most this fraction of distinct values
+                            among their non-missing values become categorical.
+
+    Returns:
+    pd.DataFrame: A dataframe with the same columns and values, in smaller dtypes.
+    """
+    import pandas as pd
+
+    if data.shape[1] == 0:
+        return data
+
+    # Columns are converted one by one, which keeps duplicated column names
+    return pd.concat([_compact_column(values, category_ratio) for _, values in data.items()], axis=1)
+
 # QUERY FUNCTIONS
 
-def get_data(table_name: str) -> pd.DataFrame:
+def _columnar_backend(backend: str) -> Any:
+    """
+    Checks the backend argument of a retrieval function.
+
+    Parameters:
+    backend (str): One of BACKENDS.
+
+    Returns:
+    module: dbtools.columnar for the 'arrow' and 'polars' backends, None for 'pandas'.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported backend '{backend}'. Use one of {list(BACKENDS)}")
+    if backend == 'pandas':
+        return None
+    import dbtools.columnar as columnar
+    return columnar
+
+def _read_query(cursor: psycopg2.extensions.cursor, query: str, method: str = 'fetch') -> pd.DataFrame:
+    """
+    Runs a SELECT query and returns its result as a dataframe.
+
+    Parameters:
+    cursor (psycopg2.extensions.cursor): The cursor used to run the query.
+    query (str): The SELECT query.
+    method (str): 'fetch' builds the dataframe from the rows returned by fetchall().
+                  'copy' streams the result with COPY (query) TO STDOUT as CSV and parses it
+                  with the C parser of pandas into columns, without creating a Python object
+                  per value, which is several times faster for large tables.
+
+    Returns:
+    pd.DataFrame: The result of the query.
+    """
+    import io
+    import json
+    import pandas as pd
+
+    if method not in FETCH_METHODS:
+        raise ValueError(f"Unsupported method '{method}'. Use one of {list(FETCH_METHODS)}")
+
+    if method == 'fetch':
+        cursor.execute(query)
+        records = cursor.fetchall()
+        colnames = [desc[0] for desc in cursor.description]
+        return pd.DataFrame(records, columns=colnames)
+
+    # Column names and types of the result, without running the query
+    cursor.execute(f"SELECT * FROM ({query}) AS q LIMIT 0")
+    columns = [(desc[0], desc[1]) for desc in cursor.description]
+
+    buffer = io.BytesIO()
+    cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true, NULL '\\N')", buffer)
+    buffer.seek(0)
+
+    # Text columns are not inferred, so '001' or 'NaN' stay strings; NULL is the only missing value
+    data = pd.read_csv(
+        buffer,
+        dtype={name: str for name, oid in columns if oid in _TEXT_OIDS},
+        na_values=['\\N'],
+        keep_default_na=False,
+        parse_dates=[name for name, oid in columns if oid in _TIMESTAMP_OIDS])
+    data.columns = [name for name, _ in columns]
+
+    # Convert the values that psycopg2 would have converted
+    for name, oid in columns:
+        if oid in _BOOL_OIDS:
+            data[name] = data[name].map({'t': True, 'f': False})
+        elif oid in _JSON_OIDS:
+            data[name] = data[name].map(json.loads, na_action='ignore')
+
+    return data
+
+@tracing.traced
+def get_data(table_name: str, method: str = 'fetch', compact: bool = False,
+             backend: str = 'pandas') -> pd.DataFrame:
     """
     Loads data from a specified table in the database.
 
     Parameters:
     table_name (str): The name of the table to load data from.
+    method (str): How the rows are read: 'fetch' (row by row) or 'copy' (COPY ... TO STDOUT,
+                  faster for large tables).
+    compact (bool): If True, the dataframe is converted to smaller dtypes (see compact_frame).
+    backend (str): 'pandas' (default), or 'polars' or 'arrow' to read the tables with COPY into Arrow
+                   buffers and join them in polars (see dbtools.columnar); method is then ignored.
 
     Returns:
     pd.DataFrame: The loaded data as a pandas dataframe.
+                  A polars DataFrame or a pyarrow Table with the columnar backends.
     """
+    import psycopg2
+
+    columnar = _columnar_backend(backend)
+    if columnar is not None:
+        return columnar.convert(columnar.get_data(table_name, compact), backend)
+
+    if method not in FETCH_METHODS:
+        raise ValueError(f"Unsupported method '{method}'. Use one of {list(FETCH_METHODS)}")
+
     # Connect to the database
     try:
         conn = connect()
@@ -138,21 +333,16 @@ def get_data(table_name: str) -> pd.DataFrame:
     # Create SQL query to select all data from the specified table
     query = f"SELECT * FROM {table_name}"
 
-    # Execute the query
-    cursor.execute(query)
-
-    # Fetch all the records
-    records = cursor.fetchall()
-
-    # Get the column names
-    colnames = [desc[0] for desc in cursor.description]
-
-    # Create a pandas dataframe from the records
-    data = pd.DataFrame(records, columns=colnames)
+    # Execute the query and read the records into a pandas dataframe
+    data = _read_query(cursor, query, method)
 
     # Remove columns that are entirely NaN values
     data = data.dropna(axis=1, how='all')
 
+    # Convert to smaller dtypes if requested
+    if compact:
+        data = compact_frame(data)
+
     # Rename columns to include the table name
     data.columns = [str(col) + '_' + table_name[:-1] for col in data.columns]
 
@@ -162,16 +352,33 @@ def get_data(table_name: str) -> pd.DataFrame:
 
     return data
 
-def get_data_metadata(table_name: str) -> pd.DataFrame:
+@tracing.traced
+def get_data_metadata(table_name: str, method: str = 'fetch', compact: bool = False,
+                      backend: str = 'pandas') -> pd.DataFrame:
     """
     Loads data and its metadata from specified tables in the database.
 
     Parameters:
     table_name (str): The name of the table to load data from.
+    method (str): How the rows are read: 'fetch' (row by row) or 'copy' (COPY ... TO STDOUT,
+                  faster for large tables).
+    compact (bool): If True, the dataframe is converted to smaller dtypes (see compact_frame).
+    backend (str): 'pandas' (default), or 'polars' or 'arrow' to read the tables with COPY into Arrow
+                   buffers and join them in polars (see dbtools.columnar); method is then ignored.
 
     Returns:
     pd.DataFrame: The loaded data with metadata as a pandas dataframe.
+                  A polars DataFrame or a pyarrow Table with the columnar backends.
     """
+    import psycopg2
+
+    columnar = _columnar_backend(backend)
+    if columnar is not None:
+        return columnar.convert(columnar.get_data_metadata(table_name, compact), backend)
+
+    if method not in FETCH_METHODS:
+        raise ValueError(f"Unsupported method '{method}'. Use one of {list(FETCH_METHODS)}")
+
     # Construct metadata table name by replacing 's' with '_metadata'
     metadata_name = table_name[:-1] + '_metadata'
     
@@ -188,18 +395,10 @@ def get_data_metadata(table_name: str) -> pd.DataFrame:
     cursor = conn.cursor()
 
     # Fetch data from main table
-    query = f"SELECT * FROM {table_name}"
-    cursor.execute(query)
-    records = cursor.fetchall()
-    colnames = [desc[0] for desc in cursor.description]
-    data = pd.DataFrame(records, columns=colnames)
+    data = _read_query(cursor, f"SELECT * FROM {table_name}", method)
 
     # Fetch data from metadata table
-    query = f"SELECT * FROM {metadata_name}"
-    cursor.execute(query)
-    records = cursor.fetchall()
-    colnames = [desc[0] for desc in cursor.description]
-    metadata = pd.DataFrame(records, columns=colnames)
+    metadata = _read_query(cursor, f"SELECT * FROM {metadata_name}", method)
 
     # Join metadata with main data
     data = metadata_add(data, metadata, id_column_name)
@@ -207,6 +406,10 @@ def get_data_metadata(table_name: str) -> pd.DataFrame:
     # Remove columns that are entirely NaN values
     data = data.dropna(axis=1, how='all')
 
+    # Convert to smaller dtypes if requested
+    if compact:
+        data = compact_frame(data)
+
     # Rename columns to include the table name
     data.columns = [str(col) + '_' + table_name[:-1] for col in data.columns]
 
@@ -216,7 +419,9 @@ def get_data_metadata(table_name: str) -> pd.DataFrame:
 
     return data
 
-def data_parent(table_name: str, parent_name: str, column_parent_id_name: Optional[str] = None) -> pd.DataFrame:
+@tracing.traced
+def data_parent(table_name: str, parent_name: str, column_parent_id_name: Optional[str] = None,
+                method: str = 'fetch', compact: bool = False, backend: str = 'pandas') -> pd.DataFrame:
     """
     Loads data, its metadata, and parent data from specified tables in the database.
 
@@ -225,15 +430,25 @@ def data_parent(table_name: str, parent_name: str, column_parent_id_name: Option
     parent_name (str): The name of the parent table to load data from.
     column_parent_id_name (Optional[str]): The column name in data that corresponds to the id in parent_data.
                                           If None, it's automatically generated.
+    method (str): How the rows are read: 'fetch' or 'copy' (see get_data).
+    compact (bool): If True, the tables are read into smaller dtypes before joining (see compact_frame).
+    backend (str): 'pandas' (default), or 'polars' or 'arrow' to read the tables with COPY into Arrow
+                   buffers and join them in polars (see dbtools.columnar); method is then ignored.
 
     Returns:
     pd.DataFrame: The loaded data with metadata and parent data as a pandas dataframe.
+                  A polars DataFrame or a pyarrow Table with the columnar backends.
     """
+    columnar = _columnar_backend(backend)
+    if columnar is not None:
+        return columnar.convert(
+            columnar.data_parent(table_name, parent_name, column_parent_id_name, compact), backend)
+
     # Get data with metadata for the main table
-    data = get_data_metadata(table_name)
+    data = get_data_metadata(table_name, method, compact)
     
     # Get data with metadata for the parent table
-    parent_data = get_data_metadata(parent_name)
+    parent_data = get_data_metadata(parent_name, method, compact)
 
     # If parent ID column name is not provided, generate it
     if column_parent_id_name is None:
@@ -253,8 +468,10 @@ def data_parent(table_name: str, parent_name: str, column_parent_id_name: Option
 
     return merged_data
 
+@tracing.traced
 def multiple_parents(table_name: str, parents_names: List[str], 
-                    column_parent_id_names: List[str]) -> pd.DataFrame:
+                    column_parent_id_names: List[str], method: str = 'fetch',
+                    compact: bool = False, backend: str = 'pandas') -> pd.DataFrame:
     """
     Loads data, its metadata, and multiple parent data from specified tables in the database.
 
@@ -262,10 +479,20 @@ def multiple_parents(table_name: str, parents_names: List[str],
     table_name (str): The name of the table to load data from.
     parents_names (List[str]): The names of the parent tables to load data from.
     column_parent_id_names (List[str]): The column names in data that correspond to the ids in parent_data.
+    method (str): How the rows are read: 'fetch' or 'copy' (see get_data).
+    compact (bool): If True, the tables are read into smaller dtypes before joining (see compact_frame).
+    backend (str): 'pandas' (default), or 'polars' or 'arrow' to read the tables with COPY into Arrow
+                   buffers and join them in polars (see dbtools.columnar); method is then ignored.
 
     Returns:
     pd.DataFrame: The loaded data with metadata and multiple parent data as a pandas dataframe.
+                  A polars DataFrame or a pyarrow Table with the columnar backends.
     """
+    columnar = _columnar_backend(backend)
+    if columnar is not None:
+        return columnar.convert(
+            columnar.multiple_parents(table_name, parents_names, column_parent_id_names, compact), backend)
+
     # Generate suffixes for column naming
     suffixes = [''] + ['_' + name[:-1] for name in parents_names]
     
@@ -278,12 +505,12 @@ def multiple_parents(table_name: str, parents_names: List[str],
             suffixes_list.append(['', value])
 
     # Get data with metadata for the main table
-    data = get_data_metadata(table_name)
+    data = get_data_metadata(table_name, method, compact)
 
     # Iteratively merge each parent table
     for parent_name, column_parent_id_name, suffix in zip(parents_names, column_parent_id_names, suffixes_list):
         # Get data for the current parent
-        parent_data = get_data_metadata(parent_name)
+        parent_data = get_data_metadata(parent_name, method, compact)
         
         # Merge parent data with the main dataset
         data = parent_add(data, parent_data, column_parent_id_name, suffixes=suffix)
@@ -293,7 +520,9 @@ def multiple_parents(table_name: str, parents_names: List[str],
     
     return data
 
-def relation_metadata(table1_name: str, table2_name: str, intermediate_table_name: str) -> pd.DataFrame:
+@tracing.traced
+def relation_metadata(table1_name: str, table2_name: str, intermediate_table_name: str,
+                      method: str = 'fetch', compact: bool = False, backend: str = 'pandas') -> pd.DataFrame:
     """
     Loads data from two tables related by an intermediate relationship table.
 
@@ -301,20 +530,32 @@ def relation_metadata(table1_name: str, table2_name: str, intermediate_table_nam
     table1_name (str): The name of the first table to load data from.
     table2_name (str): The name of the second table to load data from.
     intermediate_table_name (str): The name of the intermediate relationship table.
+    method (str): How the rows are read: 'fetch' or 'copy' (see get_data).
+    compact (bool): If True, the tables are read into smaller dtypes before joining (see compact_frame).
+    backend (str): 'pandas' (default), or 'polars' or 'arrow' to read the tables with COPY into Arrow
+                   buffers and join them in polars (see dbtools.columnar); method is then ignored.
 
     Returns:
     pd.DataFrame: The loaded data with metadata from the two related tables as a pandas dataframe.
+                  A polars DataFrame or a pyarrow Table with the columnar backends.
     """
+    import pandas as pd
+
+    columnar = _columnar_backend(backend)
+    if columnar is not None:
+        return columnar.convert(
+            columnar.relation_metadata(table1_name, table2_name, intermediate_table_name, compact), backend)
+
     # Generate column names for join conditions
     column_id_1 = table1_name[:-1] + '_id'
     column_id_2 = table2_name[:-1] + '_id'
 
     # Get data with metadata for both main tables
-    data1 = get_data_metadata(table1_name)
-    data2 = get_data_metadata(table2_name)
+    data1 = get_data_metadata(table1_name, method, compact)
+    data2 = get_data_metadata(table2_name, method, compact)
     
     # Get data from the intermediate table
-    intermediate_data = get_data(intermediate_table_name)
+    intermediate_data = get_data(intermediate_table_name, method, compact)
 
     #check if the intermediate table is empty
     if intermediate_data.empty:
@@ -354,6 +595,7 @@ def relation_metadata(table1_name: str, table2_name: str, intermediate_table_nam
     
     return merged_data
 
+@tracing.traced
 def get_id(table_name,keys,values):
 
     """
@@ -1,35 +1,549 @@
+from psycopg2 import sql
+
 import dbtools as dbt
 
-def delete(conn,table_name,ids):
+# Number of ids deleted per statement (and per transaction unless atomic)
+DEFAULT_CHUNK_SIZE = 5000
+
+# Operators accepted by delete_where and their SQL form
+OPERATORS = {
+    '=': '=',
+    '!=': '<>',
+    '<': '<',
+    '<=': '<=',
+    '>': '>',
+    '>=': '>=',
+    'like': 'LIKE',
+    'ilike': 'ILIKE',
+    'in': 'IN',
+    'not in': 'NOT IN',
+    'is null': 'IS NULL',
+    'is not null': 'IS NOT NULL',
+}
+
+# Metadata values are stored as text: numeric comparisons cast them only when they look like numbers
+_NUMERIC_VALUE = sql.SQL("CASE WHEN md.value ~ '^\\s*[-+]?[0-9]*\\.?[0-9]+([eE][-+]?[0-9]+)?\\s*$' THEN md.value::numeric END")
+
+def _deleted_counts(cursor):
+    """
+    Gets the number of rows deleted so far in the current transaction, per table.
+
+    Rows deleted by ON DELETE CASCADE are counted in the tables they belong to.
+
+    Parameters:
+    cursor (object): Database cursor inside the transaction.
+
+    Returns:
+    dict: Dictionary mapping table names to deleted row counts.
+    """
+    cursor.execute("SELECT relname, n_tup_del FROM pg_stat_xact_user_tables WHERE n_tup_del > 0")
+    return dict(cursor.fetchall())
+
+def _report_progress(progress, table_name, done, total):
+    """
+    Reports the progress of a chunked delete.
+
+    Parameters:
+    progress (bool or callable): True to print the progress, or a function called with (done, total).
+    table_name (str): Name of the table being deleted from.
+    done (int): Number of ids processed so far.
+    total (int): Total number of ids to process.
+    """
+    if callable(progress):
+        progress(done, total)
+    elif progress:
+        print(f"Deleting from {table_name}: {done}/{total} ids processed")
+
+def delete(conn,table_name,ids,chunk_size=DEFAULT_CHUNK_SIZE,progress=True,atomic=False):
     """
     Deletes rows from a specified table in the database based on a list of IDs.
 
+    The ids are passed to the server as a single array parameter (id = ANY(%s))
+    and deleted in chunks of chunk_size, so the statement size does not grow with
+    the number of ids and each chunk only holds its locks for a short time.
+
     Parameters:
     conn (object): Database connection object.
     table_name (str): Name of the table from which to delete rows.
     ids (list): List of IDs of the rows to be deleted.
+    chunk_size (int): Number of ids deleted per statement.
+    progress (bool or callable): True to print the progress after each chunk, False to
+        stay silent, or a function called with (ids processed, total ids).
+    atomic (bool): If True, all the chunks run in a single transaction that is only
+        committed at the end. Otherwise each chunk is committed on its own.
 
     Returns:
-    None
+    dict: Number of deleted rows per table, including the rows deleted by cascade
+        (e.g. {'samples': 10, 'sample_metadata': 80}), or -1 if an error occurs.
+        On error the failing chunk is rolled back (all of them if atomic) and
+        nothing else is committed.
     """
+    assert isinstance(chunk_size, int) and chunk_size > 0, "chunk_size must be a positive integer"
+
     if len(ids) == 0:
-        return
-    
-    #convert ids to int
-    ids = [int(i) for i in ids]
-    
+        return {}
+
+    #convert ids to int, drop duplicates and sort them so chunks hit neighbouring rows
+    ids = sorted({int(i) for i in ids})
+
     cursor = conn.cursor()
     conn.autocommit = False  # Start transaction
 
-    placeholders = ', '.join(['%s'] * len(ids))
-    query = f"DELETE FROM {table_name} WHERE id IN ({placeholders})"
+    query = sql.SQL("DELETE FROM {} WHERE id = ANY(%s)").format(sql.Identifier(table_name))
+
+    counts = {}
+    chunk_counts = {}
+    committed = 0
 
     try:
-        cursor.execute(query, ids)
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+
+            before = _deleted_counts(cursor)
+            cursor.execute(query, (chunk,))
+            after = _deleted_counts(cursor)
+
+            for name, count in after.items():
+                deleted = count - before.get(name, 0)
+                if deleted:
+                    chunk_counts[name] = chunk_counts.get(name, 0) + deleted
+
+            if not atomic:
+                conn.commit()
+                committed = start + len(chunk)
+                for name, count in chunk_counts.items():
+                    counts[name] = counts.get(name, 0) + count
+                chunk_counts = {}
+
+            _report_progress(progress, table_name, start + len(chunk), len(ids))
+
+        if atomic:
+            conn.commit()
+            committed = len(ids)
+            counts = chunk_counts
     except Exception as e:
         conn.rollback()  # Rollback transaction on error
         print(f"Error occurred: {e}")
+        if committed:
+            print(f"{committed} of {len(ids)} ids were already deleted from {table_name}: {counts}")
+        cursor.close()
+        return -1
+
+    cursor.close()
+
+    print(f"Deleted {counts.get(table_name, 0)} rows from {table_name} ({sum(counts.values())} rows in total including cascades)")
+
+    return counts
+
+def _foreign_keys(cursor):
+    """
+    Gets the single-column foreign keys between the tables of the public schema.
+
+    Parameters:
+    cursor (object): Database cursor.
+
+    Returns:
+    list: List of (child table, child column, parent table) tuples, one per foreign key.
+    """
+    cursor.execute("""
+        SELECT child.relname, a.attname, parent.relname
+        FROM pg_constraint c
+        JOIN pg_class child ON child.oid = c.conrelid
+        JOIN pg_class parent ON parent.oid = c.confrelid
+        JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1]
+        WHERE c.contype = 'f'
+          AND array_length(c.conkey, 1) = 1
+          AND c.connamespace = 'public'::regnamespace
+        ORDER BY child.relname, a.attname
+    """)
+    return cursor.fetchall()
+
+def _descendants(cursor, table_name, column, ids):
+    """
+    Gets the rows of a self-referencing table that descend from the given rows.
+
+    Parameters:
+    cursor (object): Database cursor.
+    table_name (str): Name of the self-referencing table (e.g. 'measurements').
+    column (str): The column referencing the parent row (e.g. 'parent_measurement_id').
+    ids (list): IDs of the root rows.
+
+    Returns:
+    dict: Dictionary mapping the IDs of the roots and all their descendants to their depth (roots are 0).
+    """
+    # Each branch carries the IDs it went through and stops at a row already on it, so
+    # parent references that form a cycle (e.g. after an update) cannot recurse forever
+    query = sql.SQL("""
+        WITH RECURSIVE tree(id, path) AS (
+            SELECT id, ARRAY[id] FROM {table} WHERE id = ANY(%s)
+            UNION ALL
+            SELECT t.id, tree.path || t.id FROM {table} t JOIN tree ON t.{column} = tree.id
+            WHERE NOT t.id = ANY(tree.path)
+        )
+        SELECT id, max(cardinality(path)) - 1 FROM tree GROUP BY id
+    """).format(table=sql.Identifier(table_name), column=sql.Identifier(column))
+    cursor.execute(query, (list(ids),))
+    return dict(cursor.fetchall())
+
+class DeletePlan:
+    """
+    The rows that depend on a set of rows, and the order in which to delete them.
+
+    Attributes:
+    table_name (str): Name of the table of the root rows.
+    rows (dict): Dictionary mapping each table to the sorted IDs of its rows to delete.
+    steps (list): List of (table name, ids) tuples in deletion order: rows referencing
+        others come first, and rows of self-referencing tables are grouped by depth,
+        deepest first.
+    """
+
+    def __init__(self, table_name, rows, steps):
+        self.table_name = table_name
+        self.rows = rows
+        self.steps = steps
+
+    def counts(self):
+        """
+        Gets the number of rows to delete per table.
+
+        Returns:
+        dict: Dictionary mapping table names to row counts, in deletion order.
+        """
+        counts = {}
+        for name, ids in self.steps:
+            counts[name] = counts.get(name, 0) + len(ids)
+        return counts
+
+    def __str__(self):
+        lines = [f"Delete plan for {len(self.rows.get(self.table_name, []))} rows of {self.table_name}:"]
+        lines += [f"  {name}: {count} rows" for name, count in self.counts().items()]
+        return '\n'.join(lines)
+
+def _plan(cursor, table_name, ids):
+    """
+    Computes the delete plan of a set of rows with the given cursor.
+
+    Parameters:
+    cursor (object): Database cursor.
+    table_name (str): Name of the table of the root rows.
+    ids (list): IDs of the root rows.
+
+    Returns:
+    DeletePlan: The plan to delete the rows and everything that depends on them.
+    """
+    foreign_keys = _foreign_keys(cursor)
+
+    # Children of each table: the (table, column) pairs that reference it
+    children = {}
+    for child, column, parent in foreign_keys:
+        children.setdefault(parent, []).append((child, column))
+
+    rows = {table_name: set()}
+    depths = {}
+    pending = {table_name: {int(i) for i in ids}}
+
+    # Walk down the foreign keys until no new rows are found, querying each
+    # table once per round with all its new ids
+    while pending:
+        parent, new_ids = pending.popitem()
+        new_ids -= rows.setdefault(parent, set())
+        if not new_ids:
+            continue
+
+        for child, column in children.get(parent, []):
+            if child == parent:
+                # Self-referencing table: get the whole subtree in one recursive query
+                tree = _descendants(cursor, parent, column, new_ids)
+                for row_id, depth in tree.items():
+                    depths[(parent, row_id)] = max(depth, depths.get((parent, row_id), 0))
+                new_ids |= set(tree)
+
+        rows[parent] |= new_ids
+
+        for child, column in children.get(parent, []):
+            if child == parent:
+                continue
+            query = sql.SQL("SELECT id FROM {} WHERE {} = ANY(%s)").format(
+                sql.Identifier(child), sql.Identifier(column))
+            cursor.execute(query, (sorted(new_ids),))
+            found = {row[0] for row in cursor.fetchall()} - rows.get(child, set())
+            if found:
+                pending.setdefault(child, set()).update(found)
+
+    rows = {name: ids for name, ids in rows.items() if ids}
+
+    # Order the tables so that every table comes before the tables it references
+    edges = {(child, parent) for child, _, parent in foreign_keys
+             if child != parent and child in rows and parent in rows}
+    order = []
+    remaining = set(rows)
+    while remaining:
+        ready = sorted(name for name in remaining
+                       if not any(parent == name and child in remaining for child, parent in edges))
+        if not ready:
+            raise ValueError(f"Circular foreign keys between tables {sorted(remaining)}")
+        order += ready
+        remaining -= set(ready)
+
+    steps = []
+    for name in order:
+        table_depths = {}
+        for row_id in rows[name]:
+            table_depths.setdefault(depths.get((name, row_id), 0), []).append(row_id)
+        for depth in sorted(table_depths, reverse=True):
+            steps.append((name, sorted(table_depths[depth])))
+
+    return DeletePlan(table_name, {name: sorted(ids) for name, ids in rows.items()}, steps)
+
+def plan_delete(conn,table_name,ids):
+    """
+    Computes everything that has to be deleted together with some rows.
+
+    The foreign keys are read from the database, so the plan follows both the
+    ON DELETE CASCADE relations and the ones without cascade (e.g. the samples
+    of a panel, the measurements of a measurement type or the measurements
+    derived from a measurement).
+
+    Parameters:
+    conn (object): Database connection object.
+    table_name (str): Name of the table of the rows to delete (e.g. 'panels').
+    ids (list): IDs of the rows to delete.
+
+    Returns:
+    DeletePlan: The plan; print it or call counts() to preview the rows per table.
+    """
+    cursor = conn.cursor()
+    try:
+        return _plan(cursor, table_name, ids)
     finally:
-        print(f"Deleted {cursor.rowcount} rows from {table_name} where id is in {ids}")
+        cursor.close()
+
+def delete_subtree(conn,table_name,ids,dry_run=True,chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Deletes rows and all the rows that depend on them, children first.
+
+    The plan is computed and executed in a single transaction, so either the
+    whole subtree is deleted or nothing is. Each table is deleted with
+    set-based statements of at most chunk_size ids.
+
+    Parameters:
+    conn (object): Database connection object.
+    table_name (str): Name of the table of the rows to delete (e.g. 'materials').
+    ids (list): IDs of the rows to delete.
+    dry_run (bool): If True (default), only print the plan and delete nothing.
+    chunk_size (int): Number of ids deleted per statement.
+
+    Returns:
+    dict: Number of rows per table that were deleted (or would be, on a dry run),
+        or -1 if an error occurs.
+    """
+    assert isinstance(chunk_size, int) and chunk_size > 0, "chunk_size must be a positive integer"
+
+    if len(ids) == 0:
+        return {}
+
+    cursor = conn.cursor()
+    conn.autocommit = False  # Start transaction
+
+    try:
+        plan = _plan(cursor, table_name, ids)
+        print(plan)
+
+        if dry_run:
+            conn.rollback()
+            cursor.close()
+            return plan.counts()
+
+        counts = {}
+        for name, step_ids in plan.steps:
+            query = sql.SQL("DELETE FROM {} WHERE id = ANY(%s)").format(sql.Identifier(name))
+            for start in range(0, len(step_ids), chunk_size):
+                cursor.execute(query, (step_ids[start:start + chunk_size],))
+                counts[name] = counts.get(name, 0) + cursor.rowcount
+
         conn.commit()
+    except Exception as e:
+        conn.rollback()  # Rollback transaction on error
+        print(f"Error occurred: {e}")
         cursor.close()
+        return -1
+
+    cursor.close()
+
+    print(f"Deleted {sum(counts.values())} rows from {len(counts)} tables")
+
+    return counts
+
+def _table_columns(cursor, table_name):
+    """
+    Gets the column names of a table without reading any rows.
+
+    Parameters:
+    cursor (object): Database cursor.
+    table_name (str): Name of the table.
+
+    Returns:
+    list: List of column names.
+    """
+    cursor.execute(sql.SQL("SELECT * FROM {} LIMIT 0").format(sql.Identifier(table_name)))
+    return [desc[0] for desc in cursor.description]
+
+def _condition(table_name, columns, predicate):
+    """
+    Compiles one predicate of delete_where into an SQL condition on the table aliased as t.
+
+    Parameters:
+    table_name (str): Name of the table.
+    columns (list): Column names of the table.
+    predicate (tuple): (column or metadata key, operator, value) tuple.
+
+    Returns:
+    tuple: (psycopg2.sql.Composed condition, list of parameters).
+    """
+    if not isinstance(predicate, (tuple, list)) or len(predicate) not in (2, 3):
+        raise ValueError(f"Predicates must be (column, operator, value) tuples, got {predicate!r}")
+    name, operator = predicate[0], str(predicate[1]).lower()
+    value = predicate[2] if len(predicate) == 3 else None
+
+    if operator not in OPERATORS:
+        raise ValueError(f"Unsupported operator '{predicate[1]}'. Use one of {list(OPERATORS)}")
+    if operator in ('in', 'not in') and not isinstance(value, (list, tuple, set)):
+        raise ValueError(f"Operator '{operator}' needs a list of values")
+
+    # Accept the column names of get_data_metadata (e.g. 'name_sample') as well
+    suffix = '_' + table_name[:-1]
+    if name not in columns and name.endswith(suffix):
+        name = name[:-len(suffix)]
+
+    if name in columns:
+        column = sql.SQL('t.') + sql.Identifier(name)
+        if operator in ('is null', 'is not null'):
+            return column + sql.SQL(' ' + OPERATORS[operator]), []
+        if operator == 'in':
+            return column + sql.SQL(' = ANY(%s)'), [list(value)]
+        if operator == 'not in':
+            return column + sql.SQL(' <> ALL(%s)'), [list(value)]
+        return column + sql.SQL(' ' + OPERATORS[operator] + ' %s'), [value]
+
+    # Otherwise the name is a metadata key
+    exists = sql.SQL("EXISTS (SELECT 1 FROM {metadata} md WHERE md.{id_column} = t.id AND md.key = %s{condition})")
+    identifiers = {
+        'metadata': sql.Identifier(table_name[:-1] + '_metadata'),
+        'id_column': sql.Identifier(table_name[:-1] + '_id'),
+    }
+
+    if operator == 'is null':
+        return sql.SQL('NOT ') + exists.format(condition=sql.SQL(''), **identifiers), [name]
+    if operator == 'is not null':
+        return exists.format(condition=sql.SQL(''), **identifiers), [name]
+    if operator == 'in':
+        return exists.format(condition=sql.SQL(' AND md.value = ANY(%s)'), **identifiers), [name, [str(v) for v in value]]
+    if operator == 'not in':
+        return exists.format(condition=sql.SQL(' AND md.value <> ALL(%s)'), **identifiers), [name, [str(v) for v in value]]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        condition = sql.SQL(' AND ') + _NUMERIC_VALUE + sql.SQL(' ' + OPERATORS[operator] + ' %s')
+        return exists.format(condition=condition, **identifiers), [name, value]
+    condition = sql.SQL(' AND md.value ' + OPERATORS[operator] + ' %s')
+    return exists.format(condition=condition, **identifiers), [name, str(value)]
+
+def compile_where(cursor, table_name, predicates):
+    """
+    Compiles delete_where predicates into an SQL WHERE clause on the table aliased as t.
+
+    Parameters:
+    cursor (object): Database cursor, used to read the columns of the table.
+    table_name (str): Name of the table.
+    predicates (list): List of (column or metadata key, operator, value) tuples, see delete_where.
+
+    Returns:
+    tuple: (psycopg2.sql.Composed WHERE condition, list of parameters).
+    """
+    if not predicates:
+        raise ValueError("At least one predicate is required")
+
+    columns = _table_columns(cursor, table_name)
+
+    conditions = []
+    parameters = []
+    for predicate in predicates:
+        condition, condition_parameters = _condition(table_name, columns, predicate)
+        conditions.append(condition)
+        parameters += condition_parameters
+
+    return sql.SQL(' AND ').join(conditions), parameters
+
+def delete_where(conn,table_name,predicates,dry_run=True):
+    """
+    Deletes the rows of a table that match some predicates, in a single statement.
+
+    Each predicate is a (name, operator, value) tuple and all of them must hold.
+    The name is a column of the table (e.g. 'name' or 'name_sample') or, if it is
+    not, a metadata key (e.g. 'signal_type'). Metadata values are compared as
+    text, or as numbers when value is a number. The operators are '=', '!=',
+    '<', '<=', '>', '>=', 'like', 'ilike', 'in', 'not in', 'is null' and
+    'is not null' (the last two take no value; on a metadata key they test
+    whether the key is missing or present).
+
+    Example:
+    delete_where(conn, 'measurements', [('signal_type', '=', 'Amplitude'), ('height', '<', 100)])
+
+    Parameters:
+    conn (object): Database connection object.
+    table_name (str): Name of the table from which to delete rows.
+    predicates (list): List of (name, operator, value) tuples.
+    dry_run (bool): If True (default), only count the matching rows and delete nothing.
+
+    Returns:
+    int or dict: On a dry run, the number of matching rows. Otherwise the number
+        of deleted rows per table, including the rows deleted by cascade, or -1
+        if an error occurs.
+
+    Raises:
+    ValueError: If there are no predicates or a predicate is malformed.
+    """
+    cursor = conn.cursor()
+    conn.autocommit = False  # Start transaction
+
+    try:
+        where, parameters = compile_where(cursor, table_name, predicates)
+    except Exception:
+        conn.rollback()
+        cursor.close()
+        raise
+
+    table = sql.Identifier(table_name)
+
+    if dry_run:
+        try:
+            cursor.execute(sql.SQL("SELECT count(*) FROM {} t WHERE {}").format(table, where), parameters)
+            count = cursor.fetchone()[0]
+        except Exception as e:
+            print(f"Error occurred: {e}")
+            return -1
+        finally:
+            conn.rollback()
+            cursor.close()
+        print(f"{count} rows of {table_name} match the predicates (dry run, nothing deleted)")
+        return count
+
+    query = sql.SQL("DELETE FROM {table} WHERE id IN (SELECT t.id FROM {table} t WHERE {where})").format(
+        table=table, where=where)
+
+    try:
+        before = _deleted_counts(cursor)
+        cursor.execute(query, parameters)
+        after = _deleted_counts(cursor)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()  # Rollback transaction on error
+        print(f"Error occurred: {e}")
+        cursor.close()
+        return -1
+
+    cursor.close()
+
+    counts = {name: count - before.get(name, 0) for name, count in after.items() if count - before.get(name, 0)}
+
+    print(f"Deleted {counts.get(table_name, 0)} rows from {table_name} ({sum(counts.values())} rows in total including cascades)")
+
+    return counts
@@ -0,0 +1,445 @@
+"""
+Database Export Module
+
+This module streams tables and relational views out of the database as CSV,
+NDJSON or Parquet. Rows are read through a server-side (named) cursor in
+fixed-size chunks and encoded chunk by chunk, so the full table is never
+materialized as a DataFrame and exports run in constant memory.
+
+The exported columns follow the same layout as the retrieval functions in
+dbtools: the main table columns and one column per metadata key, all of them
+suffixed with the singular table name (e.g. 'id_sample', 'height_sample').
+Metadata values are rendered as '<value> <type>', as in metadata_add.
+
+Dependencies:
+    - dbtools: Custom database utility module for the database connection
+    - pyarrow: Only required for Parquet exports
+"""
+
+import csv
+import io
+import json
+import os
+from datetime import datetime
+
+from psycopg2 import sql
+
+import dbtools as dbt
+
+# Number of rows fetched from the server-side cursor per round trip
+DEFAULT_CHUNK_SIZE = 10000
+
+# Supported output formats and their MIME types
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# PostgreSQL type OIDs mapped to the Arrow type names used for Parquet exports
+_ARROW_TYPES = {
+    16: 'bool_',
+    20: 'int64',
+    21: 'int64',
+    23: 'int64',
+    700: 'float64',
+    701: 'float64',
+}
+
+
+def _table_columns(cursor, table_name):
+    """
+    Get the column names of a table without reading any rows.
+
+    Parameters:
+    -----------
+    cursor : psycopg2.cursor
+        An active database cursor object.
+    table_name : str
+        The name of the table.
+
+    Returns:
+    --------
+    list
+        List of (column name, type OID) tuples in table order.
+    """
+    cursor.execute(sql.SQL("SELECT * FROM {} LIMIT 0").format(sql.Identifier(table_name)))
+    return [(desc[0], desc[1]) for desc in cursor.description]
+
+
+def _metadata_keys(cursor, table_name):
+    """
+    Get the distinct metadata keys of a table in order of first appearance.
+
+    Parameters:
+    -----------
+    cursor : psycopg2.cursor
+        An active database cursor object.
+    table_name : str
+        The name of the main table (e.g. 'samples').
+
+    Returns:
+    --------
+    list
+        List of metadata keys.
+    """
+    query = sql.SQL("SELECT key FROM {} GROUP BY key ORDER BY min(id)").format(
+        sql.Identifier(table_name[:-1] + '_metadata'))
+    cursor.execute(query)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _metadata_column(table_name, alias):
+    """
+    Build the correlated subquery that aggregates an entity's metadata into JSON.
+
+    Parameters:
+    -----------
+    table_name : str
+        The name of the main table (e.g. 'samples').
+    alias : str
+        Alias of the main table in the outer query.
+
+    Returns:
+    --------
+    psycopg2.sql.Composed
+        The subquery, returning a JSON object mapping key to '<value> <type>'.
+    """
+    return sql.SQL(
+        "(SELECT json_object_agg(md.key, concat(md.value, ' ', md.type)) "
+        "FROM {metadata} md WHERE md.{id_column} = {alias}.id)"
+    ).format(
+        metadata=sql.Identifier(table_name[:-1] + '_metadata'),
+        id_column=sql.Identifier(table_name[:-1] + '_id'),
+        alias=sql.Identifier(alias),
+    )
+
+
+class _Layout:
+    """
+    Column layout of an export: which result columns map to which output columns.
+
+    Each part is a (table_name, columns, keys) tuple, where columns are the main
+    table (name, type OID) pairs followed in the result row by one JSON column
+    holding the metadata, which is expanded into one output column per key.
+    """
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.columns = []
+        self.types = []
+        for table_name, columns, keys in parts:
+            suffix = '_' + table_name[:-1]
+            for name, type_oid in columns:
+                self.columns.append(name + suffix)
+                self.types.append(_ARROW_TYPES.get(type_oid, 'string'))
+            for key in keys:
+                self.columns.append(key + suffix)
+                self.types.append('string')
+
+    def flatten(self, row):
+        """Expand a result row into the output column order."""
+        values = []
+        position = 0
+        for _, columns, keys in self.parts:
+            values.extend(row[position:position + len(columns)])
+            metadata = row[position + len(columns)] or {}
+            values.extend(metadata.get(key) for key in keys)
+            position += len(columns) + 1
+        return values
+
+
+def _iter_rows(query, layout, chunk_size):
+    """
+    Execute a query on a server-side cursor and yield chunks of flattened rows.
+
+    A dedicated connection is opened for the export and closed when the
+    generator is exhausted or discarded (e.g. when an HTTP client disconnects).
+
+    Parameters:
+    -----------
+    query : psycopg2.sql.Composed
+        The query to execute.
+    layout : _Layout
+        The column layout used to flatten the result rows.
+    chunk_size : int
+        Number of rows fetched per round trip.
+
+    Yields:
+    -------
+    list
+        Lists of at most chunk_size rows, each row a list of output values.
+    """
+    conn = dbt.connect()
+    try:
+        # Named cursors are server-side and require an open transaction
+        conn.autocommit = False
+        cursor = conn.cursor(name='dbtools_export')
+        cursor.itersize = chunk_size
+        cursor.execute(query)
+        while True:
+            records = cursor.fetchmany(chunk_size)
+            if not records:
+                break
+            yield [layout.flatten(record) for record in records]
+        cursor.close()
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def _encode_csv(layout, chunks):
+    """Encode chunks of rows as CSV text, header first."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(layout.columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+    # Flush the header if the table was empty
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _encode_ndjson(layout, chunks):
+    """Encode chunks of rows as newline-delimited JSON objects."""
+    for rows in chunks:
+        lines = [json.dumps(dict(zip(layout.columns, row)), default=str) for row in rows]
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class _StreamSink(io.RawIOBase):
+    """
+    Write-only file object that hands written bytes back to the caller.
+
+    Parquet writers need tell() to report the absolute offset in the output,
+    so the position keeps growing while the buffered bytes are drained.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer.extend(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        """Return and clear the bytes written since the last drain."""
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _encode_parquet(layout, chunks):
+    """Encode chunks of rows as a Parquet file, one row group per chunk."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet exports require pyarrow: " + str(e))
+
+    schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in zip(layout.columns, layout.types)])
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            arrays = [
+                pa.array(values if type_name != 'string' else [None if v is None else str(v) for v in values],
+                         type=schema.field(i).type)
+                for i, (values, type_name) in enumerate(zip(columns, layout.types))
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+_ENCODERS = {
+    'csv': _encode_csv,
+    'ndjson': _encode_ndjson,
+    'parquet': _encode_parquet,
+}
+
+
+def _stream(query, layout, fmt, chunk_size):
+    """Validate the format and return the encoded byte stream."""
+    if fmt not in _ENCODERS:
+        raise ValueError(f"Unsupported export format '{fmt}'. Use one of {list(_ENCODERS)}")
+    assert isinstance(chunk_size, int) and chunk_size > 0, "chunk_size must be a positive integer"
+    return _ENCODERS[fmt](layout, _iter_rows(query, layout, chunk_size))
+
+
+def stream_table(table_name, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Stream a table with its metadata in the requested format.
+
+    The output has the same columns as get_data_metadata(table_name), except
+    that columns with no values are kept so the header can be written before
+    the first row is read.
+
+    Parameters:
+    -----------
+    table_name : str
+        The name of the table to export (e.g. 'samples').
+    fmt : str
+        Output format: 'csv', 'ndjson' or 'parquet'.
+    chunk_size : int
+        Number of rows fetched and encoded at a time.
+
+    Returns:
+    --------
+    generator
+        Generator of bytes chunks of the encoded export.
+
+    Raises:
+    -------
+    ValueError
+        If the format is not supported.
+    """
+    # Resolve the column layout with a short-lived connection
+    conn = dbt.connect()
+    try:
+        cursor = conn.cursor()
+        columns = _table_columns(cursor, table_name)
+        keys = _metadata_keys(cursor, table_name)
+        cursor.close()
+    finally:
+        conn.close()
+
+    layout = _Layout([(table_name, columns, keys)])
+
+    query = sql.SQL("SELECT {columns}, {metadata} FROM {table} t ORDER BY t.id").format(
+        columns=sql.SQL(', ').join(sql.SQL('t.') + sql.Identifier(name) for name, _ in columns),
+        metadata=_metadata_column(table_name, 't'),
+        table=sql.Identifier(table_name),
+    )
+
+    return _stream(query, layout, fmt, chunk_size)
+
+
+def stream_relation(table1_name, table2_name, intermediate_table_name, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Stream two tables related by an intermediate table in the requested format.
+
+    The output has one row per relation row with the columns of
+    relation_metadata(table1_name, table2_name, intermediate_table_name).
+
+    Parameters:
+    -----------
+    table1_name : str
+        The name of the first table (e.g. 'measurements').
+    table2_name : str
+        The name of the second table (e.g. 'samples').
+    intermediate_table_name : str
+        The name of the intermediate relationship table (e.g. 'sample_measurements').
+    fmt : str
+        Output format: 'csv', 'ndjson' or 'parquet'.
+    chunk_size : int
+        Number of rows fetched and encoded at a time.
+
+    Returns:
+    --------
+    generator
+        Generator of bytes chunks of the encoded export.
+
+    Raises:
+    -------
+    ValueError
+        If the format is not supported.
+    """
+    conn = dbt.connect()
+    try:
+        cursor = conn.cursor()
+        columns1 = _table_columns(cursor, table1_name)
+        keys1 = _metadata_keys(cursor, table1_name)
+        columns2 = _table_columns(cursor, table2_name)
+        keys2 = _metadata_keys(cursor, table2_name)
+        cursor.close()
+    finally:
+        conn.close()
+
+    layout = _Layout([(table1_name, columns1, keys1), (table2_name, columns2, keys2)])
+
+    query = sql.SQL(
+        "SELECT {columns1}, {metadata1}, {columns2}, {metadata2} "
+        "FROM {intermediate} r "
+        "JOIN {table1} a ON a.id = r.{id1} "
+        "JOIN {table2} b ON b.id = r.{id2} "
+        "ORDER BY a.id, b.id"
+    ).format(
+        columns1=sql.SQL(', ').join(sql.SQL('a.') + sql.Identifier(name) for name, _ in columns1),
+        metadata1=_metadata_column(table1_name, 'a'),
+        columns2=sql.SQL(', ').join(sql.SQL('b.') + sql.Identifier(name) for name, _ in columns2),
+        metadata2=_metadata_column(table2_name, 'b'),
+        intermediate=sql.Identifier(intermediate_table_name),
+        table1=sql.Identifier(table1_name),
+        table2=sql.Identifier(table2_name),
+        id1=sql.Identifier(table1_name[:-1] + '_id'),
+        id2=sql.Identifier(table2_name[:-1] + '_id'),
+    )
+
+    return _stream(query, layout, fmt, chunk_size)
+
+
+def snapshot(conn, folder, tables=None):
+    """
+    Dump tables to CSV files as one consistent point-in-time snapshot.
+
+    The raw rows of each table (without the metadata pivot of stream_table) are
+    copied with COPY ... TO STDOUT straight into <folder>/<table>.csv, inside a
+    single read-only REPEATABLE READ transaction, so all the files reflect the
+    same state of the database. A snapshot.json file records the time and the
+    number of rows of every table. The files can be restored with COPY ... FROM.
+
+    Parameters:
+    -----------
+    conn : psycopg2.connection
+        Database connection object.
+    folder : str
+        Folder where the files are written; it is created if needed.
+    tables : list, optional
+        Names of the tables to dump. By default, every table of the public schema.
+
+    Returns:
+    --------
+    dict
+        Number of rows written per table.
+    """
+    os.makedirs(folder, exist_ok=True)
+
+    conn.autocommit = False
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        if tables is None:
+            cursor.execute("SELECT table_name FROM information_schema.tables "
+                           "WHERE table_schema = 'public' AND table_type = 'BASE TABLE' ORDER BY table_name")
+            tables = [row[0] for row in cursor.fetchall()]
+
+        counts = {}
+        for table_name in tables:
+            query = sql.SQL("COPY (SELECT * FROM {} ORDER BY id) TO STDOUT WITH CSV HEADER").format(
+                sql.Identifier(table_name))
+            with open(os.path.join(folder, f"{table_name}.csv"), 'w', newline='', encoding='utf-8') as f:
+                cursor.copy_expert(query, f)
+            counts[table_name] = cursor.rowcount
+    finally:
+        conn.rollback()
+        cursor.close()
+
+    with open(os.path.join(folder, 'snapshot.json'), 'w') as f:
+        json.dump({'created': datetime.now().isoformat(timespec='seconds'), 'tables': counts}, f, indent=2)
+
+    return counts
@@ -0,0 +1,616 @@
+"""
+File Information Module
+
+This module extracts the properties of measurement files (shape, data type and
+file type) without reading the volume data. TIFF files are inspected through
+their tags, folders of TIFF slices through the first slice and a file count,
+and raw files through a companion header (MetaImage .mhd or a JSON sidecar).
+
+The shapes follow numpy order, i.e. the same shape the volume would have once
+loaded, so (slices, rows, columns) for stacks and folders.
+
+Extracted properties can be kept in a persistent SQLite cache keyed by the
+normalized path, size, modification time and inode of the file and of the file
+the properties are read from (the companion header of a raw file, the first
+slice of a folder), so repeated lookups of unchanged files do not read them.
+
+Dependencies:
+    - tifffile: Required to read TIFF tags
+"""
+
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# File extensions recognised as TIFF images
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+# Default location of the persistent file information cache
+DEFAULT_CACHE_PATH = os.environ.get(
+    'DBTOOLS_FILE_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'dbtools', 'file_info.sqlite'))
+
+# Default maximum number of cached files before least recently used entries are evicted
+DEFAULT_CACHE_ENTRIES = 100000
+
+# Layout version of the cache file; caches of another version are emptied
+CACHE_VERSION = 2
+
+# MetaImage element types mapped to numpy dtype names
+_METAIMAGE_TYPES = {
+    'MET_CHAR': 'int8',
+    'MET_UCHAR': 'uint8',
+    'MET_SHORT': 'int16',
+    'MET_USHORT': 'uint16',
+    'MET_INT': 'int32',
+    'MET_UINT': 'uint32',
+    'MET_FLOAT': 'float32',
+    'MET_DOUBLE': 'float64',
+}
+
+
+def get_file_type(file_path):
+    """
+    Get the file type reported for a measurement path.
+
+    Parameters:
+    -----------
+    file_path : str
+        Path to a measurement file or folder.
+
+    Returns:
+    --------
+    str
+        The file extension including the dot (e.g. '.tif'), or 'folder' for
+        paths without extension.
+    """
+    file_type = os.path.splitext(file_path)[1]
+    if not file_type:  # If it's a directory of TIFFs
+        file_type = 'folder'
+    return file_type
+
+
+def _tiff_header(file_path):
+    """
+    Read the shape and dtype of the first image series of a TIFF file from its tags.
+
+    Parameters:
+    -----------
+    file_path : str
+        Path to the TIFF file.
+
+    Returns:
+    --------
+    tuple
+        (shape, dtype) where shape is a tuple of ints and dtype a string.
+    """
+    import tifffile
+
+    with tifffile.TiffFile(file_path) as tif:
+        series = tif.series[0]
+        return tuple(int(s) for s in series.shape), str(series.dtype)
+
+
+def list_slices(folder_path):
+    """
+    List the TIFF slices of a folder in load order.
+
+    Parameters:
+    -----------
+    folder_path : str
+        Path to the folder of TIFF slices.
+
+    Returns:
+    --------
+    list
+        Sorted list of slice file paths.
+    """
+    with os.scandir(folder_path) as entries:
+        names = [entry.name for entry in entries
+                 if entry.is_file() and entry.name.lower().endswith(TIFF_EXTENSIONS)]
+    return [os.path.join(folder_path, name) for name in sorted(names)]
+
+
+def _folder_header(folder_path):
+    """
+    Read the shape and dtype of a folder of TIFF slices from its first slice.
+
+    Parameters:
+    -----------
+    folder_path : str
+        Path to the folder of TIFF slices.
+
+    Returns:
+    --------
+    tuple
+        (shape, dtype) where shape is (number of slices,) + slice shape.
+    """
+    slices = list_slices(folder_path)
+    if not slices:
+        raise ValueError(f"No TIFF slices found in folder: {folder_path}")
+
+    slice_shape, dtype = _tiff_header(slices[0])
+    return (len(slices),) + slice_shape, dtype
+
+
+def _metaimage_header(header_path):
+    """
+    Read the shape and dtype from a MetaImage (.mhd) header.
+
+    Parameters:
+    -----------
+    header_path : str
+        Path to the .mhd header.
+
+    Returns:
+    --------
+    tuple
+        (shape, dtype) in numpy order.
+    """
+    fields = {}
+    with open(header_path, 'r') as f:
+        for line in f:
+            if '=' in line:
+                key, value = line.split('=', 1)
+                fields[key.strip()] = value.strip()
+
+    # DimSize is stored fastest axis first (x y z), numpy order is the reverse
+    shape = tuple(int(s) for s in reversed(fields['DimSize'].split()))
+    element_type = fields['ElementType']
+    if element_type not in _METAIMAGE_TYPES:
+        raise ValueError(f"Unsupported MetaImage element type: {element_type}")
+    return shape, _METAIMAGE_TYPES[element_type]
+
+
+def _json_header(header_path):
+    """
+    Read the shape and dtype from a JSON sidecar.
+
+    The sidecar must contain 'dtype' and either 'shape' (numpy order) or
+    'height', 'width' and 'depth'.
+
+    Parameters:
+    -----------
+    header_path : str
+        Path to the JSON sidecar.
+
+    Returns:
+    --------
+    tuple
+        (shape, dtype) in numpy order.
+    """
+    with open(header_path, 'r') as f:
+        header = json.load(f)
+
+    if 'shape' in header:
+        shape = tuple(int(s) for s in header['shape'])
+    else:
+        shape = (int(header['height']), int(header['width']), int(header['depth']))
+    return shape, str(header['dtype'])
+
+
+def _raw_header_path(file_path):
+    """
+    Find the companion header of a raw file.
+
+    Returns:
+    --------
+    tuple
+        (header path, reader function), or (None, None) if there is no header.
+    """
+    stem = os.path.splitext(file_path)[0]
+    candidates = [
+        (stem + '.mhd', _metaimage_header),
+        (file_path + '.json', _json_header),
+        (stem + '.json', _json_header),
+    ]
+    for header_path, reader in candidates:
+        if os.path.isfile(header_path):
+            return header_path, reader
+    return None, None
+
+
+def _raw_header(file_path):
+    """
+    Read the shape and dtype of a raw file from its companion header.
+
+    The header is looked up next to the raw file with the same name and the
+    extension .mhd or .json (e.g. 'volume.mhd' or 'volume.raw.json' for
+    'volume.raw').
+
+    Parameters:
+    -----------
+    file_path : str
+        Path to the raw file.
+
+    Returns:
+    --------
+    tuple
+        (shape, dtype) in numpy order.
+    """
+    header_path, reader = _raw_header_path(file_path)
+    if header_path is None:
+        raise ValueError(f"No companion header (.mhd or .json) found for raw file: {file_path}")
+    return reader(header_path)
+
+
+def read_header(file_path):
+    """
+    Read the shape and dtype of a measurement without loading its data.
+
+    Parameters:
+    -----------
+    file_path : str
+        Path to a TIFF file, a folder of TIFF slices or a raw file with a
+        companion header.
+
+    Returns:
+    --------
+    tuple
+        (shape, dtype) where shape is a tuple of ints in numpy order.
+
+    Raises:
+    -------
+    ValueError
+        If the file type is not supported or the header cannot be found.
+    """
+    if os.path.isdir(file_path):
+        return _folder_header(file_path)
+
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in TIFF_EXTENSIONS:
+        return _tiff_header(file_path)
+    if extension == '.raw':
+        return _raw_header(file_path)
+    raise ValueError(f"Unsupported file type for header extraction: {extension or file_path}")
+
+
+def shape_to_dimensions(shape):
+    """
+    Convert a numpy shape to the (height, width, depth) stored as measurement metadata.
+
+    Parameters:
+    -----------
+    shape : tuple
+        A 2D or 3D shape.
+
+    Returns:
+    --------
+    tuple
+        (height, width, depth), with depth 1 for 2D images.
+
+    Raises:
+    -------
+    ValueError
+        If the shape is not 2D or 3D.
+    """
+    if len(shape) == 3:
+        height, width, depth = shape
+    elif len(shape) == 2:
+        height, width = shape
+        depth = 1
+    else:
+        raise ValueError(f"Unsupported file shape: {shape}")
+    return int(height), int(width), int(depth)
+
+
+def read_file_info(file_path):
+    """
+    Extract the measurement properties of a file from its header.
+
+    Parameters:
+    -----------
+    file_path : str
+        Path to the measurement file or folder.
+
+    Returns:
+    --------
+    dict
+        Dictionary with 'height', 'width', 'depth', 'dtype' and 'file_type'.
+
+    Raises:
+    -------
+    ValueError
+        If the file type or shape is not supported.
+    """
+    shape, dtype = read_header(file_path)
+    height, width, depth = shape_to_dimensions(shape)
+    return {
+        'height': height,
+        'width': width,
+        'depth': depth,
+        'dtype': dtype,
+        'file_type': get_file_type(file_path)
+    }
+
+
+def _header_source(path):
+    """
+    The file the properties of a measurement are read from, if it is not the
+    measurement itself: the companion header of a raw file or the first slice
+    of a folder. None otherwise, or if there is no such file.
+    """
+    if os.path.isdir(path):
+        slices = list_slices(path)
+        return slices[0] if slices else None
+    if os.path.splitext(path)[1].lower() == '.raw':
+        return _raw_header_path(path)[0]
+    return None
+
+
+def _file_key(file_path):
+    """
+    Build the cache key of a file: normalized path, size, mtime and inode,
+    and the same of the file its properties are read from.
+
+    A folder's own mtime changes when slices are added or removed, not when a
+    slice is rewritten in place, and a raw file does not change when its
+    header is fixed: the source stat catches both.
+
+    Parameters:
+    -----------
+    file_path : str
+        Path to the measurement file or folder.
+
+    Returns:
+    --------
+    tuple
+        (normalized path, size in bytes, mtime in nanoseconds, inode, source),
+        where source is a JSON list [path, size, mtime, inode] of the header
+        source, or '' if the properties are read from the file itself.
+    """
+    path = os.path.normcase(os.path.realpath(file_path))
+    stat = os.stat(path)
+    source = _header_source(path)
+    if source is None:
+        source_key = ''
+    else:
+        source_stat = os.stat(source)
+        source_key = json.dumps([source, source_stat.st_size, source_stat.st_mtime_ns, source_stat.st_ino])
+    return path, stat.st_size, stat.st_mtime_ns, stat.st_ino, source_key
+
+
+class FileInfoCache:
+    """
+    Persistent cache of extracted file properties backed by a SQLite file.
+
+    Entries are keyed by normalized path and validated against the size, mtime
+    and inode of the file and of its header source (companion header or first
+    slice), so a modified or replaced file or header is re-extracted. When
+    the cache holds more than max_entries files the least recently used ones are
+    evicted.
+
+    Parameters:
+    -----------
+    cache_path : str, optional
+        Path to the SQLite file. Defaults to DEFAULT_CACHE_PATH.
+    max_entries : int, optional
+        Maximum number of cached files.
+    """
+
+    def __init__(self, cache_path=None, max_entries=DEFAULT_CACHE_ENTRIES):
+        assert isinstance(max_entries, int) and max_entries > 0, "max_entries must be a positive integer"
+
+        self.cache_path = cache_path or DEFAULT_CACHE_PATH
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
+        os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as db:
+            # The entries of an older layout cannot be validated: start over
+            if db.execute("PRAGMA user_version").fetchone()[0] != CACHE_VERSION:
+                db.execute("DROP TABLE IF EXISTS file_info")
+                db.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS file_info (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    source TEXT NOT NULL,
+                    shape TEXT NOT NULL,
+                    dtype TEXT NOT NULL,
+                    file_type TEXT NOT NULL,
+                    slices INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )""")
+            db.execute("CREATE INDEX IF NOT EXISTS file_info_last_access ON file_info (last_access)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Open a connection to the cache file (one per operation, so threads never share it)."""
+        db = sqlite3.connect(self.cache_path, timeout=30)
+        try:
+            # Commit on success, rollback on error
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def lookup(self, file_path):
+        """
+        Get the cached properties of a file if the file has not changed.
+
+        Parameters:
+        -----------
+        file_path : str
+            Path to the measurement file or folder.
+
+        Returns:
+        --------
+        dict or None
+            Dictionary with 'height', 'width', 'depth', 'dtype', 'file_type',
+            'shape' and 'slices', or None if the file is not cached or changed.
+        """
+        path, size, mtime_ns, inode, source = _file_key(file_path)
+
+        with self._lock, self._connect() as db:
+            row = db.execute(
+                "SELECT shape, dtype, file_type, slices FROM file_info "
+                "WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ? AND source = ?",
+                (path, size, mtime_ns, inode, source)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE file_info SET last_access = ? WHERE path = ?", (time.time(), path))
+
+        shape = tuple(json.loads(row[0]))
+        height, width, depth = shape_to_dimensions(shape)
+        return {
+            'height': height,
+            'width': width,
+            'depth': depth,
+            'dtype': row[1],
+            'file_type': row[2],
+            'shape': shape,
+            'slices': row[3]
+        }
+
+    def store(self, file_path, shape, dtype):
+        """
+        Store the extracted properties of a file, evicting old entries if needed.
+
+        Parameters:
+        -----------
+        file_path : str
+            Path to the measurement file or folder.
+        shape : tuple
+            Shape of the measurement in numpy order.
+        dtype : str
+            Data type of the measurement.
+        """
+        path, size, mtime_ns, inode, source = _file_key(file_path)
+        slices = shape[0] if len(shape) == 3 else 1
+
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO file_info "
+                "(path, size, mtime_ns, inode, source, shape, dtype, file_type, slices, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, inode, source, json.dumps(list(shape)), dtype,
+                 get_file_type(file_path), slices, time.time()))
+
+            # Evict the least recently used entries beyond the limit
+            db.execute(
+                "DELETE FROM file_info WHERE path IN ("
+                "SELECT path FROM file_info ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+
+    def get(self, file_path):
+        """
+        Get the properties of a file from the cache, extracting them on a miss.
+
+        Parameters:
+        -----------
+        file_path : str
+            Path to the measurement file or folder.
+
+        Returns:
+        --------
+        dict
+            Dictionary with 'height', 'width', 'depth', 'dtype', 'file_type',
+            'shape' and 'slices'.
+        """
+        file_info = self.lookup(file_path)
+        if file_info is not None:
+            return file_info
+
+        shape, dtype = read_header(file_path)
+        height, width, depth = shape_to_dimensions(shape)
+        self.store(file_path, shape, dtype)
+        return {
+            'height': height,
+            'width': width,
+            'depth': depth,
+            'dtype': dtype,
+            'file_type': get_file_type(file_path),
+            'shape': shape,
+            'slices': shape[0] if len(shape) == 3 else 1
+        }
+
+    def clear(self):
+        """Remove all the cached entries."""
+        with self._lock, self._connect() as db:
+            db.execute("DELETE FROM file_info")
+
+
+# Caches shared by the module level helpers, one per cache file
+_caches = {}
+
+
+def get_cache(cache_path=None):
+    """
+    Get the shared FileInfoCache for a cache file.
+
+    Parameters:
+    -----------
+    cache_path : str, optional
+        Path to the SQLite file. Defaults to DEFAULT_CACHE_PATH.
+
+    Returns:
+    --------
+    FileInfoCache
+        The cache object.
+    """
+    cache_path = cache_path or DEFAULT_CACHE_PATH
+    if cache_path not in _caches:
+        _caches[cache_path] = FileInfoCache(cache_path)
+    return _caches[cache_path]
+
+
+def cached_file_info(file_path, cache_path=None):
+    """
+    Extract the measurement properties of a file, using the persistent cache.
+
+    Parameters:
+    -----------
+    file_path : str
+        Path to the measurement file or folder.
+    cache_path : str, optional
+        Path to the SQLite cache file. Defaults to DEFAULT_CACHE_PATH.
+
+    Returns:
+    --------
+    dict
+        Dictionary with 'height', 'width', 'depth', 'dtype' and 'file_type'.
+    """
+    file_info = get_cache(cache_path).get(file_path)
+    return {key: file_info[key] for key in ['height', 'width', 'depth', 'dtype', 'file_type']}
+
+
+def check_file_info(file_path, height, width, depth, dtype, cache_path=None):
+    """
+    Cross-check measurement metadata against the properties of the file.
+
+    Parameters:
+    -----------
+    file_path : str
+        Path to the measurement file or folder.
+    height : int
+        Declared height of the measurement.
+    width : int
+        Declared width of the measurement.
+    depth : int
+        Declared depth of the measurement.
+    dtype : str
+        Declared data type of the measurement.
+    cache_path : str, optional
+        Path to the SQLite cache file. Defaults to DEFAULT_CACHE_PATH.
+
+    Returns:
+    --------
+    list
+        List of mismatch descriptions, empty if everything matches.
+    """
+    file_info = cached_file_info(file_path, cache_path)
+    declared = {'height': height, 'width': width, 'depth': depth, 'dtype': dtype}
+
+    mismatches = []
+    for key, value in declared.items():
+        if str(file_info[key]) != str(value):
+            mismatches.append(f"{key} is {value} but the file has {file_info[key]}")
+    return mismatches
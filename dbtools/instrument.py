@@ -0,0 +1,353 @@
+"""
+Query Instrumentation Module
+
+This module records every query executed through dbtools: how long it took,
+how many rows it returned or affected, how many bytes were sent and received
+and which dbtools function issued it, as well as the time spent opening
+database connections.
+
+The bytes sent are the SQL text, plus the data of COPY ... FROM STDIN. The
+bytes received are only measured for COPY ... TO STDOUT, from the position of
+the output file before and after the copy: psycopg2 does not expose the size
+of the results of other queries, which count as 0.
+
+Connections opened with dbtools.connect() use InstrumentedCursor for all their
+cursors, so the queries of dbtools.dbtools, dbtools.load, dbtools.delete and the
+other modules are recorded without changes to their code. Connections created
+elsewhere can be instrumented with instrument_connection(conn).
+
+Each query is turned into a record dictionary that is aggregated per calling
+function and statement kind (see stats() and prometheus_text()) and passed to
+the hooks registered with add_hook(), which can export or log it.
+
+Dependencies:
+    - psycopg2: For the cursor class that is extended
+"""
+
+import re
+import sys
+import threading
+import time
+
+import psycopg2.extensions
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, float('inf'))
+
+# COPY statements sending their data to the client
+_COPY_TO_STDOUT = re.compile(rb'\bTO\s+STDOUT\b', re.IGNORECASE)
+
+# Modules whose frames are never reported as the caller of a query
+_SKIPPED_MODULES = (__name__, 'dbtools.tracing')
+
+_enabled = True
+_hooks = []
+_lock = threading.Lock()
+
+# Aggregated statistics: {(caller, kind): {...}} and the connection timings
+_queries = {}
+_connections = {'count': 0, 'errors': 0, 'seconds_total': 0.0, 'seconds_max': 0.0, 'buckets': [0] * len(BUCKETS)}
+
+
+def enable():
+    """Turn the instrumentation on (the default)."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Turn the instrumentation off: cursors then execute queries without recording them."""
+    global _enabled
+    _enabled = False
+
+
+def add_hook(hook):
+    """
+    Register a function called with the record of every instrumented query.
+
+    Records are dictionaries with the keys 'caller', 'kind', 'statement' (the
+    query as passed to the cursor), 'query' (the SQL sent with the parameters
+    bound, as bytes), 'params', 'seconds', 'rows', 'bytes_sent',
+    'bytes_received', 'error' (the exception or None) and 'connection'. Hooks run synchronously after the
+    query, so they should be fast; exceptions raised by hooks are ignored.
+
+    Parameters:
+    -----------
+    hook : callable
+        Function taking a record dictionary.
+    """
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def remove_hook(hook):
+    """Unregister a hook added with add_hook()."""
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def _caller():
+    """
+    Name of the function that issued the query.
+
+    This is the innermost dbtools function on the stack outside this module
+    and the tracing wrappers (e.g. 'dbtools.dbtools.get_data'), or the first
+    frame outside dbtools and psycopg2 if the query was not issued by dbtools.
+    """
+    frame = sys._getframe(2)
+    outside = None
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module not in _SKIPPED_MODULES and not module.startswith('psycopg2'):
+            name = f"{module}.{frame.f_code.co_name}"
+            if module == 'dbtools' or module.startswith('dbtools.'):
+                return name
+            if outside is None:
+                outside = name
+        frame = frame.f_back
+    return outside or 'unknown'
+
+
+def _observe(entry, seconds):
+    """Add a duration to an aggregate entry with count, total, max and histogram buckets."""
+    entry['count'] += 1
+    entry['seconds_total'] += seconds
+    entry['seconds_max'] = max(entry['seconds_max'], seconds)
+    for i, bound in enumerate(BUCKETS):
+        if seconds <= bound:
+            entry['buckets'][i] += 1
+            break
+
+
+def _position(file):
+    """Position of a COPY file, or None if it cannot tell (e.g. a pipe)."""
+    try:
+        return file.tell()
+    except Exception:
+        return None
+
+
+def _record(cursor, query, params, seconds, error, copied=0):
+    """
+    Aggregate the record of an executed query and pass it to the hooks.
+
+    copied is the number of bytes a COPY read from or wrote to its file.
+    """
+    # After an error cursor.query may still hold the previous query
+    sent = cursor.query if cursor.query is not None and error is None else query
+    if isinstance(sent, str):
+        sent = sent.encode('utf-8', 'replace')
+    elif not isinstance(sent, bytes):
+        # psycopg2.sql.Composed objects cannot be rendered without a connection
+        sent = str(sent).encode('utf-8', 'replace')
+
+    words = sent.split(None, 1)
+    kind = words[0].decode('ascii', 'replace').upper() if words else ''
+    received = copied if kind == 'COPY' and _COPY_TO_STDOUT.search(sent) else 0
+
+    record = {
+        'caller': _caller(),
+        'kind': kind,
+        'statement': query,
+        'query': sent,
+        'params': params,
+        'seconds': seconds,
+        'rows': max(cursor.rowcount, 0) if error is None else 0,
+        'bytes_sent': len(sent) + copied - received,
+        'bytes_received': received,
+        'error': error,
+        'connection': cursor.connection,
+    }
+
+    with _lock:
+        entry = _queries.setdefault((record['caller'], kind), {
+            'count': 0, 'errors': 0, 'rows': 0, 'bytes_sent': 0, 'bytes_received': 0,
+            'seconds_total': 0.0, 'seconds_max': 0.0, 'buckets': [0] * len(BUCKETS),
+        })
+        _observe(entry, seconds)
+        entry['rows'] += record['rows']
+        entry['bytes_sent'] += record['bytes_sent']
+        entry['bytes_received'] += record['bytes_received']
+        if error is not None:
+            entry['errors'] += 1
+
+    for hook in list(_hooks):
+        try:
+            hook(record)
+        except Exception:
+            pass
+
+
+def record_connect(seconds, error=None):
+    """
+    Record the time spent opening a database connection.
+
+    Parameters:
+    -----------
+    seconds : float
+        Time to acquire the connection.
+    error : Exception, optional
+        The error raised if the connection failed.
+    """
+    if not _enabled:
+        return
+    with _lock:
+        _observe(_connections, seconds)
+        if error is not None:
+            _connections['errors'] += 1
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """
+    Cursor that records the timing, row count and caller of every query it executes.
+
+    For client-side cursors the time of execute() includes receiving the
+    result rows. For named (server-side) cursors only the DECLARE is timed,
+    not the later fetches. For copy_expert() the bytes copied are measured
+    from the position of its file.
+    """
+
+    def _instrumented(self, method, query, params, *args, file=None):
+        if not _enabled:
+            return method(query, params, *args)
+        before = _position(file) if file is not None else None
+        start = time.perf_counter()
+        error = None
+        try:
+            return method(query, params, *args)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            after = _position(file) if before is not None else None
+            copied = after - before if after is not None else 0
+            _record(self, query, params, seconds, error, copied)
+
+    def execute(self, query, vars=None):
+        return self._instrumented(super().execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._instrumented(super().executemany, query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._instrumented(super().copy_expert, sql, file, size, file=file)
+
+
+def instrument_connection(conn):
+    """
+    Make the cursors of a connection created outside dbtools.connect() instrumented.
+
+    Parameters:
+    -----------
+    conn : psycopg2.connection
+        Database connection object.
+
+    Returns:
+    --------
+    psycopg2.connection
+        The same connection.
+    """
+    if conn.cursor_factory is None or conn.cursor_factory is psycopg2.extensions.cursor:
+        conn.cursor_factory = InstrumentedCursor
+    return conn
+
+
+def stats():
+    """
+    Get the statistics recorded since the start of the process (or the last reset).
+
+    Returns:
+    --------
+    dict
+        'connections' with the count, errors and total/max/mean seconds of the
+        connections opened, 'queries' with one entry per calling function and
+        statement kind (count, errors, rows, bytes_sent, bytes_received,
+        total/max/mean seconds),
+        and 'totals' summing all the queries.
+    """
+    with _lock:
+        connections = {key: value for key, value in _connections.items() if key != 'buckets'}
+        queries = [
+            {'caller': caller, 'kind': kind, **{key: value for key, value in entry.items() if key != 'buckets'}}
+            for (caller, kind), entry in sorted(_queries.items())
+        ]
+
+    connections['seconds_mean'] = connections['seconds_total'] / connections['count'] if connections['count'] else 0.0
+    for query in queries:
+        query['seconds_mean'] = query['seconds_total'] / query['count']
+
+    totals = {key: sum(query[key] for query in queries)
+              for key in ('count', 'errors', 'rows', 'bytes_sent', 'bytes_received', 'seconds_total')}
+
+    return {'connections': connections, 'queries': queries, 'totals': totals}
+
+
+def reset_stats():
+    """Clear the recorded statistics."""
+    with _lock:
+        _queries.clear()
+        _connections.update(count=0, errors=0, seconds_total=0.0, seconds_max=0.0, buckets=[0] * len(BUCKETS))
+
+
+def _label(value):
+    """Escape a Prometheus label value."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram(lines, name, labels, entry):
+    """Append the bucket, sum and count lines of a histogram."""
+    cumulative = 0
+    for bound, count in zip(BUCKETS, entry['buckets']):
+        cumulative += count
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="{le}"}} {cumulative}')
+    suffix = f'{{{labels}}}' if labels else ''
+    lines.append(f'{name}_sum{suffix} {entry["seconds_total"]}')
+    lines.append(f'{name}_count{suffix} {entry["count"]}')
+
+
+def prometheus_text():
+    """
+    Render the statistics in the Prometheus text exposition format.
+
+    Returns:
+    --------
+    str
+        The metrics: query duration histograms, errors, rows and bytes sent and received per
+        caller and statement kind, and the connection acquisition histogram.
+    """
+    with _lock:
+        queries = {key: dict(entry, buckets=list(entry['buckets'])) for key, entry in sorted(_queries.items())}
+        connections = dict(_connections, buckets=list(_connections['buckets']))
+
+    lines = [
+        '# HELP dbtools_query_duration_seconds Time to execute a query, including receiving its rows.',
+        '# TYPE dbtools_query_duration_seconds histogram',
+    ]
+    for (caller, kind), entry in queries.items():
+        _histogram(lines, 'dbtools_query_duration_seconds', f'caller="{_label(caller)}",kind="{_label(kind)}"', entry)
+
+    for metric, key, help_text in (
+        ('dbtools_query_errors_total', 'errors', 'Queries that raised an error.'),
+        ('dbtools_query_rows_total', 'rows', 'Rows returned or affected by the queries.'),
+        ('dbtools_query_bytes_sent_total', 'bytes_sent', 'Bytes of SQL and COPY FROM data sent to the server.'),
+        ('dbtools_query_bytes_received_total', 'bytes_received',
+         'Bytes of COPY TO data received from the server (other results are not measured).'),
+    ):
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        for (caller, kind), entry in queries.items():
+            lines.append(f'{metric}{{caller="{_label(caller)}",kind="{_label(kind)}"}} {entry[key]}')
+
+    lines += [
+        '# HELP dbtools_connect_duration_seconds Time to open a database connection.',
+        '# TYPE dbtools_connect_duration_seconds histogram',
+    ]
+    _histogram(lines, 'dbtools_connect_duration_seconds', '', connections)
+    lines += [
+        '# HELP dbtools_connect_errors_total Connections that could not be opened.',
+        '# TYPE dbtools_connect_errors_total counter',
+        f'dbtools_connect_errors_total {connections["errors"]}',
+    ]
+
+    return '\n'.join(lines) + '\n'
@@ -13,20 +13,321 @@ The functions follow a consistent pattern:
 4. Insert associated metadata
 5. Commit the transaction or rollback on error
 
+Inside a batch() block the loaders share one transaction instead, and steps
+2 and 5 set, release or roll back a savepoint per loaded entity.
+
+Loaders of entities with a unique name or path accept on_conflict='skip' or
+'update' (INSERT ... ON CONFLICT), so an interrupted import can be re-run
+without checking which entities were already loaded.
+
 Dependencies:
-    - dbtools: Custom database utility module for fetching database data
+    - dbtools.fileinfo: For cross-checking measurements against their files (verify_file)
 """
 
-import dbtools as dbt
-import pandas as pd
+import contextlib
+import weakref
+
+import dbtools.fileinfo as fileinfo
+
+# Prepared INSERT statements per connection: {connection: {(table, columns): name}}
+# Prepared statements live as long as the server session, so the cache is
+# dropped together with the connection object.
+_prepared_statements = weakref.WeakKeyDictionary()
+
+# Active unit-of-work transactions opened with batch(): {connection: BatchState}
+_batches = weakref.WeakKeyDictionary()
+
+# Accepted values of the on_conflict option of the loaders
+ON_CONFLICT_MODES = (None, 'skip', 'update')
+
+# Unique column used as ON CONFLICT target for each table that has one
+CONFLICT_TARGETS = {
+    'fabrications': 'name',
+    'materials': 'name',
+    'panels': 'name',
+    'samples': 'name',
+    'measurementtypes': 'name',
+    'measurements': 'file_path',
+    'datasettypes': 'description',
+    'datasets': 'file_path',
+    'experiments': 'folder_path',
+    'models': 'model_folder_path',
+}
+
+def _prepare_insert(cursor, table_name, columns, on_conflict=None):
+    """
+    Get the prepared INSERT statement for a table and column set, preparing it if needed.
+
+    Statements are prepared once per connection and cached, so the server parses
+    and plans each (table, columns, on_conflict) INSERT only once per session.
+
+    Parameters:
+    -----------
+    cursor : psycopg2.cursor
+        An active database cursor object.
+    table_name : str
+        The name of the table to insert data into.
+    columns : tuple
+        The column names, in the order their values will be passed.
+    on_conflict : str, optional
+        None for a plain INSERT, or 'skip'/'update' to add an ON CONFLICT clause
+        on the unique column of the table (see CONFLICT_TARGETS).
+
+    Returns:
+    --------
+    str
+        The name of the prepared statement.
+    """
+    statements = _prepared_statements.setdefault(cursor.connection, {})
+    key = (table_name, columns, on_conflict)
+
+    if key not in statements:
+        name = f"dbtools_insert_{len(statements)}"
+        placeholders = ', '.join(f"${i + 1}" for i in range(len(columns)))
+        query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+        if on_conflict is None:
+            query += " RETURNING id"
+        else:
+            target = CONFLICT_TARGETS[table_name]
+            if on_conflict == 'skip':
+                query += f" ON CONFLICT ({target}) DO NOTHING"
+            else:
+                updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in columns)
+                query += f" ON CONFLICT ({target}) DO UPDATE SET {updates}"
+            # xmax is 0 only for rows inserted (not updated) by this statement
+            query += " RETURNING id, (xmax = 0) AS inserted"
+        cursor.execute(f"PREPARE {name} AS {query}")
+        # Only cache the statement once the server has accepted it
+        statements[key] = name
+
+    return statements[key]
+
+def _begin(conn):
+    """
+    Create the cursor of a loader call and start its transaction.
+
+    Inside batch() the loader shares the batch transaction instead, and a
+    savepoint is set so a failing entity can be undone on its own.
+
+    Parameters:
+    -----------
+    conn : psycopg2.connection
+        Database connection object.
+
+    Returns:
+    --------
+    psycopg2.cursor
+        The cursor to use for the loader call.
+    """
+    cursor = conn.cursor()
+    if conn in _batches:
+        cursor.execute("SAVEPOINT dbtools_load")
+    else:
+        conn.autocommit = False  # Start transaction
+    return cursor
+
+def _commit(conn, cursor):
+    """Commit a loader call, or release its savepoint inside batch()."""
+    batch_state = _batches.get(conn)
+    if batch_state is None:
+        conn.commit()
+    else:
+        cursor.execute("RELEASE SAVEPOINT dbtools_load")
+        batch_state.loaded += 1
+
+def _rollback(conn, cursor):
+    """Roll back a loader call, or only its savepoint inside batch()."""
+    batch_state = _batches.get(conn)
+    if batch_state is None:
+        conn.rollback()
+    else:
+        cursor.execute("ROLLBACK TO SAVEPOINT dbtools_load")
+        cursor.execute("RELEASE SAVEPOINT dbtools_load")
+        batch_state.failed += 1
+
+class BatchState:
+    """
+    Counters of a unit-of-work transaction opened with batch().
+
+    Attributes:
+    -----------
+    loaded : int
+        Number of loader calls that succeeded in the batch.
+    failed : int
+        Number of loader calls that failed and were rolled back to their savepoint.
+    """
+
+    def __init__(self):
+        self.loaded = 0
+        self.failed = 0
+
+@contextlib.contextmanager
+def batch(conn):
+    """
+    Run many loader calls in a single transaction.
+
+    All the load_* calls made with conn inside the with block share one
+    transaction that is committed once when the block exits. Each loader call
+    runs in its own savepoint, so an entity that fails (the loader returns -1)
+    is undone without losing the rest of the batch. If the block raises, the
+    whole batch is rolled back.
+
+    Because every call runs in the same transaction, loaders see the rows
+    inserted earlier in the batch (e.g. samples loaded before the measurements
+    that reference them).
+
+    Example:
+    --------
+    with load.batch(conn) as state:
+        for row in samples:
+            load.load_sample(conn, **row)
+    print(state.loaded, state.failed)
+
+    Parameters:
+    -----------
+    conn : psycopg2.connection
+        Database connection object.
+
+    Yields:
+    -------
+    BatchState
+        Counters of succeeded and failed loader calls.
+    """
+    assert conn not in _batches, "batch() cannot be nested on the same connection"
+
+    conn.autocommit = False  # Start transaction
+    batch_state = BatchState()
+    _batches[conn] = batch_state
+    try:
+        yield batch_state
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+        print(f"Batch committed: {batch_state.loaded} loaded, {batch_state.failed} failed")
+    finally:
+        del _batches[conn]
+
+def _lookup_ids(cursor, table_name, column, values):
+    """
+    Get the ids of the rows of a table whose column takes one of the given values.
+
+    The query runs on the loader's own cursor, so rows inserted earlier in the
+    same transaction are found.
+
+    Parameters:
+    -----------
+    cursor : psycopg2.cursor
+        An active database cursor object.
+    table_name : str
+        The name of the table to search.
+    column : str
+        The (unique) column to match.
+    values : list
+        The values to look up.
+
+    Returns:
+    --------
+    dict
+        Dictionary mapping each found value to its id.
+    """
+    cursor.execute(f"SELECT {column}, id FROM {table_name} WHERE {column} = ANY(%s)", (list(values),))
+    return dict(cursor.fetchall())
+
+def _load_entity(cursor, table_name, data, on_conflict=None):
+    """
+    Insert a row like load_table and tell whether it was inserted or already existed.
+
+    Parameters:
+    -----------
+    cursor : psycopg2.cursor
+        An active database cursor object.
+    table_name : str
+        The name of the table to insert data into.
+    data : dict
+        Dictionary with column names as keys and values to insert.
+    on_conflict : str, optional
+        None, 'skip' or 'update', see load_table.
+
+    Returns:
+    --------
+    tuple
+        (ID of the inserted or existing row, True if the row was inserted).
+    """
+    # Validate the cursor without a round trip to the server
+    if cursor.closed or cursor.connection.closed:
+        raise ValueError("Invalid cursor: the cursor or its connection is closed")
+    
+    # Check that data is a dictionary
+    if not isinstance(data, dict):
+        raise ValueError("Data must be a dictionary")
+
+    if on_conflict not in ON_CONFLICT_MODES:
+        raise ValueError(f"on_conflict must be one of {ON_CONFLICT_MODES}")
+    if on_conflict is not None and table_name not in CONFLICT_TARGETS:
+        raise ValueError(f"Table '{table_name}' has no unique column to resolve conflicts on")
+        
+    # Extract column names and values from the attributes dictionary
+    columns = tuple(data.keys())
+    values = list(data.values())
+
+    # Get the prepared INSERT ... RETURNING id statement for this column set
+    statement = _prepare_insert(cursor, table_name, columns, on_conflict)
+    placeholders = ', '.join(["%s" for _ in values])
+
+    # Execute the prepared statement with parameterized values to prevent SQL injection
+    cursor.execute(f"EXECUTE {statement} ({placeholders})", values)
+    row = cursor.fetchone()
+
+    if on_conflict is None:
+        # Fetch the returned ID of the newly inserted row
+        return row[0], True
+
+    if row is None:
+        # ON CONFLICT DO NOTHING returns no row: get the ID of the existing one
+        target = CONFLICT_TARGETS[table_name]
+        cursor.execute(f"SELECT id FROM {table_name} WHERE {target} = %s", (data[target],))
+        return cursor.fetchone()[0], False
+
+    return row[0], row[1]
+
+def _clear_existing(cursor, table_name, row_id, keys, relational_tables=()):
+    """
+    Delete what on_conflict='update' is about to load again for an existing row.
+
+    Only the given metadata keys are deleted, so metadata added by other tools
+    (e.g. checksums) is kept. The rows of the relational tables that reference
+    the entity are all deleted, as the loader inserts the full set again.
+
+    Parameters:
+    -----------
+    cursor : psycopg2.cursor
+        An active database cursor object.
+    table_name : str
+        The name of the main table (e.g. 'measurements').
+    row_id : int
+        ID of the existing row.
+    keys : list
+        Metadata keys to delete.
+    relational_tables : list, optional
+        Relational tables whose rows referencing the entity are deleted.
+    """
+    id_column = table_name[:-1] + '_id'
+    cursor.execute(f"DELETE FROM {table_name[:-1]}_metadata WHERE {id_column} = %s AND key = ANY(%s)",
+                   (row_id, list(keys)))
+    for relational_table_name in relational_tables:
+        cursor.execute(f"DELETE FROM {relational_table_name} WHERE {id_column} = %s", (row_id,))
 
-def load_table(cursor, table_name, data):
+def load_table(cursor, table_name, data, on_conflict=None):
     """
     Load a single row of data into a database table.
     
     This function serves as the base insertion method for all other loading
-    functions in this module. It constructs a parameterized SQL INSERT statement
-    from the provided data dictionary and returns the ID of the newly inserted row.
+    functions in this module. It executes a parameterized INSERT statement
+    built from the provided data dictionary and returns the ID of the newly
+    inserted row. The statement is prepared on the server once per
+    (table, column set) and connection, and reused on later calls.
     
     Parameters:
     -----------
@@ -36,48 +337,28 @@ def load_table(cursor, table_name, data):
         The name of the table to insert data into.
     data : dict
         Dictionary with column names as keys and values to insert.
+    on_conflict : str, optional
+        What to do when a row with the same unique value (see CONFLICT_TARGETS)
+        already exists: None raises the unique violation, 'skip' leaves the
+        existing row as is and 'update' overwrites its columns with data. In
+        both cases the ID of the existing row is returned.
         
     Returns:
     --------
     int
-        The ID of the inserted row.
+        The ID of the inserted (or existing) row.
         
     Raises:
     -------
     ValueError
-        If the cursor is invalid or data is not a dictionary.
+        If the cursor is invalid, data is not a dictionary or on_conflict is not
+        supported for the table.
     Exception
         Any database errors that occur during execution.
     """
-    # Validate cursor by executing a simple query
-    try:
-        cursor.execute("SELECT 1")
-    except Exception as e:
-        raise ValueError("Invalid cursor: " + str(e))
-    
-    # Check that data is a dictionary
-    if not isinstance(data, dict):
-        raise ValueError("Data must be a dictionary")
-        
-    # Extract column names and values from the attributes dictionary
-    columns = ', '.join(data.keys())
-    placeholders = ', '.join(["%s" for _ in data.values()])
-    values = list(data.values())
-
-    # Construct the SQL INSERT statement with RETURNING clause
-    # Assuming the ID column follows the pattern 'id'
-    id_column = f"id"
-    sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders}) RETURNING {id_column}"
-
-    # Execute the SQL statement with parameterized query to prevent SQL injection
-    cursor.execute(sql, values)
+    return _load_entity(cursor, table_name, data, on_conflict)[0]
 
-    # Fetch the returned ID of the newly inserted row
-    inserted_id = cursor.fetchone()[0]
-    
-    return inserted_id
-
-def load_fabrication(conn, name, additional_metadata=None):
+def load_fabrication(conn, name, additional_metadata=None, on_conflict=None):
     """
     Load a fabrication method into the database, including its metadata.
     
@@ -97,6 +378,11 @@ def load_fabrication(conn, name, additional_metadata=None):
         Each dictionary should have 'key', 'value', and 'type' keys.
         Example: [{'key': 'temperature', 'value': 150.5, 'type': 'celsius'}, 
                   {'key': 'pressure', 'value': '10MPa', 'type': 'string'}]
+    on_conflict : str, optional
+        What to do if a fabrication method with the same name already exists: None
+        fails and returns -1, 'skip' returns the ID of the existing fabrication
+        method without loading anything and 'update' overwrites it and replaces its
+        loaded metadata keys.
         
     Returns:
     --------
@@ -109,6 +395,7 @@ def load_fabrication(conn, name, additional_metadata=None):
         If any of the input parameters don't meet the expected types/values.
     """
     # Validate input parameters
+    assert on_conflict in ON_CONFLICT_MODES, "on_conflict must be None, 'skip' or 'update'"
     assert isinstance(name, str) and name, "Fabrication method name must be a non-empty string"
     
     # Validate additional_metadata if provided
@@ -118,9 +405,8 @@ def load_fabrication(conn, name, additional_metadata=None):
             assert isinstance(item, dict), "Each item in additional_metadata must be a dictionary"
             assert all(k in item for k in ['key', 'value', 'type']), "Each dictionary in additional_metadata must contain 'key', 'value', and 'type' keys"
 
-    # Create a cursor object and start a transaction
-    cursor = conn.cursor()
-    conn.autocommit = False  # Start transaction
+    # Create a cursor object and start a transaction (or a savepoint inside batch())
+    cursor = _begin(conn)
 
     # Create the parameters dictionary for fabrication insertion
     parameters = {
@@ -130,13 +416,19 @@ def load_fabrication(conn, name, additional_metadata=None):
     # Load the fabrication method into the database
     table_name = 'fabrications'
     try:
-        row_id = load_table(cursor, table_name, parameters)
+        row_id, inserted = _load_entity(cursor, table_name, parameters, on_conflict)
     except Exception as e:
         print(f"Error loading fabrication method: {e}")
-        conn.rollback()
+        _rollback(conn, cursor)
         cursor.close()
         return -1
 
+    if not inserted and on_conflict == 'skip':
+        print(f"Fabrication method '{name}' already exists with ID: {row_id}, skipped")
+        _commit(conn, cursor)
+        cursor.close()
+        return row_id
+
     print(f"Fabrication method '{name}' loaded with ID: {row_id}")
 
     # Create the metadata parameters dictionary
@@ -157,18 +449,28 @@ def load_fabrication(conn, name, additional_metadata=None):
 
     metadata_table_name = 'fabrication_metadata'
 
+    # On update, replace the loaded metadata keys of the existing fabrication method
+    if not inserted:
+        try:
+            _clear_existing(cursor, table_name, row_id, [attributes['key'] for attributes in metadata_parameters])
+        except Exception as e:
+            print(f"Error replacing existing fabrication method metadata: {e}")
+            _rollback(conn, cursor)
+            cursor.close()
+            return -1
+
     # Insert each metadata entry
     for attributes in metadata_parameters:
         try:
             load_table(cursor, metadata_table_name, attributes)
         except Exception as e:
             print(f"Error loading metadata: {e}")
-            conn.rollback()
+            _rollback(conn, cursor)
             cursor.close()
             return -1
     
     # Commit the transaction if everything is successful
-    conn.commit()
+    _commit(conn, cursor)
 
     # Close the cursor
     cursor.close()
@@ -176,7 +478,7 @@ def load_fabrication(conn, name, additional_metadata=None):
     return row_id
 
 
-def load_material(conn, name, layer_thickness, additional_metadata=None):
+def load_material(conn, name, layer_thickness, additional_metadata=None, on_conflict=None):
     """
     Load a material into the database, including its metadata.
     
@@ -198,6 +500,10 @@ def load_material(conn, name, layer_thickness, additional_metadata=None):
         Each dictionary should have 'key', 'value', and 'type' keys.
         Example: [{'key': 'density', 'value': 1.5, 'type': 'g/cm3'}, 
                   {'key': 'color', 'value': 'blue', 'type': 'string'}]
+    on_conflict : str, optional
+        What to do if a material with the same name already exists: None fails and
+        returns -1, 'skip' returns the ID of the existing material without loading
+        anything and 'update' overwrites it and replaces its loaded metadata keys.
         
     Returns:
     --------
@@ -210,6 +516,7 @@ def load_material(conn, name, layer_thickness, additional_metadata=None):
         If any of the input parameters don't meet the expected types/values.
     """
     # Validate input parameters
+    assert on_conflict in ON_CONFLICT_MODES, "on_conflict must be None, 'skip' or 'update'"
     assert isinstance(name, str) and name, "Material name must be a non-empty string"
     assert isinstance(layer_thickness, (float, int)) and layer_thickness > 0, "Layer thickness must be a positive number"
     
@@ -220,9 +527,8 @@ def load_material(conn, name, layer_thickness, additional_metadata=None):
             assert isinstance(item, dict), "Each item in additional_metadata must be a dictionary"
             assert all(k in item for k in ['key', 'value', 'type']), "Each dictionary in additional_metadata must contain 'key', 'value', and 'type' keys"
 
-    # Create a cursor object and start a transaction
-    cursor = conn.cursor()
-    conn.autocommit = False  # Start transaction
+    # Create a cursor object and start a transaction (or a savepoint inside batch())
+    cursor = _begin(conn)
 
     # Create the parameters dictionary for material insertion
     parameters = {
@@ -232,13 +538,19 @@ def load_material(conn, name, layer_thickness, additional_metadata=None):
     # Load the material into the database
     table_name = 'materials'
     try:
-        row_id = load_table(cursor, table_name, parameters)
+        row_id, inserted = _load_entity(cursor, table_name, parameters, on_conflict)
     except Exception as e:
         print(f"Error loading material: {e}")
-        conn.rollback()
+        _rollback(conn, cursor)
         cursor.close()
         return -1
 
+    if not inserted and on_conflict == 'skip':
+        print(f"Material '{name}' already exists with ID: {row_id}, skipped")
+        _commit(conn, cursor)
+        cursor.close()
+        return row_id
+
     print(f"Material '{name}' loaded with ID: {row_id}")
 
     # Create the metadata parameters dictionary with the required layer_thickness
@@ -260,18 +572,28 @@ def load_material(conn, name, layer_thickness, additional_metadata=None):
 
     metadata_table_name = 'material_metadata'
 
+    # On update, replace the loaded metadata keys of the existing material
+    if not inserted:
+        try:
+            _clear_existing(cursor, table_name, row_id, [attributes['key'] for attributes in metadata_parameters])
+        except Exception as e:
+            print(f"Error replacing existing material metadata: {e}")
+            _rollback(conn, cursor)
+            cursor.close()
+            return -1
+
     # Insert each metadata entry
     for attributes in metadata_parameters:
         try:
             load_table(cursor, metadata_table_name, attributes)
         except Exception as e:
             print(f"Error loading metadata: {e}")
-            conn.rollback()
+            _rollback(conn, cursor)
             cursor.close()
             return -1
     
     # Commit the transaction if everything is successful
-    conn.commit()
+    _commit(conn, cursor)
 
     # Close the cursor
     cursor.close()
@@ -279,7 +601,7 @@ def load_material(conn, name, layer_thickness, additional_metadata=None):
     return row_id
 
 
-def load_panel(conn, name, material_id, fabrication_id, height, width, thickness, layer_layout=None, description=None, additional_metadata=None):
+def load_panel(conn, name, material_id, fabrication_id, height, width, thickness, layer_layout=None, description=None, additional_metadata=None, on_conflict=None):
     """
     Load a panel into the database, including its metadata.
     
@@ -314,6 +636,10 @@ def load_panel(conn, name, material_id, fabrication_id, height, width, thickness
         Each dictionary should have 'key', 'value', and 'type' keys.
         Example: [{'key': 'surface_finish', 'value': 'polished', 'type': 'string'}, 
                   {'key': 'weight', 'value': 2.5, 'type': 'kg'}]
+    on_conflict : str, optional
+        What to do if a panel with the same name already exists: None fails and
+        returns -1, 'skip' returns the ID of the existing panel without loading
+        anything and 'update' overwrites it and replaces its loaded metadata keys.
         
     Returns:
     --------
@@ -326,6 +652,7 @@ def load_panel(conn, name, material_id, fabrication_id, height, width, thickness
         If any of the input parameters don't meet the expected types/values.
     """
     # Validate input parameters
+    assert on_conflict in ON_CONFLICT_MODES, "on_conflict must be None, 'skip' or 'update'"
     assert isinstance(name, str) and name, "Panel name must be a non-empty string"
     assert isinstance(material_id, int) and material_id > 0, "Material ID must be a positive integer"
     assert isinstance(fabrication_id, int) and fabrication_id > 0, "Fabrication ID must be a positive integer"
@@ -348,9 +675,8 @@ def load_panel(conn, name, material_id, fabrication_id, height, width, thickness
             assert isinstance(item, dict), "Each item in additional_metadata must be a dictionary"
             assert all(k in item for k in ['key', 'value', 'type']), "Each dictionary in additional_metadata must contain 'key', 'value', and 'type' keys"
     
-    # Create a cursor object and start a transaction
-    cursor = conn.cursor()
-    conn.autocommit = False  # Start transaction
+    # Create a cursor object and start a transaction (or a savepoint inside batch())
+    cursor = _begin(conn)
     
     # Create the parameters dictionary for panel insertion
     parameters = {
@@ -366,13 +692,19 @@ def load_panel(conn, name, material_id, fabrication_id, height, width, thickness
     # Load the panel into the database
     table_name = 'panels'
     try:
-        row_id = load_table(cursor, table_name, parameters)
+        row_id, inserted = _load_entity(cursor, table_name, parameters, on_conflict)
     except Exception as e:
         print(f"Error loading panel: {e}")
-        conn.rollback()
+        _rollback(conn, cursor)
         cursor.close()
         return -1
     
+    if not inserted and on_conflict == 'skip':
+        print(f"Panel '{name}' already exists with ID: {row_id}, skipped")
+        _commit(conn, cursor)
+        cursor.close()
+        return row_id
+
     print(f"Panel '{name}' loaded with ID: {row_id}")
     
       # Create the metadata parameters dictionary
@@ -405,18 +737,28 @@ def load_panel(conn, name, material_id, fabrication_id, height, width, thickness
     
     metadata_table_name = 'panel_metadata'
     
+    # On update, replace the loaded metadata keys of the existing panel
+    if not inserted:
+        try:
+            _clear_existing(cursor, table_name, row_id, [attributes['key'] for attributes in metadata_parameters])
+        except Exception as e:
+            print(f"Error replacing existing panel metadata: {e}")
+            _rollback(conn, cursor)
+            cursor.close()
+            return -1
+
     # Insert each metadata entry
     for attributes in metadata_parameters:
         try:
             load_table(cursor, metadata_table_name, attributes)
         except Exception as e:
             print(f"Error loading panel metadata: {e}")
-            conn.rollback()
+            _rollback(conn, cursor)
             cursor.close()
             return -1
     
     # Commit the transaction if everything is successful
-    conn.commit()
+    _commit(conn, cursor)
     
     # Close the cursor
     cursor.close()
@@ -424,7 +766,7 @@ def load_panel(conn, name, material_id, fabrication_id, height, width, thickness
     return row_id
 
 
-def load_sample(conn, name, panel_id, height, width, thickness, keyhole, parallel_faces, description=None, additional_metadata=None):
+def load_sample(conn, name, panel_id, height, width, thickness, keyhole, parallel_faces, description=None, additional_metadata=None, on_conflict=None):
     """
     Load a sample into the database, including its metadata.
     
@@ -459,6 +801,10 @@ def load_sample(conn, name, panel_id, height, width, thickness, keyhole, paralle
         Each dictionary should have 'key', 'value', and 'type' keys.
         Example: [{'key': 'defect_count', 'value': 3, 'type': 'integer'}, 
                   {'key': 'manufacturing_date', 'value': '2025-01-15', 'type': 'date'}]
+    on_conflict : str, optional
+        What to do if a sample with the same name already exists: None fails and
+        returns -1, 'skip' returns the ID of the existing sample without loading
+        anything and 'update' overwrites it and replaces its loaded metadata keys.
         
     Returns:
     --------
@@ -471,6 +817,7 @@ def load_sample(conn, name, panel_id, height, width, thickness, keyhole, paralle
         If any of the input parameters don't meet the expected types/values.
     """
     # Validate input parameters
+    assert on_conflict in ON_CONFLICT_MODES, "on_conflict must be None, 'skip' or 'update'"
     assert isinstance(name, str) and name, "Sample name must be a non-empty string"
     assert isinstance(panel_id, int) and panel_id > 0, "Panel ID must be a positive integer"
     assert isinstance(height, (float, int)) and height > 0, "Height must be a positive number"
@@ -490,9 +837,8 @@ def load_sample(conn, name, panel_id, height, width, thickness, keyhole, paralle
             assert isinstance(item, dict), "Each item in additional_metadata must be a dictionary"
             assert all(k in item for k in ['key', 'value', 'type']), "Each dictionary in additional_metadata must contain 'key', 'value', and 'type' keys"
     
-    # Create a cursor object and start a transaction
-    cursor = conn.cursor()
-    conn.autocommit = False  # Start transaction
+    # Create a cursor object and start a transaction (or a savepoint inside batch())
+    cursor = _begin(conn)
     
     # Create the parameters dictionary for sample insertion
     parameters = {
@@ -507,13 +853,19 @@ def load_sample(conn, name, panel_id, height, width, thickness, keyhole, paralle
     # Load the sample into the database
     table_name = 'samples'
     try:
-        row_id = load_table(cursor, table_name, parameters)
+        row_id, inserted = _load_entity(cursor, table_name, parameters, on_conflict)
     except Exception as e:
         print(f"Error loading sample: {e}")
-        conn.rollback()
+        _rollback(conn, cursor)
         cursor.close()
         return -1
 
+    if not inserted and on_conflict == 'skip':
+        print(f"Sample '{name}' already exists with ID: {row_id}, skipped")
+        _commit(conn, cursor)
+        cursor.close()
+        return row_id
+
     print(f"Sample '{name}' loaded with ID: {row_id}")
     
     # Create the metadata parameters dictionary
@@ -539,25 +891,35 @@ def load_sample(conn, name, panel_id, height, width, thickness, keyhole, paralle
     
     metadata_table_name = 'sample_metadata'
     
+    # On update, replace the loaded metadata keys of the existing sample
+    if not inserted:
+        try:
+            _clear_existing(cursor, table_name, row_id, [attributes['key'] for attributes in metadata_parameters])
+        except Exception as e:
+            print(f"Error replacing existing sample metadata: {e}")
+            _rollback(conn, cursor)
+            cursor.close()
+            return -1
+
     # Insert each metadata entry
     for attributes in metadata_parameters:
         try:
             load_table(cursor, metadata_table_name, attributes)
         except Exception as e:
             print(f"Error loading sample metadata: {e}")
-            conn.rollback()
+            _rollback(conn, cursor)
             cursor.close()
             return -1
 
     # Commit the transaction if everything is successful
-    conn.commit()
+    _commit(conn, cursor)
     
     # Close the cursor
     cursor.close()
 
     return row_id
 
-def load_measurementtype(conn, name, additional_metadata=None):
+def load_measurementtype(conn, name, additional_metadata=None, on_conflict=None):
     """
     Load a measurement type into the database, including its metadata.
 
@@ -576,6 +938,11 @@ def load_measurementtype(conn, name, additional_metadata=None):
         Each dictionary should have 'key', 'value', and 'type' keys.
         Example: [{'key': 'density', 'value': 1.5, 'type': 'float'}, 
                   {'key': 'color', 'value': 'blue', 'type': 'string'}]
+    on_conflict : str, optional
+        What to do if a measurement type with the same name already exists: None
+        fails and returns -1, 'skip' returns the ID of the existing measurement type
+        without loading anything and 'update' overwrites it and replaces its loaded
+        metadata keys.
         
     Returns:
     --------
@@ -587,6 +954,7 @@ def load_measurementtype(conn, name, additional_metadata=None):
         If any of the input parameters don't meet the expected types/values.
     """
     # Validate input parameters
+    assert on_conflict in ON_CONFLICT_MODES, "on_conflict must be None, 'skip' or 'update'"
     assert isinstance(name, str) and name, "Material name must be a non-empty string"
     
     # Validate additional_metadata if provided
@@ -596,9 +964,8 @@ def load_measurementtype(conn, name, additional_metadata=None):
             assert isinstance(item, dict), "Each item in additional_metadata must be a dictionary"
             assert all(k in item for k in ['key', 'value', 'type']), "Each dictionary in additional_metadata must contain 'key', 'value', and 'type' keys"
 
-    # Create a cursor object and start a transaction
-    cursor = conn.cursor()
-    conn.autocommit = False  # Start transaction
+    # Create a cursor object and start a transaction (or a savepoint inside batch())
+    cursor = _begin(conn)
 
     # Create the parameters dictionary for material insertion
     parameters = {
@@ -608,13 +975,19 @@ def load_measurementtype(conn, name, additional_metadata=None):
     # Load the material into the database
     table_name = 'measurementtypes'
     try:
-        row_id = load_table(cursor, table_name, parameters)
+        row_id, inserted = _load_entity(cursor, table_name, parameters, on_conflict)
     except Exception as e:
         print(f"Error loading material: {e}")
-        conn.rollback()
+        _rollback(conn, cursor)
         cursor.close()
         return -1
 
+    if not inserted and on_conflict == 'skip':
+        print(f"Measurement type '{name}' already exists with ID: {row_id}, skipped")
+        _commit(conn, cursor)
+        cursor.close()
+        return row_id
+
     print(f"Material '{name}' loaded with ID: {row_id}")
 
     # Create the metadata parameters dictionary
@@ -635,26 +1008,103 @@ def load_measurementtype(conn, name, additional_metadata=None):
 
     metadata_table_name = 'measurementtype_metadata'
 
+    # On update, replace the loaded metadata keys of the existing measurement type
+    if not inserted:
+        try:
+            _clear_existing(cursor, table_name, row_id, [attributes['key'] for attributes in metadata_parameters])
+        except Exception as e:
+            print(f"Error replacing existing measurement type metadata: {e}")
+            _rollback(conn, cursor)
+            cursor.close()
+            return -1
+
     # Insert each metadata entry
     for attributes in metadata_parameters:
         try:
             load_table(cursor, metadata_table_name, attributes)
         except Exception as e:
             print(f"Error loading metadata: {e}")
-            conn.rollback()
+            _rollback(conn, cursor)
             cursor.close()
             return -1
     
     # Commit the transaction if everything is successful
-    conn.commit()
+    _commit(conn, cursor)
 
     # Close the cursor
     cursor.close()
 
     return row_id
 
+def ut_measurement_metadata(height, width, depth, dtype, file_type, signal_type, axes_order):
+    """
+    Build the mandatory metadata entries of an ultrasonic measurement.
+
+    Parameters:
+    -----------
+    height, width, depth : int
+        Dimensions of the measurement.
+    dtype : str
+        Data type of the measurement.
+    file_type : str
+        File extension of the measurement.
+    signal_type : str
+        Signal type of the measurement ('RF' or 'Amplitude').
+    axes_order : list
+        Order of the axes of the volume, e.g., ['x', 'y', 'z'].
+
+    Returns:
+    --------
+    list
+        List of dictionaries with 'key', 'value' and 'type' keys.
+    """
+    return [
+        {'key': 'height', 'value': str(height), 'type': 'cardinal'},
+        {'key': 'width', 'value': str(width), 'type': 'cardinal'},
+        {'key': 'depth', 'value': str(depth), 'type': 'cardinal'},
+        {'key': 'dtype', 'value': dtype, 'type': 'nominal'},
+        {'key': 'file_type', 'value': file_type, 'type': 'nominal'},
+        {'key': 'signal_type', 'value': signal_type, 'type': 'nominal'},
+        {'key': 'axes_order', 'value': str(axes_order), 'type': 'list'}
+    ]
+
+def xct_measurement_metadata(height, width, depth, dtype, file_type, aligned, equalized, axes_order):
+    """
+    Build the mandatory metadata entries of an X-ray CT measurement.
+
+    Parameters:
+    -----------
+    height, width, depth : int
+        Dimensions of the measurement.
+    dtype : str
+        Data type of the measurement.
+    file_type : str
+        File extension of the measurement.
+    aligned : bool
+        Whether the volume is frontwall aligned.
+    equalized : bool
+        Whether the volume is equalized.
+    axes_order : list
+        Order of the axes of the volume, e.g., ['x', 'y', 'z'].
+
+    Returns:
+    --------
+    list
+        List of dictionaries with 'key', 'value' and 'type' keys.
+    """
+    return [
+        {'key': 'height', 'value': str(height), 'type': 'cardinal'},
+        {'key': 'width', 'value': str(width), 'type': 'cardinal'},
+        {'key': 'depth', 'value': str(depth), 'type': 'cardinal'},
+        {'key': 'dtype', 'value': dtype, 'type': 'string'},
+        {'key': 'file_type', 'value': file_type, 'type': 'string'},
+        {'key': 'aligned', 'value': str(aligned), 'type': 'bool'},
+        {'key': 'equalized', 'value': str(equalized), 'type': 'bool'},
+        {'key': 'axes_order', 'value': str(axes_order), 'type': 'list'}
+    ]
+
 def load_ut_measurement(conn, file_path, measurementtype_id, height, width, depth, dtype, 
-                        file_type, signal_type, axes_order,sample_names, parent_measurement_path=None, transformations=None, additional_metadata=None):
+                        file_type, signal_type, axes_order,sample_names, parent_measurement_path=None, transformations=None, additional_metadata=None, verify_file=False, on_conflict=None):
     """
     Load an ultrasonic measurement into the database, including its metadata.
     
@@ -687,6 +1137,14 @@ def load_ut_measurement(conn, file_path, measurementtype_id, height, width, dept
     transformations : str, optional
         Explanation of the transformations done to the parent measurement to create this one.
         Required if parent_measurement_path is set.
+    verify_file : bool, optional
+        If True, cross-check height, width, depth and dtype against the file
+        headers (through the persistent file information cache) before loading.
+    on_conflict : str, optional
+        What to do if a measurement with the same file path already exists: None
+        fails and returns -1, 'skip' returns the ID of the existing measurement
+        without loading anything and 'update' overwrites it and replaces its loaded
+        metadata keys and relations.
 
     Returns:
     --------
@@ -698,6 +1156,7 @@ def load_ut_measurement(conn, file_path, measurementtype_id, height, width, dept
         If any of the input parameters don't meet the expected types/values.
     """
     # Validate input parameters
+    assert on_conflict in ON_CONFLICT_MODES, "on_conflict must be None, 'skip' or 'update'"
     assert isinstance(file_path, str) and file_path, "File path must be a non-empty string"
     assert isinstance(measurementtype_id, int) and measurementtype_id > 0, "Measurement type ID must be a positive integer"
     assert isinstance(height, int) and height > 0, "Height must be a positive integer"
@@ -723,9 +1182,19 @@ def load_ut_measurement(conn, file_path, measurementtype_id, height, width, dept
             assert isinstance(item, dict), "Each item in additional_metadata must be a dictionary"
             assert all(k in item for k in ['key', 'value', 'type']), "Each dictionary in additional_metadata must contain 'key', 'value', and 'type' keys"
 
-    # Create a cursor object and start a transaction
-    cursor = conn.cursor()
-    conn.autocommit = False  # Start transaction
+    # Cross-check the declared properties against the file headers
+    if verify_file:
+        try:
+            mismatches = fileinfo.check_file_info(file_path, height, width, depth, dtype)
+        except Exception as e:
+            print(f"Error reading UT measurement file properties: {e}")
+            return -1
+        if mismatches:
+            print(f"Error: UT measurement '{file_path}' does not match its file: {'; '.join(mismatches)}")
+            return -1
+
+    # Create a cursor object and start a transaction (or a savepoint inside batch())
+    cursor = _begin(conn)
     
     # Create the parameters dictionary for measurement insertion
     parameters = {
@@ -735,30 +1204,36 @@ def load_ut_measurement(conn, file_path, measurementtype_id, height, width, dept
 
     #get the parent_measurement_id
     if parent_measurement_path is not None:
-        parent_measurement_id = dbt.get_id('measurements', ['file_path_measurement'], [parent_measurement_path])
-        parameters['parent_measurement_id'] = int(parent_measurement_id)
+        parent_ids = _lookup_ids(cursor, 'measurements', 'file_path', [parent_measurement_path])
+        if parent_measurement_path not in parent_ids:
+            print(f"Error: No parent measurement found with file path: {parent_measurement_path}")
+            _rollback(conn, cursor)
+            cursor.close()
+            return -1
+        parameters['parent_measurement_id'] = int(parent_ids[parent_measurement_path])
     
     # Load the measurement into the database
     table_name = 'measurements'
     try:
-        row_id = load_table(cursor, table_name, parameters)
+        row_id, inserted = _load_entity(cursor, table_name, parameters, on_conflict)
     except Exception as e:
         print(f"Error loading UT measurement: {e}")
-        conn.rollback()
+        _rollback(conn, cursor)
         cursor.close()
         return -1
 
+    if not inserted and on_conflict == 'skip':
+        print(f"UT measurement from '{file_path}' already exists with ID: {row_id}, skipped")
+        _commit(conn, cursor)
+        cursor.close()
+        return row_id
+
     print(f"UT measurement from '{file_path}' loaded with ID: {row_id}")
     
     # Create the metadata parameters dictionary
     metadata_parameters = [
-        {table_name[:-1] + '_id': row_id, 'key': 'height', 'value': str(height), 'type': 'cardinal'},
-        {table_name[:-1] + '_id': row_id, 'key': 'width', 'value': str(width), 'type': 'cardinal'},
-        {table_name[:-1] + '_id': row_id, 'key': 'depth', 'value': str(depth), 'type': 'cardinal'},
-        {table_name[:-1] + '_id': row_id, 'key': 'dtype', 'value': dtype, 'type': 'nominal'},
-        {table_name[:-1] + '_id': row_id, 'key': 'file_type', 'value': file_type, 'type': 'nominal'},
-        {table_name[:-1] + '_id': row_id, 'key': 'signal_type', 'value': signal_type, 'type': 'nominal'},
-        {table_name[:-1] + '_id': row_id, 'key': 'axes_order', 'value': str(axes_order), 'type': 'list'}
+        {table_name[:-1] + '_id': row_id, **item}
+        for item in ut_measurement_metadata(height, width, depth, dtype, file_type, signal_type, axes_order)
     ]
 
     # Add additional metadata if provided
@@ -784,29 +1259,35 @@ def load_ut_measurement(conn, file_path, measurementtype_id, height, width, dept
     
     metadata_table_name = 'measurement_metadata'
     
+    # On update, replace the loaded metadata keys and the relations of the existing measurement
+    if not inserted:
+        try:
+            _clear_existing(cursor, table_name, row_id, [attributes['key'] for attributes in metadata_parameters], ['sample_measurements'])
+        except Exception as e:
+            print(f"Error replacing existing measurement metadata: {e}")
+            _rollback(conn, cursor)
+            cursor.close()
+            return -1
+
     # Insert each metadata entry
     for attributes in metadata_parameters:
         try:
             load_table(cursor, metadata_table_name, attributes)
         except Exception as e:
             print(f"Error loading UT measurement metadata: {e}")
-            conn.rollback()
+            _rollback(conn, cursor)
             cursor.close()
             return -1
 
     # Insert sample names into the ut_measurement_samples table
-    samples_data = dbt.get_data_metadata('samples')
-
-    #get the ids of the samples in sample_names
-    samples_data = samples_data[samples_data['name_sample'].isin(sample_names)]
-
-    sample_ids = samples_data['id_sample'].values.tolist()
+    # Get the ids of the samples in sample_names
+    sample_ids = list(_lookup_ids(cursor, 'samples', 'name', sample_names).values())
 
     relational_table_name = 'sample_measurements'
 
     if sample_ids is None or len(sample_ids) == 0:
         print(f"Error: No valid sample IDs found for the provided sample names: {sample_names}")
-        conn.rollback()
+        _rollback(conn, cursor)
         cursor.close()
         return -1
 
@@ -818,12 +1299,12 @@ def load_ut_measurement(conn, file_path, measurementtype_id, height, width, dept
             load_table(cursor, relational_table_name, relational_parameters)
         except Exception as e:
             print(f"Error loading sample-measurement relationship: {e}")
-            conn.rollback()
+            _rollback(conn, cursor)
             cursor.close()
             return -1
     
     # Commit the transaction if everything is successful
-    conn.commit()
+    _commit(conn, cursor)
     
     # Close the cursor
     cursor.close()
@@ -832,7 +1313,7 @@ def load_ut_measurement(conn, file_path, measurementtype_id, height, width, dept
 
 
 def load_xct_measurement(conn, file_path, measurementtype_id, height, width, depth, dtype, 
-                         file_type, sample_names, aligned, equalized, axes_order, parent_measurement_path=None, transformations=None, additional_metadata=None):
+                         file_type, sample_names, aligned, equalized, axes_order, parent_measurement_path=None, transformations=None, additional_metadata=None, verify_file=False, on_conflict=None):
     """
     Load an X-ray CT measurement into the database, including its metadata.
     
@@ -867,6 +1348,14 @@ def load_xct_measurement(conn, file_path, measurementtype_id, height, width, dep
     transformations : str, optional
         Explanation of the transformations done to the parent measurement to create this one.
         Required if parent_measurement_path is set.
+    verify_file : bool, optional
+        If True, cross-check height, width, depth and dtype against the file
+        headers (through the persistent file information cache) before loading.
+    on_conflict : str, optional
+        What to do if a measurement with the same file path already exists: None
+        fails and returns -1, 'skip' returns the ID of the existing measurement
+        without loading anything and 'update' overwrites it and replaces its loaded
+        metadata keys and relations.
         
     Returns:
     --------
@@ -878,6 +1367,7 @@ def load_xct_measurement(conn, file_path, measurementtype_id, height, width, dep
         If any of the input parameters don't meet the expected types/values.
     """
     # Validate input parameters
+    assert on_conflict in ON_CONFLICT_MODES, "on_conflict must be None, 'skip' or 'update'"
     assert isinstance(file_path, str) and file_path, "File path must be a non-empty string"
     assert isinstance(measurementtype_id, int) and measurementtype_id > 0, "Measurement type ID must be a positive integer"
     assert isinstance(height, int) and height > 0, "Height must be a positive integer"
@@ -904,10 +1394,20 @@ def load_xct_measurement(conn, file_path, measurementtype_id, height, width, dep
         for item in additional_metadata:
             assert isinstance(item, dict), "Each item in additional_metadata must be a dictionary"
             assert all(k in item for k in ['key', 'value', 'type']), "Each dictionary in additional_metadata must contain 'key', 'value', and 'type' keys"
+
+    # Cross-check the declared properties against the file headers
+    if verify_file:
+        try:
+            mismatches = fileinfo.check_file_info(file_path, height, width, depth, dtype)
+        except Exception as e:
+            print(f"Error reading XCT measurement file properties: {e}")
+            return -1
+        if mismatches:
+            print(f"Error: XCT measurement '{file_path}' does not match its file: {'; '.join(mismatches)}")
+            return -1
     
-    # Create a cursor object and start a transaction
-    cursor = conn.cursor()
-    conn.autocommit = False  # Start transaction
+    # Create a cursor object and start a transaction (or a savepoint inside batch())
+    cursor = _begin(conn)
     
     # Create the parameters dictionary for measurement insertion
     parameters = {
@@ -917,31 +1417,36 @@ def load_xct_measurement(conn, file_path, measurementtype_id, height, width, dep
     
     # Get the parent_measurement_id if parent_measurement_path is provided
     if parent_measurement_path is not None:
-        parent_measurement_id = dbt.get_id('measurements', ['file_path_measurement'], [parent_measurement_path])
-        parameters['parent_measurement_id'] = int(parent_measurement_id)
+        parent_ids = _lookup_ids(cursor, 'measurements', 'file_path', [parent_measurement_path])
+        if parent_measurement_path not in parent_ids:
+            print(f"Error: No parent measurement found with file path: {parent_measurement_path}")
+            _rollback(conn, cursor)
+            cursor.close()
+            return -1
+        parameters['parent_measurement_id'] = int(parent_ids[parent_measurement_path])
     
     # Load the measurement into the database
     table_name = 'measurements'
     try:
-        row_id = load_table(cursor, table_name, parameters)
+        row_id, inserted = _load_entity(cursor, table_name, parameters, on_conflict)
     except Exception as e:
         print(f"Error loading XCT measurement: {e}")
-        conn.rollback()
+        _rollback(conn, cursor)
         cursor.close()
         return -1
     
+    if not inserted and on_conflict == 'skip':
+        print(f"XCT measurement from '{file_path}' already exists with ID: {row_id}, skipped")
+        _commit(conn, cursor)
+        cursor.close()
+        return row_id
+
     print(f"XCT measurement from '{file_path}' loaded with ID: {row_id}")
     
     # Create the metadata parameters dictionary
     metadata_parameters = [
-        {table_name[:-1] + '_id': row_id, 'key': 'height', 'value': str(height), 'type': 'cardinal'},
-        {table_name[:-1] + '_id': row_id, 'key': 'width', 'value': str(width), 'type': 'cardinal'},
-        {table_name[:-1] + '_id': row_id, 'key': 'depth', 'value': str(depth), 'type': 'cardinal'},
-        {table_name[:-1] + '_id': row_id, 'key': 'dtype', 'value': dtype, 'type': 'string'},
-        {table_name[:-1] + '_id': row_id, 'key': 'file_type', 'value': file_type, 'type': 'string'},
-        {table_name[:-1] + '_id': row_id, 'key': 'aligned', 'value': str(aligned), 'type': 'bool'},
-        {table_name[:-1] + '_id': row_id, 'key': 'equalized', 'value': str(equalized), 'type': 'bool'},
-        {table_name[:-1] + '_id': row_id, 'key': 'axes_order', 'value': str(axes_order), 'type': 'list'}
+        {table_name[:-1] + '_id': row_id, **item}
+        for item in xct_measurement_metadata(height, width, depth, dtype, file_type, aligned, equalized, axes_order)
     ]
 
     # Add additional metadata if provided
@@ -967,29 +1472,35 @@ def load_xct_measurement(conn, file_path, measurementtype_id, height, width, dep
     
     metadata_table_name = 'measurement_metadata'
     
+    # On update, replace the loaded metadata keys and the relations of the existing measurement
+    if not inserted:
+        try:
+            _clear_existing(cursor, table_name, row_id, [attributes['key'] for attributes in metadata_parameters], ['sample_measurements'])
+        except Exception as e:
+            print(f"Error replacing existing measurement metadata: {e}")
+            _rollback(conn, cursor)
+            cursor.close()
+            return -1
+
     # Insert each metadata entry
     for attributes in metadata_parameters:
         try:
             load_table(cursor, metadata_table_name, attributes)
         except Exception as e:
             print(f"Error loading XCT measurement metadata: {e}")
-            conn.rollback()
+            _rollback(conn, cursor)
             cursor.close()
             return -1
     
     # Insert sample names into the xct_measurement_samples table
-    samples_data = dbt.get_data_metadata('samples')
-
     # Get the ids of the samples in sample_names
-    samples_data = samples_data[samples_data['name_sample'].isin(sample_names)]
-
-    sample_ids = samples_data['id_sample'].values.tolist()
+    sample_ids = list(_lookup_ids(cursor, 'samples', 'name', sample_names).values())
 
     relational_table_name = 'sample_measurements'
 
     if sample_ids is None or len(sample_ids) == 0:
         print(f"Error: No valid sample IDs found for the provided sample names: {sample_names}")
-        conn.rollback()
+        _rollback(conn, cursor)
         cursor.close()
         return -1
 
@@ -1000,12 +1511,12 @@ def load_xct_measurement(conn, file_path, measurementtype_id, height, width, dep
             load_table(cursor, relational_table_name, relational_parameters)
         except Exception as e:
             print(f"Error loading sample-measurement relationship: {e}")
-            conn.rollback()
+            _rollback(conn, cursor)
             cursor.close()
             return -1
     
     # Commit the transaction if everything is successful
-    conn.commit()
+    _commit(conn, cursor)
     
     # Close the cursor
     cursor.close()
@@ -1060,21 +1571,22 @@ def load_registration(conn,transformation_matrix, reference_file_path, registere
             assert isinstance(item, dict), "Each item in additional_metadata must be a dictionary"
             assert all(k in item for k in ['key', 'value', 'type']), "Each dictionary in additional_metadata must contain 'key', 'value', and 'type' keys"
     
-    # Create a cursor object and start a transaction
-    cursor = conn.cursor()
-    conn.autocommit = False  # Start transaction
-
-    # Insert sample names into the xct_measurement_samples table
-    measurements_data = dbt.get_data_metadata('measurements')
+    # Create a cursor object and start a transaction (or a savepoint inside batch())
+    cursor = _begin(conn)
 
+    # Get the IDs of the reference and registered measurements from their file paths
     measurement_paths = [reference_file_path, registered_file_path]
+    measurement_ids = _lookup_ids(cursor, 'measurements', 'file_path', measurement_paths)
 
-    # Filter measurements to only include those whose file paths match the provided paths
-    measurements_data = measurements_data[measurements_data['file_path_measurement'].isin(measurement_paths)]
+    missing_paths = [path for path in measurement_paths if path not in measurement_ids]
+    if missing_paths:
+        print(f"Error: No measurements found with file paths: {missing_paths}")
+        _rollback(conn, cursor)
+        cursor.close()
+        return -1
 
-    # Extract the measurement IDs from the filtered data
-    reference_measurement_id = measurements_data[measurements_data['file_path_measurement'] == reference_file_path]['id_measurement'].values.tolist()[0]
-    registered_measurement_id = measurements_data[measurements_data['file_path_measurement'] == registered_file_path]['id_measurement'].values.tolist()[0]
+    reference_measurement_id = measurement_ids[reference_file_path]
+    registered_measurement_id = measurement_ids[registered_file_path]
     
     # Create the parameters dictionary for registration insertion
     parameters = {
@@ -1089,7 +1601,7 @@ def load_registration(conn,transformation_matrix, reference_file_path, registere
         row_id = load_table(cursor, table_name, parameters)
     except Exception as e:
         print(f"Error loading registration: {e}")
-        conn.rollback()
+        _rollback(conn, cursor)
         cursor.close()
         return -1
     
@@ -1119,21 +1631,21 @@ def load_registration(conn,transformation_matrix, reference_file_path, registere
             load_table(cursor, metadata_table_name, attributes)
         except Exception as e:
             print(f"Error loading dataset metadata: {e}")
-            conn.rollback()
+            _rollback(conn, cursor)
             cursor.close()
             return -1
     
     print(f"Registration loaded with ID: {row_id}")
     
     # Commit the transaction if everything is successful
-    conn.commit()
+    _commit(conn, cursor)
     
     # Close the cursor
     cursor.close()
 
     return row_id
 
-def load_datasettype(conn, description):
+def load_datasettype(conn, description, on_conflict=None):
 
     """
     Load a dataset type into the database, including its metadata.
@@ -1144,6 +1656,10 @@ def load_datasettype(conn, description):
         Database connection object.
     description : str
         Description of the dataset type.
+    on_conflict : str, optional
+        What to do if a dataset type with the same description already exists: None
+        fails and returns -1, 'skip' returns the ID of the existing dataset type
+        without loading anything and 'update' returns it as well.
         
     Returns:
     --------
@@ -1155,11 +1671,11 @@ def load_datasettype(conn, description):
         If any of the input parameters don't meet the expected types/values.
     """
     # Validate input parameters
+    assert on_conflict in ON_CONFLICT_MODES, "on_conflict must be None, 'skip' or 'update'"
     assert isinstance(description, str) and description, "Description must be a non-empty string"
     
-    # Create a cursor object and start a transaction
-    cursor = conn.cursor()
-    conn.autocommit = False  # Start transaction
+    # Create a cursor object and start a transaction (or a savepoint inside batch())
+    cursor = _begin(conn)
 
     # Create the parameters dictionary for dataset type insertion
     parameters = {
@@ -1169,17 +1685,23 @@ def load_datasettype(conn, description):
     # Load the dataset type into the database
     table_name = 'datasettypes'
     try:
-        row_id = load_table(cursor, table_name, parameters)
+        row_id, inserted = _load_entity(cursor, table_name, parameters, on_conflict)
     except Exception as e:
         print(f"Error loading dataset type: {e}")
-        conn.rollback()
+        _rollback(conn, cursor)
         cursor.close()
         return -1
 
+    if not inserted and on_conflict == 'skip':
+        print(f"Dataset type already exists with ID: {row_id}, skipped")
+        _commit(conn, cursor)
+        cursor.close()
+        return row_id
+
     print(f"Dataset type loaded with ID: {row_id}")
     
     # Commit the transaction if everything is successful
-    conn.commit()
+    _commit(conn, cursor)
     
     # Close the cursor
     cursor.close()
@@ -1187,7 +1709,7 @@ def load_datasettype(conn, description):
     return row_id
 
 
-def load_dataset(conn,datasettype_id, file_path, rows, patch_size, targets, reconstruction_shape, registration_ids, description=None, additional_metadata=None):
+def load_dataset(conn,datasettype_id, file_path, rows, patch_size, targets, reconstruction_shape, registration_ids, description=None, additional_metadata=None, on_conflict=None):
     """
     Load a dataset into the database, including its metadata and measurement relationships.
     
@@ -1211,6 +1733,11 @@ def load_dataset(conn,datasettype_id, file_path, rows, patch_size, targets, reco
         List of IDs of the registrations associated with this dataset.
     description : str, optional
         Dataset description.
+    on_conflict : str, optional
+        What to do if a dataset with the same file path already exists: None fails
+        and returns -1, 'skip' returns the ID of the existing dataset without
+        loading anything and 'update' overwrites it and replaces its loaded metadata
+        keys and relations.
         
     Returns:
     --------
@@ -1222,6 +1749,7 @@ def load_dataset(conn,datasettype_id, file_path, rows, patch_size, targets, reco
         If any of the input parameters don't meet the expected types/values.
     """
     # Validate input parameters
+    assert on_conflict in ON_CONFLICT_MODES, "on_conflict must be None, 'skip' or 'update'"
     assert isinstance(datasettype_id, int) and datasettype_id > 0, "Dataset type ID must be a positive integer"
     assert isinstance(file_path, str) and file_path, "File path must be a non-empty string"
     assert isinstance(rows, int) and rows > 0, "Rows must be a positive integer"
@@ -1242,9 +1770,8 @@ def load_dataset(conn,datasettype_id, file_path, rows, patch_size, targets, reco
     if description is not None:
         assert isinstance(description, str), "Description must be a string"
     
-    # Create a cursor object and start a transaction
-    cursor = conn.cursor()
-    conn.autocommit = False  # Start transaction
+    # Create a cursor object and start a transaction (or a savepoint inside batch())
+    cursor = _begin(conn)
     
     # Create the parameters dictionary for dataset insertion
     parameters = {
@@ -1259,13 +1786,19 @@ def load_dataset(conn,datasettype_id, file_path, rows, patch_size, targets, reco
     # Load the dataset into the database
     table_name = 'datasets'
     try:
-        row_id = load_table(cursor, table_name, parameters)
+        row_id, inserted = _load_entity(cursor, table_name, parameters, on_conflict)
     except Exception as e:
         print(f"Error loading dataset: {e}")
-        conn.rollback()
+        _rollback(conn, cursor)
         cursor.close()
         return -1
     
+    if not inserted and on_conflict == 'skip':
+        print(f"Dataset from '{file_path}' already exists with ID: {row_id}, skipped")
+        _commit(conn, cursor)
+        cursor.close()
+        return row_id
+
     print(f"Dataset from '{file_path}' loaded with ID: {row_id}")
     
     # Create the metadata parameters dictionary
@@ -1297,13 +1830,23 @@ def load_dataset(conn,datasettype_id, file_path, rows, patch_size, targets, reco
     
     metadata_table_name = 'dataset_metadata'
     
+    # On update, replace the loaded metadata keys and the relations of the existing dataset
+    if not inserted:
+        try:
+            _clear_existing(cursor, table_name, row_id, [attributes['key'] for attributes in metadata_parameters], ['dataset_registrations'])
+        except Exception as e:
+            print(f"Error replacing existing dataset metadata: {e}")
+            _rollback(conn, cursor)
+            cursor.close()
+            return -1
+
     # Insert each metadata entry
     for attributes in metadata_parameters:
         try:
             load_table(cursor, metadata_table_name, attributes)
         except Exception as e:
             print(f"Error loading dataset metadata: {e}")
-            conn.rollback()
+            _rollback(conn, cursor)
             cursor.close()
             return -1
 
@@ -1320,12 +1863,12 @@ def load_dataset(conn,datasettype_id, file_path, rows, patch_size, targets, reco
             load_table(cursor, relational_table_name, relational_parameters)
         except Exception as e:
             print(f"Error loading dataset-registration relationship: {e}")
-            conn.rollback()
+            _rollback(conn, cursor)
             cursor.close()
             return -1
     
     # Commit the transaction if everything is successful
-    conn.commit()
+    _commit(conn, cursor)
     
     # Close the cursor
     cursor.close()
@@ -1333,7 +1876,7 @@ def load_dataset(conn,datasettype_id, file_path, rows, patch_size, targets, reco
     return row_id
 
 
-def load_experiment(conn, folder_path, description, author, dataset_paths, additional_metadata=None):
+def load_experiment(conn, folder_path, description, author, dataset_paths, additional_metadata=None, on_conflict=None):
     """
     Load an experiment into the database, including its metadata.
     
@@ -1367,6 +1910,11 @@ def load_experiment(conn, folder_path, description, author, dataset_paths, addit
         Each dictionary should have 'key', 'value', and 'type' keys.
         Example: [{'key': 'start_date', 'value': '2025-01-15', 'type': 'date'}, 
                   {'key': 'funding_source', 'value': 'EU Grant', 'type': 'string'}]
+    on_conflict : str, optional
+        What to do if a experiment with the same folder path already exists: None
+        fails and returns -1, 'skip' returns the ID of the existing experiment
+        without loading anything and 'update' overwrites it and replaces its loaded
+        metadata keys and relations.
         
     Returns:
     --------
@@ -1379,6 +1927,7 @@ def load_experiment(conn, folder_path, description, author, dataset_paths, addit
         If any of the input parameters don't meet the expected types/values.
     """
     # Validate input parameters
+    assert on_conflict in ON_CONFLICT_MODES, "on_conflict must be None, 'skip' or 'update'"
     assert isinstance(folder_path, str) and folder_path, "Folder path must be a non-empty string"
     assert isinstance(description, str) and description, "Description must be a non-empty string"
     assert isinstance(author, str) and author, "Author must be a non-empty string"
@@ -1393,9 +1942,8 @@ def load_experiment(conn, folder_path, description, author, dataset_paths, addit
             assert isinstance(item, dict), "Each item in additional_metadata must be a dictionary"
             assert all(k in item for k in ['key', 'value', 'type']), "Each dictionary in additional_metadata must contain 'key', 'value', and 'type' keys"
 
-    # Create a cursor object and start a transaction
-    cursor = conn.cursor()
-    conn.autocommit = False  # Start transaction
+    # Create a cursor object and start a transaction (or a savepoint inside batch())
+    cursor = _begin(conn)
 
     # Create the parameters dictionary for experiment insertion
     parameters = {
@@ -1406,13 +1954,19 @@ def load_experiment(conn, folder_path, description, author, dataset_paths, addit
     # Load the experiment into the database
     table_name = 'experiments'
     try:
-        row_id = load_table(cursor, table_name, parameters)
+        row_id, inserted = _load_entity(cursor, table_name, parameters, on_conflict)
     except Exception as e:
         print(f"Error loading experiment: {e}")
-        conn.rollback()
+        _rollback(conn, cursor)
         cursor.close()
         return -1
 
+    if not inserted and on_conflict == 'skip':
+        print(f"Experiment at '{folder_path}' already exists with ID: {row_id}, skipped")
+        _commit(conn, cursor)
+        cursor.close()
+        return row_id
+
     print(f"Experiment at '{folder_path}' loaded with ID: {row_id}")
 
     # Create the metadata parameters dictionary with mandatory author
@@ -1434,29 +1988,35 @@ def load_experiment(conn, folder_path, description, author, dataset_paths, addit
 
     metadata_table_name = 'experiment_metadata'
 
+    # On update, replace the loaded metadata keys and the relations of the existing experiment
+    if not inserted:
+        try:
+            _clear_existing(cursor, table_name, row_id, [attributes['key'] for attributes in metadata_parameters], ['experiment_datasets'])
+        except Exception as e:
+            print(f"Error replacing existing experiment metadata: {e}")
+            _rollback(conn, cursor)
+            cursor.close()
+            return -1
+
     # Insert each metadata entry
     for attributes in metadata_parameters:
         try:
             load_table(cursor, metadata_table_name, attributes)
         except Exception as e:
             print(f"Error loading experiment metadata: {e}")
-            conn.rollback()
+            _rollback(conn, cursor)
             cursor.close()
             return -1
     
     # Insert dataset relationships into the experiment_datasets table
-    datasets_data = dbt.get_data_metadata('datasets')
-
     # Get the ids of the datasets in dataset_paths
-    datasets_data = datasets_data[datasets_data['file_path_dataset'].isin(dataset_paths)]
-
-    dataset_ids = datasets_data['id_dataset'].values.tolist()
+    dataset_ids = list(_lookup_ids(cursor, 'datasets', 'file_path', dataset_paths).values())
 
     relational_table_name = 'experiment_datasets'
 
     if len(dataset_ids) == 0:
         print("No datasets found for the provided dataset paths. Experiment will not be linked to any datasets.")
-        conn.rollback()
+        _rollback(conn, cursor)
         cursor.close()
         return -1
 
@@ -1468,12 +2028,12 @@ def load_experiment(conn, folder_path, description, author, dataset_paths, addit
             load_table(cursor, relational_table_name, relational_parameters)
         except Exception as e:
             print(f"Error loading experiment-dataset relationship: {e}")
-            conn.rollback()
+            _rollback(conn, cursor)
             cursor.close()
             return -1
     
     # Commit the transaction if everything is successful
-    conn.commit()
+    _commit(conn, cursor)
 
     # Close the cursor
     cursor.close()
@@ -1481,7 +2041,7 @@ def load_experiment(conn, folder_path, description, author, dataset_paths, addit
     return row_id
 
 
-def load_model(conn, experiment_folder_path, model_folder_path, architecture, description=None, parameters=None, trainable_parameters=None, computed_metrics=None, additional_metadata=None):
+def load_model(conn, experiment_folder_path, model_folder_path, architecture, description=None, parameters=None, trainable_parameters=None, computed_metrics=None, additional_metadata=None, on_conflict=None):
     """
     Load a model into the database, including its metadata.
     
@@ -1519,6 +2079,11 @@ def load_model(conn, experiment_folder_path, model_folder_path, architecture, de
         Each dictionary should have 'key', 'value', and 'type' keys.
         Example: [{'key': 'epochs', 'value': 100, 'type': 'integer'}, 
                   {'key': 'learning_rate', 'value': 0.001, 'type': 'float'}]
+    on_conflict : str, optional
+        What to do if a model with the same model folder path already exists: None
+        fails and returns -1, 'skip' returns the ID of the existing model without
+        loading anything and 'update' overwrites it and replaces its loaded metadata
+        keys.
         
     Returns:
     --------
@@ -1531,6 +2096,7 @@ def load_model(conn, experiment_folder_path, model_folder_path, architecture, de
         If any of the input parameters don't meet the expected types/values.
     """
     # Validate input parameters
+    assert on_conflict in ON_CONFLICT_MODES, "on_conflict must be None, 'skip' or 'update'"
     assert isinstance(experiment_folder_path, str) and experiment_folder_path, "Experiment folder path must be a non-empty string"
     assert isinstance(model_folder_path, str) and model_folder_path, "Model folder path must be a non-empty string"
     assert isinstance(architecture, str) and architecture, "Architecture must be a non-empty string"
@@ -1560,12 +2126,17 @@ def load_model(conn, experiment_folder_path, model_folder_path, architecture, de
             assert isinstance(item, dict), "Each item in additional_metadata must be a dictionary"
             assert all(k in item for k in ['key', 'value', 'type']), "Each dictionary in additional_metadata must contain 'key', 'value', and 'type' keys"
 
-    # Create a cursor object and start a transaction
-    cursor = conn.cursor()
-    conn.autocommit = False  # Start transaction
+    # Create a cursor object and start a transaction (or a savepoint inside batch())
+    cursor = _begin(conn)
 
     # Get the experiment_id from the experiment folder path
-    experiment_id = dbt.get_id('experiments', ['folder_path_experiment'], [experiment_folder_path])
+    experiment_ids = _lookup_ids(cursor, 'experiments', 'folder_path', [experiment_folder_path])
+    if experiment_folder_path not in experiment_ids:
+        print(f"Error: No experiment found with folder path: {experiment_folder_path}")
+        _rollback(conn, cursor)
+        cursor.close()
+        return -1
+    experiment_id = experiment_ids[experiment_folder_path]
 
     # Create the parameters dictionary for model insertion
     parameters_dict = {
@@ -1580,13 +2151,19 @@ def load_model(conn, experiment_folder_path, model_folder_path, architecture, de
     # Load the model into the database
     table_name = 'models'
     try:
-        row_id = load_table(cursor, table_name, parameters_dict)
+        row_id, inserted = _load_entity(cursor, table_name, parameters_dict, on_conflict)
     except Exception as e:
         print(f"Error loading model: {e}")
-        conn.rollback()
+        _rollback(conn, cursor)
         cursor.close()
         return -1
 
+    if not inserted and on_conflict == 'skip':
+        print(f"Model at '{model_folder_path}' already exists with ID: {row_id}, skipped")
+        _commit(conn, cursor)
+        cursor.close()
+        return row_id
+
     print(f"Model at '{model_folder_path}' loaded with ID: {row_id}")
 
     # Create the metadata parameters dictionary with mandatory architecture
@@ -1636,18 +2213,28 @@ def load_model(conn, experiment_folder_path, model_folder_path, architecture, de
 
     metadata_table_name = 'model_metadata'
 
+    # On update, replace the loaded metadata keys of the existing model
+    if not inserted:
+        try:
+            _clear_existing(cursor, table_name, row_id, [attributes['key'] for attributes in metadata_parameters])
+        except Exception as e:
+            print(f"Error replacing existing model metadata: {e}")
+            _rollback(conn, cursor)
+            cursor.close()
+            return -1
+
     # Insert each metadata entry
     for attributes in metadata_parameters:
         try:
             load_table(cursor, metadata_table_name, attributes)
         except Exception as e:
             print(f"Error loading model metadata: {e}")
-            conn.rollback()
+            _rollback(conn, cursor)
             cursor.close()
             return -1
     
     # Commit the transaction if everything is successful
-    conn.commit()
+    _commit(conn, cursor)
 
     # Close the cursor
     cursor.close()
@@ -0,0 +1,550 @@
+"""
+Manifest Loading Module
+
+This module bulk-loads samples and UT/XCT measurements from a CSV manifest,
+one entity per row. The columns are named after the parameters of the
+corresponding loader in dbtools.load (e.g. 'height', 'keyhole',
+'sample_names'), and the values are converted to the types the loader expects:
+
+- Numbers are parsed as int or float, booleans accept true/false, yes/no and 1/0.
+- List parameters (axes_order, sample_names) accept a JSON list or values
+  separated by ';'.
+- Foreign keys can be given by name instead of id: a 'panel' column is looked up
+  in panels and a 'measurementtype' column in measurementtypes.
+- Any other column becomes additional metadata. A header 'key:type' (e.g.
+  'porosity:float') sets the metadata type, which is 'string' otherwise.
+
+Empty cells are left out, so the loader defaults apply. The manifest is read as
+a stream and loaded in chunks: each chunk resolves its names with one query per
+referenced table and runs in one load.batch() transaction, so a failing row is
+rolled back on its own and every committed chunk survives an interruption
+(re-run with on_conflict='skip' to resume).
+
+Measurement manifests can instead be loaded all at once with
+load_measurements(): every row is validated against the manifest and the
+database before anything is inserted, the file properties left empty are read
+from the files in parallel, and the rows are loaded in a single transaction
+that is only committed if all of them load.
+
+Dependencies:
+    - dbtools.load: For the loaders and the batch transactions
+    - dbtools.fileinfo: For the file properties missing from measurement manifests
+"""
+
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import dbtools.fileinfo as fileinfo
+import dbtools.load as load
+
+# Rows loaded per transaction
+DEFAULT_CHUNK_SIZE = 1000
+
+# Measurement properties read from the file when the manifest leaves them empty
+FILE_PROPERTIES = ('height', 'width', 'depth', 'dtype', 'file_type')
+
+# Files read at the same time when extracting missing file properties
+DEFAULT_WORKERS = 8
+
+
+def _bool(value):
+    """Parse a boolean cell."""
+    lowered = value.strip().lower()
+    if lowered in ('true', 't', 'yes', 'y', '1'):
+        return True
+    if lowered in ('false', 'f', 'no', 'n', '0'):
+        return False
+    raise ValueError(f"'{value}' is not a boolean")
+
+
+def _list(value):
+    """Parse a list cell: a JSON list or values separated by ';'."""
+    value = value.strip()
+    if value.startswith('['):
+        return json.loads(value)
+    return [item.strip() for item in value.split(';') if item.strip()]
+
+
+def _number(value):
+    """Parse a number cell as an int if possible, else as a float."""
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+# Per manifest kind: the loader, the converters of its parameters and the
+# columns holding names of referenced rows: {column: (table, name column, parameter)}
+KINDS = {
+    'samples': {
+        'loader': 'load_sample',
+        'columns': {
+            'name': str, 'panel_id': int, 'height': _number, 'width': _number, 'thickness': _number,
+            'keyhole': _bool, 'parallel_faces': _bool, 'description': str,
+        },
+        'references': {'panel': ('panels', 'name', 'panel_id')},
+    },
+    'ut_measurements': {
+        'loader': 'load_ut_measurement',
+        'columns': {
+            'file_path': str, 'measurementtype_id': int, 'height': int, 'width': int, 'depth': int,
+            'dtype': str, 'file_type': str, 'signal_type': str, 'axes_order': _list, 'sample_names': _list,
+            'parent_measurement_path': str, 'transformations': str, 'verify_file': _bool,
+        },
+        'references': {'measurementtype': ('measurementtypes', 'name', 'measurementtype_id')},
+    },
+    'xct_measurements': {
+        'loader': 'load_xct_measurement',
+        'columns': {
+            'file_path': str, 'measurementtype_id': int, 'height': int, 'width': int, 'depth': int,
+            'dtype': str, 'file_type': str, 'sample_names': _list, 'aligned': _bool, 'equalized': _bool,
+            'axes_order': _list, 'parent_measurement_path': str, 'transformations': str, 'verify_file': _bool,
+        },
+        'references': {'measurementtype': ('measurementtypes', 'name', 'measurementtype_id')},
+    },
+}
+
+
+# Parameters a measurement row must provide, besides the FILE_PROPERTIES
+REQUIRED = {
+    'ut_measurements': ('file_path', 'measurementtype_id', 'signal_type', 'axes_order', 'sample_names'),
+    'xct_measurements': ('file_path', 'measurementtype_id', 'sample_names', 'aligned', 'equalized', 'axes_order'),
+}
+
+
+def parse_row(kind, row):
+    """
+    Convert a manifest row into loader arguments.
+
+    Parameters:
+    -----------
+    kind : str
+        Manifest kind: 'samples', 'ut_measurements' or 'xct_measurements'.
+    row : dict
+        The row, as read by csv.DictReader.
+
+    Returns:
+    --------
+    tuple
+        (arguments, references): the keyword arguments of the loader and the
+        names still to be resolved as {parameter: (table, name column, name)}.
+
+    Raises:
+    -------
+    ValueError
+        If a value cannot be converted.
+    """
+    spec = KINDS[kind]
+    arguments = {}
+    references = {}
+    additional_metadata = []
+
+    for column, value in row.items():
+        if column is None or value is None or not value.strip():
+            continue
+        column = column.strip()
+        value = value.strip()
+        if column in spec['columns']:
+            try:
+                arguments[column] = spec['columns'][column](value)
+            except ValueError as e:
+                raise ValueError(f"Invalid value for '{column}': {e}") from None
+        elif column in spec['references']:
+            table_name, name_column, parameter = spec['references'][column]
+            references[parameter] = (table_name, name_column, value)
+        else:
+            key, _, value_type = column.partition(':')
+            additional_metadata.append({'key': key, 'value': value, 'type': value_type or 'string'})
+
+    if additional_metadata:
+        arguments['additional_metadata'] = additional_metadata
+
+    return arguments, references
+
+
+def _chunks(rows, chunk_size):
+    """Group an iterable of rows into lists of chunk_size rows."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_load(conn, kind, lines, on_conflict=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Load a CSV manifest and yield the result of every row as soon as its chunk is committed.
+
+    Parameters:
+    -----------
+    conn : psycopg2.connection
+        Database connection object.
+    kind : str
+        Manifest kind: 'samples', 'ut_measurements' or 'xct_measurements'.
+    lines : iterable
+        The CSV text lines (e.g. an open file), starting with the header.
+    on_conflict : str, optional
+        Passed to the loader: None, 'skip' or 'update'.
+    chunk_size : int
+        Number of rows loaded per transaction.
+
+    Yields:
+    -------
+    dict
+        {'line': line number in the manifest, 'id': ID of the loaded entity or
+        None, 'error': error message or None}.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unsupported manifest kind '{kind}'. Use one of {list(KINDS)}")
+    assert on_conflict in load.ON_CONFLICT_MODES, "on_conflict must be None, 'skip' or 'update'"
+    assert isinstance(chunk_size, int) and chunk_size > 0, "chunk_size must be a positive integer"
+
+    loader = getattr(load, KINDS[kind]['loader'])
+    reader = csv.DictReader(lines)
+    # reader.line_num is the manifest line of the row just read
+    numbered = ((reader.line_num, row) for row in reader)
+
+    for chunk in _chunks(numbered, chunk_size):
+        parsed = []
+        for line, row in chunk:
+            try:
+                arguments, references = parse_row(kind, row)
+                parsed.append((line, arguments, references, None))
+            except ValueError as e:
+                parsed.append((line, None, None, str(e)))
+
+        results = []
+        with load.batch(conn):
+            # Resolve the names of the chunk with one query per referenced table
+            wanted = {}
+            for _, _, references, _ in parsed:
+                for table_name, name_column, name in (references or {}).values():
+                    wanted.setdefault((table_name, name_column), set()).add(name)
+            ids = {}
+            cursor = conn.cursor()
+            for (table_name, name_column), names in wanted.items():
+                ids[table_name] = load._lookup_ids(cursor, table_name, name_column, names)
+            cursor.close()
+
+            for line, arguments, references, error in parsed:
+                row_id = None
+                if error is None:
+                    missing = [name for table_name, _, name in references.values() if name not in ids[table_name]]
+                    if missing:
+                        error = f"Not found: {', '.join(missing)}"
+                if error is None:
+                    for parameter, (table_name, _, name) in references.items():
+                        arguments[parameter] = ids[table_name][name]
+                    try:
+                        row_id = loader(conn, **arguments, on_conflict=on_conflict)
+                    except (AssertionError, TypeError, ValueError) as e:
+                        error = str(e) or type(e).__name__
+                    else:
+                        if row_id == -1:
+                            row_id = None
+                            error = "Rejected by the loader"
+                results.append({'line': line, 'id': row_id, 'error': error})
+
+        yield from results
+
+
+def load_manifest(conn, kind, lines, on_conflict=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Load a CSV manifest and summarise the result.
+
+    Parameters:
+    -----------
+    conn : psycopg2.connection
+        Database connection object.
+    kind : str
+        Manifest kind: 'samples', 'ut_measurements' or 'xct_measurements'.
+    lines : iterable
+        The CSV text lines (e.g. an open file), starting with the header.
+    on_conflict : str, optional
+        Passed to the loader: None, 'skip' or 'update'.
+    chunk_size : int
+        Number of rows loaded per transaction.
+
+    Returns:
+    --------
+    dict
+        {'rows': number of rows, 'loaded': number of rows loaded (or skipped
+        as existing), 'failed': number of rows not loaded, 'errors': list of
+        {'line', 'error'} dicts of the failed rows}.
+    """
+    summary = {'rows': 0, 'loaded': 0, 'failed': 0, 'errors': []}
+    for result in iter_load(conn, kind, lines, on_conflict, chunk_size):
+        summary['rows'] += 1
+        if result['error'] is None:
+            summary['loaded'] += 1
+        else:
+            summary['failed'] += 1
+            summary['errors'].append({'line': result['line'], 'error': result['error']})
+    return summary
+
+
+class _Rollback(Exception):
+    """Raised inside the batch of load_measurements() to roll it back when a row fails."""
+
+
+def _check_row(kind, arguments, references):
+    """
+    Check a parsed measurement row on its own (the parameters given by name in
+    references are checked against the database instead).
+
+    Returns:
+    --------
+    list
+        Error messages, empty if the row is valid.
+    """
+    errors = []
+    missing = [name for name in REQUIRED[kind] if name not in arguments and name not in references]
+    if missing:
+        errors.append(f"Missing {', '.join(missing)}")
+    if 'signal_type' in arguments and arguments['signal_type'] not in ('RF', 'Amplitude'):
+        errors.append("signal_type must be 'RF' or 'Amplitude'")
+    if 'axes_order' in arguments and len(set(arguments['axes_order'])) != len(arguments['axes_order']):
+        errors.append("axes_order must contain unique values")
+    if 'parent_measurement_path' in arguments and 'transformations' not in arguments:
+        errors.append("transformations are required with a parent_measurement_path")
+    for name in ('height', 'width', 'depth'):
+        if name in arguments and (not isinstance(arguments[name], int) or arguments[name] <= 0):
+            errors.append(f"{name} must be a positive integer")
+    return errors
+
+
+def _parents_first(rows, paths):
+    """
+    Order rows so that measurements come after their parents of the same manifest.
+
+    Parameters:
+    -----------
+    rows : list
+        Row dictionaries with their 'arguments'.
+    paths : set
+        File paths of the measurements of the manifest.
+
+    Returns:
+    --------
+    tuple
+        (ordered rows, rows whose parents form a cycle).
+    """
+    ordered = []
+    placed = set()
+    remaining = rows
+    while remaining:
+        waiting = []
+        for row in remaining:
+            parent = row['arguments'].get('parent_measurement_path')
+            if parent is None or parent not in paths or parent in placed:
+                ordered.append(row)
+                placed.add(row['arguments']['file_path'])
+            else:
+                waiting.append(row)
+        if len(waiting) == len(remaining):
+            return ordered, waiting
+        remaining = waiting
+    return ordered, []
+
+
+def _extract(file_path, cache_path):
+    """Read the properties of a file for load_measurements(); return (properties, error)."""
+    try:
+        return fileinfo.cached_file_info(file_path, cache_path), None
+    except Exception as e:
+        return None, f"Cannot read the file properties: {e}"
+
+
+def load_measurements(conn, kind, lines, on_conflict=None, workers=DEFAULT_WORKERS, cache_path=None, progress=None):
+    """
+    Load a manifest of UT or XCT measurements in a single transaction.
+
+    All the rows are checked before anything is inserted: the values of each
+    row, file paths repeated in the manifest, and with one query per table the
+    measurement types, samples and parent measurements they reference and the
+    measurements that already exist. The file properties (height, width,
+    depth, dtype, file_type) left empty are read from the files, several
+    files at a time, through the file information cache. A parent measurement
+    may be another row of the manifest, which is then loaded first.
+
+    The rows are loaded only if every row is valid, and committed only if
+    every row loads: otherwise nothing is inserted and the report tells which
+    rows failed and why.
+
+    Parameters:
+    -----------
+    conn : psycopg2.connection
+        Database connection object.
+    kind : str
+        Manifest kind: 'ut_measurements' or 'xct_measurements'.
+    lines : iterable
+        The CSV text lines (e.g. an open file), starting with the header.
+    on_conflict : str, optional
+        Passed to the loader: None, 'skip' or 'update'. With None, rows whose
+        file path is already in the database are invalid.
+    workers : int
+        Number of files read at the same time.
+    cache_path : str, optional
+        Path to the file information cache. Defaults to fileinfo.DEFAULT_CACHE_PATH.
+    progress : callable, optional
+        Called as progress(fraction, message) as the steps advance, e.g. the
+        update() method of a background job.
+
+    Returns:
+    --------
+    dict
+        {'rows': number of rows, 'loaded': number of rows loaded (or skipped
+        as existing), 'failed': number of invalid or rejected rows,
+        'committed': whether the transaction was committed, 'results': list of
+        {'line', 'file_path', 'id', 'status', 'error', 'extracted'} dicts in
+        manifest order}. The status of a row is 'loaded', 'invalid' (rejected
+        by the checks or the loader) or 'not loaded' (valid, but another row
+        failed); 'extracted' lists the properties read from the file.
+    """
+    if kind not in REQUIRED:
+        raise ValueError(f"Unsupported measurement manifest kind '{kind}'. Use one of {list(REQUIRED)}")
+    assert on_conflict in load.ON_CONFLICT_MODES, "on_conflict must be None, 'skip' or 'update'"
+    assert isinstance(workers, int) and workers > 0, "workers must be a positive integer"
+
+    def report(fraction, message):
+        if progress is not None:
+            progress(fraction, message)
+
+    # Parse and check every row on its own
+    report(0.0, 'Checking the manifest')
+    reader = csv.DictReader(lines)
+    rows = []
+    for row in reader:
+        result = {'line': reader.line_num, 'file_path': (row.get('file_path') or '').strip() or None,
+                  'id': None, 'status': 'invalid', 'error': None, 'extracted': []}
+        try:
+            arguments, references = parse_row(kind, row)
+        except ValueError as e:
+            arguments, references, errors = {}, {}, [str(e)]
+        else:
+            errors = []
+        rows.append({'result': result, 'arguments': arguments, 'references': references, 'errors': errors,
+                     'parsed': not errors})
+
+    paths = {}
+    for row in rows:
+        file_path = row['arguments'].get('file_path')
+        if file_path is not None:
+            paths.setdefault(file_path, []).append(row['result']['line'])
+
+    # Check the references of all the rows with one query per table
+    names = {}
+    for row in rows:
+        for table_name, name_column, name in row['references'].values():
+            names.setdefault((table_name, name_column), set()).add(name)
+    sample_names = {name for row in rows for name in row['arguments'].get('sample_names', [])}
+    parents = {row['arguments']['parent_measurement_path'] for row in rows
+               if 'parent_measurement_path' in row['arguments']} - set(paths)
+
+    cursor = conn.cursor()
+    try:
+        ids = {key: load._lookup_ids(cursor, key[0], key[1], values) for key, values in names.items()}
+        samples = load._lookup_ids(cursor, 'samples', 'name', sample_names) if sample_names else {}
+        existing = load._lookup_ids(cursor, 'measurements', 'file_path', set(paths) | parents) if paths else {}
+    finally:
+        cursor.close()
+        # End the read transaction, so the batch below can start its own
+        conn.rollback()
+
+    for row in rows:
+        arguments, errors = row['arguments'], row['errors']
+        if not row['parsed']:
+            continue
+        for parameter, (table_name, name_column, name) in row['references'].items():
+            if name in ids[(table_name, name_column)]:
+                arguments[parameter] = ids[(table_name, name_column)][name]
+            else:
+                errors.append(f"Unknown {table_name[:-1]}: {name}")
+        errors.extend(_check_row(kind, arguments, row['references']))
+        unknown = [name for name in arguments.get('sample_names', []) if name not in samples]
+        if unknown:
+            errors.append(f"Unknown samples: {', '.join(unknown)}")
+        file_path = arguments.get('file_path')
+        if file_path is not None and len(paths[file_path]) > 1:
+            errors.append(f"file_path repeated on lines {', '.join(str(line) for line in paths[file_path])}")
+        if on_conflict is None and file_path in existing:
+            errors.append(f"Measurement already exists with ID: {existing[file_path]}")
+        parent = arguments.get('parent_measurement_path')
+        if parent is not None and parent not in paths and parent not in existing:
+            errors.append(f"Unknown parent measurement: {parent}")
+
+    # Read the missing file properties of the valid rows, several files at a time
+    pending = [row for row in rows if not row['errors']
+               and any(name not in row['arguments'] for name in FILE_PROPERTIES)]
+    if pending:
+        report(0.1, f'Reading the properties of {len(pending)} files')
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_extract, row['arguments']['file_path'], cache_path) for row in pending]
+            for done, (row, future) in enumerate(zip(pending, futures), start=1):
+                properties, error = future.result()
+                if error is not None:
+                    row['errors'].append(error)
+                else:
+                    for name in FILE_PROPERTIES:
+                        if name not in row['arguments']:
+                            row['arguments'][name] = properties[name]
+                            row['result']['extracted'].append(name)
+                report(0.1 + 0.5 * done / len(pending), f'Read the properties of {done} of {len(pending)} files')
+
+    # Rows whose parent is invalid cannot be loaded either
+    valid = [row for row in rows if not row['errors']]
+    ordered, cycles = _parents_first(valid, {row['arguments']['file_path'] for row in valid})
+    for row in cycles:
+        row['errors'].append("Circular parent measurements")
+    invalid = {row['arguments'].get('file_path') for row in rows if row['errors']}
+    for row in ordered:
+        parent = row['arguments'].get('parent_measurement_path')
+        if parent in invalid:
+            row['errors'].append(f"Parent measurement is invalid: {parent}")
+            invalid.add(row['arguments']['file_path'])
+    ordered = [row for row in ordered if not row['errors']]
+
+    for row in rows:
+        if row['errors']:
+            row['result']['error'] = '; '.join(row['errors'])
+        else:
+            row['result']['status'] = 'not loaded'
+
+    # Load everything in one transaction, rolled back if any row fails
+    committed = False
+    if len(ordered) == len(rows) and rows:
+        loader = getattr(load, KINDS[kind]['loader'])
+        try:
+            with load.batch(conn):
+                for done, row in enumerate(ordered, start=1):
+                    result = row['result']
+                    try:
+                        row_id = loader(conn, **row['arguments'], on_conflict=on_conflict)
+                    except (AssertionError, TypeError, ValueError) as e:
+                        row_id, result['error'] = -1, str(e) or type(e).__name__
+                    if row_id == -1:
+                        result['error'] = result['error'] or "Rejected by the loader"
+                        result['status'] = 'invalid'
+                        raise _Rollback()
+                    result['id'] = row_id
+                    report(0.6 + 0.4 * done / len(ordered), f'Loaded {done} of {len(ordered)} measurements')
+        except _Rollback:
+            pass
+        else:
+            committed = True
+            for row in ordered:
+                row['result']['status'] = 'loaded'
+
+    if not committed:
+        for row in rows:
+            row['result']['id'] = None
+
+    results = [row['result'] for row in rows]
+    loaded = sum(1 for result in results if result['status'] == 'loaded')
+    failed = sum(1 for result in results if result['status'] == 'invalid')
+    report(1.0, 'Committed' if committed else 'Nothing loaded')
+    return {'rows': len(results), 'loaded': loaded, 'failed': failed, 'committed': committed, 'results': results}
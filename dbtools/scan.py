@@ -0,0 +1,375 @@
+"""
+Measurement Scanning Module
+
+This module registers whole UT/XCT scanning campaigns at once. It walks a
+directory tree, matches files and folders of TIFF slices to samples through
+configurable naming rules, extracts their properties from the file headers in
+a process pool and registers all the measurements, their metadata and their
+sample_measurements links in a single batched transaction.
+
+A naming rule is a dictionary describing one kind of measurement:
+
+    {
+        'pattern': r'(?P<sample>S\\d+)_UT\\.tif$',   # regex searched in the relative path
+        'kind': 'ut',                              # 'ut' or 'xct'
+        'measurementtype_id': 1,
+        'axes_order': ['z', 'y', 'x'],
+        'signal_type': 'Amplitude',                # UT only
+        'aligned': False, 'equalized': False,      # XCT only
+        'sample_separator': '+',                   # optional, splits the sample group
+        'additional_metadata': [...]               # optional, as in the load_* functions
+    }
+
+The pattern must define a named group 'sample'. Paths are matched relative to
+the scanned root using '/' as separator, and the first matching rule wins.
+
+Dependencies:
+    - dbtools: Custom database utility module
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from psycopg2.extras import execute_values
+
+import dbtools.fileinfo as fileinfo
+import dbtools.load as load
+
+# Keys every naming rule must define, per measurement kind
+_RULE_KEYS = {
+    'ut': ['pattern', 'measurementtype_id', 'axes_order', 'signal_type'],
+    'xct': ['pattern', 'measurementtype_id', 'axes_order', 'aligned', 'equalized'],
+}
+
+
+def _validate_rules(rules):
+    """
+    Validate the naming rules and compile their patterns.
+
+    Parameters:
+    -----------
+    rules : list
+        List of naming rule dictionaries.
+
+    Returns:
+    --------
+    list
+        List of (compiled pattern, rule) tuples.
+
+    Raises:
+    -------
+    AssertionError
+        If a rule is missing required keys or has an invalid pattern.
+    """
+    assert isinstance(rules, list) and len(rules) > 0, "rules must be a non-empty list"
+
+    compiled = []
+    for i, rule in enumerate(rules):
+        assert isinstance(rule, dict), f"Rule {i} must be a dictionary"
+        kind = rule.get('kind')
+        assert kind in _RULE_KEYS, f"Rule {i}: kind must be 'ut' or 'xct'"
+        missing = [k for k in _RULE_KEYS[kind] if k not in rule]
+        assert not missing, f"Rule {i}: missing keys {missing}"
+        pattern = re.compile(rule['pattern'])
+        assert 'sample' in pattern.groupindex, f"Rule {i}: pattern must define a named group 'sample'"
+        compiled.append((pattern, rule))
+    return compiled
+
+
+def _match(relative_path, compiled_rules):
+    """
+    Find the first rule matching a path and the sample names it encodes.
+
+    Parameters:
+    -----------
+    relative_path : str
+        Path relative to the scanned root, with '/' separators.
+    compiled_rules : list
+        List of (compiled pattern, rule) tuples.
+
+    Returns:
+    --------
+    tuple
+        (rule, sample names) or (None, None) if no rule matches.
+    """
+    for pattern, rule in compiled_rules:
+        match = pattern.search(relative_path)
+        if match:
+            sample = match.group('sample')
+            separator = rule.get('sample_separator')
+            sample_names = sample.split(separator) if separator else [sample]
+            return rule, list(dict.fromkeys(sample_names))
+    return None, None
+
+
+def find_candidates(root, rules):
+    """
+    Walk a directory tree and collect the paths matching the naming rules.
+
+    Files with a TIFF or raw extension and folders are candidates. A matching
+    folder is treated as a folder of TIFF slices and not descended into.
+
+    Parameters:
+    -----------
+    root : str
+        Root directory of the campaign.
+    rules : list
+        List of naming rule dictionaries.
+
+    Returns:
+    --------
+    tuple
+        (candidates, unmatched) where candidates is a list of dictionaries with
+        'file_path', 'rule' and 'sample_names', and unmatched is the number of
+        measurement-like files that matched no rule.
+    """
+    compiled_rules = _validate_rules(rules)
+    extensions = fileinfo.TIFF_EXTENSIONS + ('.raw',)
+
+    candidates = []
+    unmatched = 0
+    for directory, subdirectories, files in os.walk(root):
+        relative_directory = os.path.relpath(directory, root).replace(os.sep, '/')
+        prefix = '' if relative_directory == '.' else relative_directory + '/'
+
+        # Folders of slices matching a rule are measurements themselves
+        for name in list(subdirectories):
+            rule, sample_names = _match(prefix + name, compiled_rules)
+            if rule is not None:
+                candidates.append({'file_path': os.path.join(directory, name), 'rule': rule, 'sample_names': sample_names})
+                subdirectories.remove(name)
+
+        for name in files:
+            if not name.lower().endswith(extensions):
+                continue
+            rule, sample_names = _match(prefix + name, compiled_rules)
+            if rule is None:
+                unmatched += 1
+                continue
+            candidates.append({'file_path': os.path.join(directory, name), 'rule': rule, 'sample_names': sample_names})
+
+    return candidates, unmatched
+
+
+def _extract(task):
+    """
+    Extract the properties of one file in a worker process.
+
+    Parameters:
+    -----------
+    task : tuple
+        (file_path, cache_path) where cache_path may be None to skip the cache.
+
+    Returns:
+    --------
+    tuple
+        (file_path, properties dictionary or None, error message or None).
+    """
+    file_path, cache_path = task
+    try:
+        if cache_path is None:
+            return file_path, fileinfo.read_file_info(file_path), None
+        return file_path, fileinfo.cached_file_info(file_path, cache_path), None
+    except Exception as e:
+        return file_path, None, str(e)
+
+
+def extract_properties(file_paths, workers=None, cache_path=fileinfo.DEFAULT_CACHE_PATH):
+    """
+    Extract the header properties of many files in a process pool.
+
+    Parameters:
+    -----------
+    file_paths : list
+        List of file or folder paths.
+    workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+    cache_path : str, optional
+        Path to the persistent file information cache, or None to always read
+        the headers.
+
+    Returns:
+    --------
+    dict
+        Dictionary mapping each path to a (properties, error) tuple.
+    """
+    tasks = [(file_path, cache_path) for file_path in file_paths]
+    if not tasks:
+        return {}
+
+    chunksize = max(1, len(tasks) // ((workers or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_extract, tasks, chunksize=chunksize)
+        return {file_path: (properties, error) for file_path, properties, error in results}
+
+
+def _metadata_items(candidate):
+    """Build the metadata entries of a scanned measurement from its rule and properties."""
+    rule = candidate['rule']
+    properties = candidate['properties']
+    if rule['kind'] == 'ut':
+        items = load.ut_measurement_metadata(
+            properties['height'], properties['width'], properties['depth'], properties['dtype'],
+            properties['file_type'], rule['signal_type'], rule['axes_order'])
+    else:
+        items = load.xct_measurement_metadata(
+            properties['height'], properties['width'], properties['depth'], properties['dtype'],
+            properties['file_type'], rule['aligned'], rule['equalized'], rule['axes_order'])
+
+    for item in rule.get('additional_metadata') or []:
+        item_type = 'bool' if item['type'] in ['Bool', 'Boolean', 'boolean'] else item['type']
+        items.append({'key': item['key'], 'value': item['value'], 'type': item_type})
+    return items
+
+
+def scan_measurements(conn, root, rules, dry_run=True, workers=None, cache_path=fileinfo.DEFAULT_CACHE_PATH):
+    """
+    Scan a directory tree and register its measurements in one transaction.
+
+    Every candidate is classified as 'new' (will be registered), 'existing'
+    (its file path is already in the measurements table), 'unknown_samples'
+    (some of its sample names are not in the samples table) or 'error' (its
+    properties could not be extracted). With dry_run=True nothing is written
+    and the report is the diff that would be applied.
+
+    Parameters:
+    -----------
+    conn : psycopg2.connection
+        Database connection object.
+    root : str
+        Root directory of the campaign.
+    rules : list
+        List of naming rule dictionaries (see the module documentation).
+    dry_run : bool, optional
+        If True (default), only report what would be registered.
+    workers : int, optional
+        Number of worker processes for the header extraction.
+    cache_path : str, optional
+        Path to the persistent file information cache, or None to always read
+        the headers.
+
+    Returns:
+    --------
+    dict
+        Report with the 'new', 'existing', 'unknown_samples' and 'error' lists of
+        candidates, the 'unmatched' file count, 'registered' (number of
+        measurements inserted, 0 on dry runs or errors) and the throughput
+        figures 'files', 'seconds' and 'files_per_second'.
+    """
+    assert os.path.isdir(root), f"Root must be an existing directory: {root}"
+
+    start = time.perf_counter()
+
+    # Find the candidates and extract their properties in parallel
+    candidates, unmatched = find_candidates(root, rules)
+    results = extract_properties([c['file_path'] for c in candidates], workers, cache_path)
+    extraction_seconds = time.perf_counter() - start
+
+    # Resolve existing measurements and sample ids in two queries
+    cursor = conn.cursor()
+    cursor.execute("SELECT file_path FROM measurements WHERE file_path = ANY(%s)",
+                   ([c['file_path'] for c in candidates],))
+    existing_paths = {row[0] for row in cursor.fetchall()}
+
+    all_sample_names = sorted({name for c in candidates for name in c['sample_names']})
+    cursor.execute("SELECT name, id FROM samples WHERE name = ANY(%s)", (all_sample_names,))
+    sample_ids = dict(cursor.fetchall())
+
+    report = {'new': [], 'existing': [], 'unknown_samples': [], 'error': []}
+    for candidate in candidates:
+        properties, error = results[candidate['file_path']]
+        candidate['properties'] = properties
+        if error is not None:
+            candidate['error'] = error
+            report['error'].append(candidate)
+        elif candidate['file_path'] in existing_paths:
+            report['existing'].append(candidate)
+        elif any(name not in sample_ids for name in candidate['sample_names']):
+            report['unknown_samples'].append(candidate)
+        else:
+            report['new'].append(candidate)
+
+    report['unmatched'] = unmatched
+    report['registered'] = 0
+
+    if not dry_run and report['new']:
+        report['registered'] = _register(conn, cursor, report['new'], sample_ids)
+    cursor.close()
+
+    seconds = time.perf_counter() - start
+    report['files'] = len(candidates)
+    report['seconds'] = seconds
+    report['files_per_second'] = len(candidates) / extraction_seconds if extraction_seconds > 0 else 0.0
+
+    print(f"Scanned {len(candidates)} measurements in {seconds:.2f} s "
+          f"({report['files_per_second']:.1f} files/s): "
+          f"{len(report['new'])} new, {len(report['existing'])} existing, "
+          f"{len(report['unknown_samples'])} with unknown samples, {len(report['error'])} unreadable, "
+          f"{unmatched} unmatched files")
+    if dry_run:
+        for candidate in report['new']:
+            properties = candidate['properties']
+            print(f"  + {candidate['file_path']} [{candidate['rule']['kind']}] "
+                  f"{properties['height']}x{properties['width']}x{properties['depth']} {properties['dtype']} "
+                  f"-> {', '.join(candidate['sample_names'])}")
+    else:
+        print(f"Registered {report['registered']} measurements")
+
+    return report
+
+
+def _register(conn, cursor, candidates, sample_ids):
+    """
+    Insert the measurements, metadata and sample links of the candidates in one transaction.
+
+    Parameters:
+    -----------
+    conn : psycopg2.connection
+        Database connection object.
+    cursor : psycopg2.cursor
+        An active database cursor object.
+    candidates : list
+        List of new candidates with extracted properties.
+    sample_ids : dict
+        Dictionary mapping sample names to ids.
+
+    Returns:
+    --------
+    int
+        Number of measurements registered, or 0 if the transaction was rolled back.
+    """
+    conn.autocommit = False  # Start transaction
+    try:
+        # Insert all the measurements and match their ids to the candidates by file path
+        rows = execute_values(
+            cursor,
+            "INSERT INTO measurements (file_path, measurementtype_id) VALUES %s RETURNING id, file_path",
+            [(c['file_path'], c['rule']['measurementtype_id']) for c in candidates],
+            fetch=True)
+        measurement_ids = {file_path: measurement_id for measurement_id, file_path in rows}
+
+        metadata_rows = []
+        link_rows = []
+        for candidate in candidates:
+            measurement_id = measurement_ids[candidate['file_path']]
+            for item in _metadata_items(candidate):
+                metadata_rows.append((measurement_id, item['key'], item['value'], item['type']))
+            for name in candidate['sample_names']:
+                link_rows.append((sample_ids[name], measurement_id))
+
+        execute_values(cursor,
+                       "INSERT INTO measurement_metadata (measurement_id, key, value, type) VALUES %s",
+                       metadata_rows, page_size=1000)
+        execute_values(cursor,
+                       "INSERT INTO sample_measurements (sample_id, measurement_id) VALUES %s",
+                       link_rows, page_size=1000)
+    except Exception as e:
+        print(f"Error registering scanned measurements: {e}")
+        conn.rollback()
+        return 0
+
+    # Commit the transaction if everything is successful
+    conn.commit()
+    return len(measurement_ids)
@@ -0,0 +1,345 @@
+"""
+Slow Query Log Module
+
+This module writes the queries of dbtools that take longer than a threshold to
+a rotating local log, one JSON object per line, and reads the log back as a
+DataFrame. It is built on the hooks of dbtools.instrument, so it sees every
+query run on connections opened with dbtools.connect().
+
+Each entry records the time, the calling dbtools function, the SQL statement,
+its parameters (redacted by default), the rows returned or affected and the
+duration of the query. A sample of the slow read-only statements (SELECT,
+WITH queries without INSERT, UPDATE or DELETE, and the query of a
+COPY (...) TO STDOUT) can be run again with EXPLAIN (ANALYZE, BUFFERS) on a
+separate connection: the plan is then added to the entry together with a
+timing breakdown into planning, execution on the server and transfer of the
+rows to the client.
+
+The log is disabled until enable() is called:
+
+    import dbtools.slowlog as slowlog
+
+    slowlog.enable('slow_queries.log', threshold=0.5, explain_sample=0.1)
+    ...
+    slow = slowlog.read_log('slow_queries.log', min_seconds=1)
+
+Dependencies:
+    - pandas: For reading the log back
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import random
+import re
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+import dbtools as dbt
+import dbtools.instrument as instrument
+
+DEFAULT_PATH = 'dbtools_slow_queries.log'
+
+# Queries longer than this many characters are truncated in the log
+MAX_QUERY_LENGTH = 10000
+
+# Statements that EXPLAIN ANALYZE can run again without side effects
+_EXPLAINABLE = ('SELECT', 'WITH')
+
+# Data-modifying statements, which make a WITH query unsafe to run again
+_MODIFYING = re.compile(rb'\b(INSERT|UPDATE|DELETE|MERGE)\b', re.IGNORECASE)
+
+# Start of a COPY of a query result: COPY (
+_COPY_QUERY = re.compile(rb'\s*COPY\s*\(', re.IGNORECASE)
+
+# Single-quoted SQL literals, replaced by '?' when redacting
+_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+_logger = logging.getLogger(__name__)
+_logger.propagate = False
+_settings = {}
+
+
+def _redact_value(value):
+    """Replace a parameter value by a placeholder with its type (and length for sequences)."""
+    if value is None:
+        return None
+    if isinstance(value, (str, bytes, list, tuple)):
+        return f"<{type(value).__name__} len={len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact(params):
+    """
+    Redact query parameters so that no values are written to the log.
+
+    Parameters:
+    -----------
+    params : tuple, list, dict or None
+        The parameters passed to cursor.execute(). For executemany() this is
+        the list of parameter tuples, which is summarised by its length.
+
+    Returns:
+    --------
+    list, dict, str or None
+        The parameters with every value replaced by a placeholder.
+    """
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: _redact_value(value) for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [_redact_value(value) for value in params]
+    # Iterators of parameter tuples passed to executemany()
+    return f"<{type(params).__name__}>"
+
+
+def _statement_text(record, redacted):
+    """SQL text of a record: the statement as passed, with literals removed if redacted."""
+    statement = record['statement']
+    if isinstance(statement, bytes):
+        text = statement.decode('utf-8', 'replace')
+    elif isinstance(statement, str):
+        text = statement
+    else:
+        # psycopg2.sql.Composed statements are rendered with the connection
+        try:
+            text = statement.as_string(record['connection'])
+        except Exception:
+            text = record['query'].decode('utf-8', 'replace')
+    if redacted:
+        # execute_values() and friends inline their values into the statement
+        text = _LITERAL.sub('?', text)
+    return text[:MAX_QUERY_LENGTH]
+
+
+def _copy_query(query):
+    """The query inside the parentheses of a COPY (...) TO statement, or None."""
+    match = _COPY_QUERY.match(query)
+    if match is None:
+        return None
+    depth = 1
+    quote = None
+    for i in range(match.end(), len(query)):
+        char = query[i:i + 1]
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in (b"'", b'"'):
+            quote = char
+        elif char == b'(':
+            depth += 1
+        elif char == b')':
+            depth -= 1
+            if depth == 0:
+                return query[match.end():i]
+    return None
+
+
+def explainable(query):
+    """
+    The statement EXPLAIN ANALYZE can run again for a query without side effects.
+
+    Parameters:
+    -----------
+    query : bytes
+        The SQL sent, with the parameters bound.
+
+    Returns:
+    --------
+    bytes or None
+        The query itself for SELECT and for WITH queries without INSERT,
+        UPDATE, DELETE or MERGE, the inner query of a COPY (...) TO STDOUT,
+        or None for any other statement.
+    """
+    inner = _copy_query(query)
+    if inner is not None:
+        query = inner
+    words = query.split(None, 1)
+    kind = words[0].decode('ascii', 'replace').upper() if words else ''
+    if kind not in _EXPLAINABLE:
+        return None
+    if kind == 'WITH' and _MODIFYING.search(query):
+        return None
+    return query.strip()
+
+
+def _explain(query, timeout):
+    """
+    Run EXPLAIN (ANALYZE, BUFFERS) on a query over a separate connection.
+
+    Returns:
+    --------
+    dict
+        The JSON plan of the query, or {'error': message} if it could not be explained.
+    """
+    conn = None
+    try:
+        conn = dbt.connect()
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute("SET statement_timeout = %s", (int(timeout * 1000),))
+        cursor.execute(b"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query)
+        plan = cursor.fetchone()[0]
+        cursor.close()
+        return plan[0] if isinstance(plan, list) else plan
+    except Exception as e:
+        return {'error': str(e)}
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def _breakdown(seconds, plan):
+    """Split the duration of a query into planning, server execution and transfer, from its plan."""
+    breakdown = {'total_seconds': seconds}
+    if 'Execution Time' in plan:
+        planning = plan.get('Planning Time', 0.0) / 1000
+        execution = plan['Execution Time'] / 1000
+        breakdown.update(planning_seconds=planning, execution_seconds=execution,
+                         transfer_seconds=max(seconds - planning - execution, 0.0))
+    return breakdown
+
+
+def _write(entry, query=None, timeout=None):
+    """Complete an entry with its plan if a query to explain is given, then write it."""
+    if query is not None:
+        entry['plan'] = _explain(query, timeout)
+        entry['breakdown'] = _breakdown(entry['seconds'], entry['plan'])
+    _logger.info(json.dumps(entry, default=str))
+
+
+def _hook(record):
+    """instrument hook writing the slow queries to the log."""
+    if record['seconds'] < _settings['threshold'] or record['caller'].startswith(__name__):
+        return
+
+    redacted = _settings['redact']
+    entry = {
+        'time': datetime.now().isoformat(timespec='milliseconds'),
+        'caller': record['caller'],
+        'kind': record['kind'],
+        'query': _statement_text(record, redacted),
+        'params': redact(record['params']) if redacted else record['params'],
+        'rows': record['rows'],
+        'seconds': record['seconds'],
+        'bytes_sent': record['bytes_sent'],
+        'bytes_received': record['bytes_received'],
+        'error': None if record['error'] is None else str(record['error']),
+        'breakdown': {'total_seconds': record['seconds']},
+    }
+
+    query = explainable(record['query']) if record['error'] is None else None
+    if query is not None and random.random() < _settings['explain_sample']:
+        # EXPLAIN ANALYZE runs the query again: do it off the calling thread
+        threading.Thread(target=_write, args=(entry, query, _settings['explain_timeout']),
+                         daemon=True).start()
+    else:
+        _write(entry)
+
+
+def enable(path=DEFAULT_PATH, threshold=0.5, explain_sample=0.0, explain_timeout=60,
+           redact_params=True, max_bytes=10 * 2 ** 20, backup_count=5):
+    """
+    Start writing the slow queries to a rotating log file.
+
+    Parameters:
+    -----------
+    path : str
+        Path of the log file.
+    threshold : float
+        Queries taking at least this many seconds are logged.
+    explain_sample : float
+        Fraction (0 to 1) of the slow read-only statements run again with
+        EXPLAIN (ANALYZE, BUFFERS) to capture their plan (see explainable()).
+        Other statements are never explained, since ANALYZE executes them.
+    explain_timeout : float
+        Statement timeout of the EXPLAIN queries, in seconds.
+    redact_params : bool
+        If True, parameter values and the string literals of the statements
+        are replaced by placeholders. The captured plans may still show values
+        used in filter conditions.
+    max_bytes : int
+        Size at which the log file is rotated.
+    backup_count : int
+        Number of rotated files kept (path.1 to path.N).
+    """
+    assert threshold >= 0, "threshold must not be negative"
+    assert 0 <= explain_sample <= 1, "explain_sample must be between 0 and 1"
+
+    disable()
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    _logger.addHandler(handler)
+    _logger.setLevel(logging.INFO)
+
+    _settings.update(path=path, threshold=threshold, explain_sample=explain_sample,
+                     explain_timeout=explain_timeout, redact=redact_params)
+    instrument.add_hook(_hook)
+
+
+def disable():
+    """Stop writing the slow query log."""
+    instrument.remove_hook(_hook)
+    for handler in list(_logger.handlers):
+        _logger.removeHandler(handler)
+        handler.close()
+    _settings.clear()
+
+
+def read_log(path=DEFAULT_PATH, since=None, caller=None, min_seconds=None):
+    """
+    Read the slow query log, including its rotated files.
+
+    Parameters:
+    -----------
+    path : str
+        Path of the log file.
+    since : str or datetime, optional
+        Only return the entries logged at or after this time.
+    caller : str, optional
+        Only return the entries of calling functions containing this string
+        (e.g. 'get_data_metadata').
+    min_seconds : float, optional
+        Only return the queries that took at least this many seconds.
+
+    Returns:
+    --------
+    pd.DataFrame
+        One row per entry, oldest first, with the columns time, caller, kind,
+        query, params, rows, seconds, bytes_sent, bytes_received, error and
+        breakdown, plus plan for the explained queries.
+    """
+    # Rotated files hold older entries: path.N is the oldest
+    paths = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        paths.insert(0, f"{path}.{index}")
+        index += 1
+    if os.path.exists(path):
+        paths.append(path)
+
+    entries = []
+    for file_path in paths:
+        with open(file_path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entries.append(json.loads(line))
+
+    log = pd.DataFrame(entries)
+    if log.empty:
+        return log
+
+    log['time'] = pd.to_datetime(log['time'])
+    if since is not None:
+        log = log[log['time'] >= pd.Timestamp(since)]
+    if caller is not None:
+        log = log[log['caller'].str.contains(caller, regex=False)]
+    if min_seconds is not None:
+        log = log[log['seconds'] >= min_seconds]
+
+    return log.sort_values('time').reset_index(drop=True)
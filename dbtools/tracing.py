@@ -0,0 +1,310 @@
+"""
+Request Tracing Module
+
+This module records where the time of a request or a script goes as a tree of
+spans: a root span (e.g. one web request) contains the spans of the dbtools
+functions it calls, which contain the spans of their database queries. Finished
+traces are appended to a local file, one JSON span per line, and can be read
+back with read_traces().
+
+Tracing is disabled by default. While disabled, span() returns a shared no-op
+context manager and the functions decorated with traced() are called directly
+after a single flag check, so the instrumentation costs next to nothing.
+
+    import dbtools.tracing as tracing
+
+    tracing.enable('traces.jsonl')
+    with tracing.span('report'):
+        data = dbt.get_data_metadata('samples')
+
+The current span is kept in a context variable, so concurrent threads (e.g. the
+threads of the web server) build separate traces.
+
+Every dbtools.dbtools function is decorated with traced(), so this module only
+imports the standard library at import time.
+
+Dependencies:
+    - pandas: For reading the traces back
+"""
+
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import re
+import threading
+import time
+
+DEFAULT_PATH = 'dbtools_traces.jsonl'
+
+_enabled = False
+_path = None
+_write_lock = threading.Lock()
+_current = contextvars.ContextVar('dbtools_span', default=None)
+_NOOP = contextlib.nullcontext()
+
+
+class Span:
+    """
+    A timed operation within a trace.
+
+    Attributes:
+    -----------
+    name : str
+        Name of the operation (e.g. 'get_data_metadata').
+    trace_id : str
+        Identifier shared by all the spans of a trace.
+    span_id : str
+        Identifier of the span.
+    parent : Span or None
+        The enclosing span, None for the root span of a trace.
+    start : float
+        Start time (seconds since the epoch).
+    duration : float or None
+        Duration in seconds, None while the span is open.
+    attributes : dict
+        Additional information about the operation.
+    spans : list
+        For the root span, the finished spans of the whole trace.
+    """
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent', 'start', 'duration', 'attributes', 'spans', '_counter')
+
+    def __init__(self, name, parent=None, start=None, **attributes):
+        self.name = name
+        self.parent = parent
+        self.start = time.time() if start is None else start
+        self.duration = None
+        self.attributes = attributes
+        root = self.root
+        if parent is None:
+            self.trace_id = os.urandom(8).hex()
+            self.spans = []
+            self._counter = 0
+        else:
+            self.trace_id = root.trace_id
+            self.spans = None
+            root._counter += 1
+        self.span_id = f"{root._counter:x}"
+
+    @property
+    def root(self):
+        """The root span of the trace."""
+        span = self
+        while span.parent is not None:
+            span = span.parent
+        return span
+
+    def finish(self, duration=None):
+        """Close the span; closing the root span exports the trace."""
+        self.duration = time.time() - self.start if duration is None else duration
+        root = self.root
+        root.spans.append(self)
+        if self is root:
+            _export(self)
+
+    def to_dict(self):
+        """The span as a JSON-serializable dictionary."""
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': None if self.parent is None else self.parent.span_id,
+            'name': self.name,
+            'start': self.start,
+            'duration': self.duration,
+            'attributes': self.attributes,
+        }
+
+
+class _SpanContext:
+    """Context manager opening a span as the current span."""
+
+    __slots__ = ('name', 'attributes', 'span', 'token')
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.span, self.token = start_span(self.name, **self.attributes)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.span.attributes['error'] = exc_type.__name__
+        end_span(self.span, self.token)
+        return False
+
+
+def enabled():
+    """Whether tracing is enabled."""
+    return _enabled
+
+
+def enable(path=DEFAULT_PATH):
+    """
+    Start tracing, appending the finished traces to a file.
+
+    Parameters:
+    -----------
+    path : str
+        Path of the JSON-lines file receiving the spans.
+    """
+    import dbtools.instrument as instrument
+
+    global _enabled, _path
+    _path = path
+    _enabled = True
+    instrument.add_hook(_query_hook)
+
+
+def disable():
+    """Stop tracing. Spans that are still open are not exported."""
+    import dbtools.instrument as instrument
+
+    global _enabled
+    _enabled = False
+    instrument.remove_hook(_query_hook)
+
+
+def current_span():
+    """The innermost open span of the current context, or None."""
+    return _current.get()
+
+
+def start_span(name, **attributes):
+    """
+    Open a span as a child of the current span and make it the current span.
+
+    Use span() where a with block fits; this pair of functions is for code
+    where the start and the end are in different callbacks.
+
+    Returns:
+    --------
+    tuple
+        (span, token), to be passed to end_span().
+    """
+    span = Span(name, _current.get(), **attributes)
+    return span, _current.set(span)
+
+
+def end_span(span, token):
+    """
+    Close a span opened with start_span() and restore the previous current span.
+    """
+    span.finish()
+    try:
+        _current.reset(token)
+    except ValueError:
+        # The span was opened in another context
+        _current.set(span.parent)
+
+
+def span(name, **attributes):
+    """
+    Context manager timing a block of code as a span.
+
+    Parameters:
+    -----------
+    name : str
+        Name of the span.
+    **attributes
+        Additional information stored with the span.
+
+    Returns:
+    --------
+    context manager
+        Yields the Span, or None when tracing is disabled.
+    """
+    if not _enabled:
+        return _NOOP
+    return _SpanContext(name, attributes)
+
+
+def traced(func):
+    """Decorator timing every call of a function as a span named after the function."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        with _SpanContext(name, {}):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _query_hook(record):
+    """instrument hook adding a span for every query run inside a trace."""
+    parent = _current.get()
+    if parent is None:
+        return
+    Span(f"db_{record['kind'].lower() or 'query'}", parent, start=time.time() - record['seconds'],
+         caller=record['caller'], rows=record['rows']).finish(record['seconds'])
+
+
+def _export(root):
+    """Append the spans of a finished trace to the trace file."""
+    lines = ''.join(json.dumps(span.to_dict(), default=str) + '\n' for span in root.spans)
+    with _write_lock:
+        with open(_path or DEFAULT_PATH, 'a') as f:
+            f.write(lines)
+
+
+def server_timing(root):
+    """
+    Summarise a trace as the value of a Server-Timing HTTP header.
+
+    The durations of the spans are summed per name, and the time since the
+    start of the root span is reported as 'total'.
+
+    Parameters:
+    -----------
+    root : Span
+        The root span of the trace, open or finished.
+
+    Returns:
+    --------
+    str
+        The header value, e.g. 'get_data_metadata;dur=41.2, db_select;dur=12.5, total;dur=55.0'.
+    """
+    durations = {}
+    counts = {}
+    for item in root.spans:
+        if item is root:
+            continue
+        name = re.sub(r'[^A-Za-z0-9_.-]', '_', item.name)
+        durations[name] = durations.get(name, 0.0) + item.duration
+        counts[name] = counts.get(name, 0) + 1
+
+    total = root.duration if root.duration is not None else time.time() - root.start
+    entries = [f'{name};desc="{counts[name]}x";dur={seconds * 1000:.1f}' for name, seconds in durations.items()]
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def read_traces(path=DEFAULT_PATH):
+    """
+    Read the spans written to a trace file.
+
+    Parameters:
+    -----------
+    path : str
+        Path of the trace file.
+
+    Returns:
+    --------
+    pd.DataFrame
+        One row per span with the columns trace_id, span_id, parent_id, name,
+        start, duration and attributes, ordered by trace and start time.
+    """
+    import pandas as pd
+
+    spans = []
+    if os.path.exists(path):
+        with open(path) as f:
+            spans = [json.loads(line) for line in f if line.strip()]
+
+    traces = pd.DataFrame(spans, columns=['trace_id', 'span_id', 'parent_id', 'name', 'start', 'duration', 'attributes'])
+    return traces.sort_values(['trace_id', 'start']).reset_index(drop=True)
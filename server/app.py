@@ -5,17 +5,23 @@ This module provides a web interface to the database loading functions.
 It allows users to add materials, panels, samples, and measurements to the database.
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, g
+from flask import before_render_template, template_rendered
+import io
 import sys
 import os
-import numpy as np
 from pathlib import Path
-from preprocess_tools import io
 
 # Add the parent directory to the path to import dbtools
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import dbtools.dbtools as dbt
 import dbtools.load as load
+import dbtools.export as export
+import dbtools.fileinfo as fileinfo
+import dbtools.instrument as instrument
+import dbtools.manifest as manifest
+import dbtools.tracing as tracing
+import jobs
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'  # Needed for flash messages
@@ -23,6 +29,146 @@ app.secret_key = 'your_secret_key'  # Needed for flash messages
 # Global connection object
 conn = None
 
+# Persistent cache of extracted file properties, stored next to the server
+FILE_INFO_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'file_info_cache.sqlite')
+
+# Typeahead search of the form selectors: table -> (query of the result columns, searched column).
+# sql/migrations/001_name_search_indexes.sql adds the trigram indexes that serve these searches.
+SEARCH_QUERIES = {
+    'samples': ("""
+        SELECT s.id, s.name, p.name AS panel_name
+        FROM samples s
+        JOIN panels p ON s.panel_id = p.id
+    """, 's.name'),
+    'panels': ("""
+        SELECT p.id, p.name, m.name AS material_name,
+               (SELECT json_object_agg(pm.key, pm.value) FROM panel_metadata pm WHERE pm.panel_id = p.id) AS metadata
+        FROM panels p
+        JOIN materials m ON p.material_id = m.id
+    """, 'p.name'),
+    'materials': ("""
+        SELECT id, name FROM materials
+    """, 'name'),
+}
+
+# Number of search results returned by default and at most
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+# Background jobs of the heavy requests (reading file headers, loading measurements), polled at /jobs/<job_id>.
+# DBTOOLS_JOB_WORKERS sets the number of jobs run at the same time.
+job_queue = jobs.JobQueue(workers=int(os.environ.get('DBTOOLS_JOB_WORKERS', 4)))
+
+# Request tracing: set DBTOOLS_TRACE_FILE to append the spans of every request to that file
+if os.environ.get('DBTOOLS_TRACE_FILE'):
+    tracing.enable(os.environ['DBTOOLS_TRACE_FILE'])
+
+@app.before_request
+def start_trace():
+    """Open the root span of the request and time the parsing of the request body."""
+    if not tracing.enabled():
+        return
+    g.trace = tracing.start_span(f'{request.method} {request.path}',
+                                 route=request.url_rule.rule if request.url_rule else None)
+    if request.method == 'POST':
+        with tracing.span('parse_form'):
+            request.form
+            request.get_json(silent=True)
+
+@app.after_request
+def add_server_timing(response):
+    """Report the time spent per span in the Server-Timing header."""
+    trace = g.get('trace')
+    if trace is not None:
+        response.headers['Server-Timing'] = tracing.server_timing(trace[0])
+    return response
+
+@app.teardown_request
+def finish_trace(exception):
+    """Close the root span of the request, which exports the trace."""
+    trace = g.pop('trace', None)
+    if trace is not None:
+        if exception is not None:
+            trace[0].attributes['error'] = type(exception).__name__
+        tracing.end_span(*trace)
+
+@before_render_template.connect_via(app)
+def start_render_span(sender, template, context, **extra):
+    """Open a span for the rendering of a template, including its tojson filters."""
+    if tracing.enabled() and g.get('trace') is not None:
+        g.render = tracing.start_span('render', template=template.name)
+
+@template_rendered.connect_via(app)
+def end_render_span(sender, template, context, **extra):
+    """Close the span of the template rendering."""
+    render = g.pop('render', None)
+    if render is not None:
+        tracing.end_span(*render)
+
+def _wants_job():
+    """Whether the request asks for its work to run as a background job (?async=1)."""
+    return request.args.get('async') == '1'
+
+def _submit_job(kind, func, *args):
+    """Run func(job, *args) as a background job and answer 202 with the URL of its status."""
+    try:
+        job = job_queue.submit(kind, func, *args)
+    except jobs.JobQueueFull as e:
+        response = jsonify({'error': str(e)})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers['Location'] = url_for('job_status', job_id=job.id)
+    return response
+
+def _form_error(message, page):
+    """Report an invalid form: as JSON to asynchronous submissions, else as a flash message on the form page."""
+    if _wants_job():
+        return jsonify({'error': message}), 400
+    flash(message, 'error')
+    return redirect(url_for(page))
+
+def _load_measurement(job, loader, arguments):
+    """
+    Load a measurement over a connection of its own, as a background job or
+    within the request (job None). Returns the id of the measurement, or -1
+    if the loader rejected it.
+    """
+    if job is not None:
+        job.update(0.1, 'Verifying the file and loading the measurement')
+
+    # A new connection avoids transaction conflicts with the connection of the requests
+    new_conn = dbt.connect()
+    try:
+        result = loader(new_conn, *arguments)
+    finally:
+        new_conn.close()
+
+    if job is not None and result == -1:
+        raise ValueError('The measurement could not be loaded, see the server log for details')
+    return result
+
+def _read_file_info(job, file_path):
+    """Background job extracting the properties of a measurement file."""
+    job.update(0.1, 'Reading the file header')
+    with tracing.span('read_file_info'):
+        return fileinfo.cached_file_info(file_path, FILE_INFO_CACHE)
+
+def _upload_measurements(job, kind, text, on_conflict):
+    """
+    Load a manifest of measurements over a connection of its own, as a
+    background job or within the request (job None), and return the report.
+    """
+    new_conn = dbt.connect()
+    try:
+        return manifest.load_measurements(
+            new_conn, kind, io.StringIO(text), on_conflict, cache_path=FILE_INFO_CACHE,
+            progress=job.update if job is not None else None)
+    finally:
+        new_conn.close()
+
 @app.route('/')
 def index():
     """Render the main menu page."""
@@ -303,60 +449,8 @@ def view_measurementtypes():
 
 @app.route('/samples')
 def samples_page():
-    """Render the samples form page."""
-    try:
-        global conn
-        if conn is None or conn.closed:
-            conn = dbt.connect()
-        
-        # Create a cursor object
-        cursor = conn.cursor()
-        
-        # Get all panels for the dropdown
-        cursor.execute("""
-            SELECT p.id, p.name, m.id as material_id, m.name as material_name 
-            FROM panels p
-            JOIN materials m ON p.material_id = m.id
-        """)
-        panels = cursor.fetchall()
-        
-        # Format panels as list of dictionaries
-        formatted_panels = []
-        for panel in panels:
-            panel_id, name, material_id, material_name = panel
-            
-            # Query metadata for this panel
-            cursor.execute(
-                "SELECT key, value, type FROM panel_metadata WHERE panel_id = %s",
-                (panel_id,)
-            )
-            metadata = cursor.fetchall()
-            
-            # Format metadata as list of dictionaries
-            formatted_metadata = []
-            for meta in metadata:
-                key, value, meta_type = meta
-                formatted_metadata.append({
-                    'key': key,
-                    'value': value,
-                    'type': meta_type
-                })
-            
-            # Add panel with its metadata to the list
-            formatted_panels.append({
-                'id': panel_id,
-                'name': name,
-                'material_id': material_id,
-                'material_name': material_name,
-                'metadata': formatted_metadata
-            })
-        
-        cursor.close()
-        return render_template('sample.html', panels=formatted_panels)
-    
-    except Exception as e:
-        flash(f'Error loading panels for sample form: {str(e)}', 'error')
-        return redirect(url_for('index'))
+    """Render the samples form page. The panel selector searches /search/panels as the user types."""
+    return render_template('sample.html')
 
 @app.route('/samples/submit', methods=['GET', 'POST'])
 def samples_submit():
@@ -476,28 +570,10 @@ def ut_measurements_page():
                 'description': description
             })
         
-        # Get all samples for association
-        cursor.execute("""
-            SELECT s.id, s.name, p.name as panel_name 
-            FROM samples s
-            JOIN panels p ON s.panel_id = p.id
-        """)
-        samples = cursor.fetchall()
-        
-        # Format samples as list of dictionaries
-        formatted_samples = []
-        for sample in samples:
-            sample_id, name, panel_name = sample
-            formatted_samples.append({
-                'id': sample_id,
-                'name': name,
-                'panel_name': panel_name
-            })
-        
+        # Samples are not listed: the sample selector searches /search/samples as the user types
         cursor.close()
         return render_template('ut_measurement.html', 
-                              measurement_types=formatted_measurement_types,
-                              samples=formatted_samples)
+                              measurement_types=formatted_measurement_types)
     
     except Exception as e:
         flash(f'Error loading form data: {str(e)}', 'error')
@@ -515,15 +591,13 @@ def ut_measurements_submit():
             
             # Validate transformations if parent path is provided
             if parent_measurement_path and not transformations:
-                flash('Transformations are required when a parent measurement is specified.', 'error')
-                return redirect(url_for('ut_measurements_page'))
+                return _form_error('Transformations are required when a parent measurement is specified.', 'ut_measurements_page')
             
             # Get measurement type
             try:
                 measurementtype_id = int(request.form.get('measurementtype_id'))
             except ValueError:
-                flash('Please select a valid measurement type.', 'error')
-                return redirect(url_for('ut_measurements_page'))
+                return _form_error('Please select a valid measurement type.', 'ut_measurements_page')
             
             # Get file properties
             try:
@@ -531,8 +605,7 @@ def ut_measurements_submit():
                 width = int(request.form.get('width'))
                 depth = int(request.form.get('depth'))
             except ValueError:
-                flash('Dimensions must be valid integers.', 'error')
-                return redirect(url_for('ut_measurements_page'))
+                return _form_error('Dimensions must be valid integers.', 'ut_measurements_page')
             
             dtype = request.form.get('dtype')
             file_type = request.form.get('file_type')
@@ -547,15 +620,13 @@ def ut_measurements_submit():
             
             # Validate axes order has unique values
             if len(set(axes_order)) != 3:
-                flash('Axes order must contain unique values for x, y, and z.', 'error')
-                return redirect(url_for('ut_measurements_page'))
+                return _form_error('Axes order must contain unique values for x, y, and z.', 'ut_measurements_page')
             
             # Get sample IDs and convert them to names
             try:
                 sample_ids = request.form.getlist('sample_ids')
                 if not sample_ids:
-                    flash('Please select at least one sample.', 'error')
-                    return redirect(url_for('ut_measurements_page'))
+                    return _form_error('Please select at least one sample.', 'ut_measurements_page')
                 
                 # Get sample names from IDs using direct SQL query
                 global conn
@@ -593,8 +664,7 @@ def ut_measurements_submit():
                         
                         # Validate that all fields are filled for non-empty entries
                         if not key or not value or not meta_type:
-                            flash(f'Metadata field {i+1}: All fields (key, value, type) must be filled.', 'error')
-                            return redirect(url_for('ut_measurements_page'))
+                            return _form_error(f'Metadata field {i+1}: All fields (key, value, type) must be filled.', 'ut_measurements_page')
                         
                         additional_metadata.append({
                             'key': key,
@@ -602,20 +672,18 @@ def ut_measurements_submit():
                             'type': meta_type
                         })
                 
-                # Create a new connection for the load_ut_measurement function
-                # This avoids transaction conflicts with get_data_metadata
-                new_conn = dbt.connect()
-                
-                # Call the load_ut_measurement function with the new connection
-                result = load.load_ut_measurement(
-                    new_conn, file_path, measurementtype_id, 
+                arguments = (
+                    file_path, measurementtype_id,
                     height, width, depth, dtype,
                     file_type, signal_type, axes_order,
                     sample_names, parent_measurement_path, transformations, additional_metadata
                 )
-                
-                # Close the new connection
-                new_conn.close()
+
+                # Loading verifies the file and inserts many rows: asynchronous submissions run it as a job
+                if _wants_job():
+                    return _submit_job('ut_measurement', _load_measurement, load.load_ut_measurement, arguments)
+
+                result = _load_measurement(None, load.load_ut_measurement, arguments)
 
                 if result == -1:
                     flash(f'Error loading UT measurement.', 'error')
@@ -624,12 +692,10 @@ def ut_measurements_submit():
                 return redirect(url_for('ut_measurements_page'))
 
             except Exception as e:
-                flash(f'Error: {str(e)}', 'error')
-                return redirect(url_for('ut_measurements_page'))
+                return _form_error(f'Error: {str(e)}', 'ut_measurements_page')
                 
         except Exception as e:
-            flash(f'Error processing form: {str(e)}', 'error')
-            return redirect(url_for('ut_measurements_page'))
+            return _form_error(f'Error processing form: {str(e)}', 'ut_measurements_page')
     
     # GET request - just show the form
     return redirect(url_for('ut_measurements_page'))
@@ -667,28 +733,10 @@ def xct_measurements_page():
                 'description': description
             })
         
-        # Get all samples for association
-        cursor.execute("""
-            SELECT s.id, s.name, p.name as panel_name 
-            FROM samples s
-            JOIN panels p ON s.panel_id = p.id
-        """)
-        samples = cursor.fetchall()
-        
-        # Format samples as list of dictionaries
-        formatted_samples = []
-        for sample in samples:
-            sample_id, name, panel_name = sample
-            formatted_samples.append({
-                'id': sample_id,
-                'name': name,
-                'panel_name': panel_name
-            })
-        
+        # Samples are not listed: the sample selector searches /search/samples as the user types
         cursor.close()
         return render_template('xct_measurement.html', 
-                              measurement_types=formatted_measurement_types,
-                              samples=formatted_samples)
+                              measurement_types=formatted_measurement_types)
     
     except Exception as e:
         flash(f'Error loading form data: {str(e)}', 'error')
@@ -706,15 +754,13 @@ def xct_measurements_submit():
             
             # Validate transformations if parent path is provided
             if parent_measurement_path and not transformations:
-                flash('Transformations are required when a parent measurement is specified.', 'error')
-                return redirect(url_for('xct_measurements_page'))
+                return _form_error('Transformations are required when a parent measurement is specified.', 'xct_measurements_page')
             
             # Get measurement type
             try:
                 measurementtype_id = int(request.form.get('measurementtype_id'))
             except ValueError:
-                flash('Please select a valid measurement type.', 'error')
-                return redirect(url_for('xct_measurements_page'))
+                return _form_error('Please select a valid measurement type.', 'xct_measurements_page')
             
             # Get file properties
             try:
@@ -722,8 +768,7 @@ def xct_measurements_submit():
                 width = int(request.form.get('width'))
                 depth = int(request.form.get('depth'))
             except ValueError:
-                flash('Dimensions must be valid integers.', 'error')
-                return redirect(url_for('xct_measurements_page'))
+                return _form_error('Dimensions must be valid integers.', 'xct_measurements_page')
             dtype = request.form.get('dtype')
             file_type = request.form.get('file_type')
             
@@ -740,15 +785,13 @@ def xct_measurements_submit():
             
             # Validate axes order has unique values
             if len(set(axes_order)) != 3:
-                flash('Axes order must contain unique values for x, y, and z.', 'error')
-                return redirect(url_for('xct_measurements_page'))
+                return _form_error('Axes order must contain unique values for x, y, and z.', 'xct_measurements_page')
             
             # Get sample IDs and names
             try:
                 sample_ids = request.form.getlist('sample_ids')
                 if not sample_ids:
-                    flash('Please select at least one sample.', 'error')
-                    return redirect(url_for('xct_measurements_page'))
+                    return _form_error('Please select at least one sample.', 'xct_measurements_page')
                 
                 # Get sample names from IDs using direct SQL query
                 global conn
@@ -786,8 +829,7 @@ def xct_measurements_submit():
                         
                         # Validate that all fields are filled for non-empty entries
                         if not key or not value or not meta_type:
-                            flash(f'Metadata field {i+1}: All fields (key, value, type) must be filled.', 'error')
-                            return redirect(url_for('xct_measurements_page'))
+                            return _form_error(f'Metadata field {i+1}: All fields (key, value, type) must be filled.', 'xct_measurements_page')
                         
                         additional_metadata.append({
                             'key': key,
@@ -795,20 +837,18 @@ def xct_measurements_submit():
                             'type': meta_type
                         })
                 
-                # Create a new connection for the load_xct_measurement function
-                # This avoids transaction conflicts with get_data_metadata
-                new_conn = dbt.connect()
-                
-                # Call the load_xct_measurement function with the new connection
-                result = load.load_xct_measurement(
-                    new_conn, file_path, measurementtype_id, 
+                arguments = (
+                    file_path, measurementtype_id,
                     height, width, depth, dtype, file_type,
                     sample_names, aligned, equalized, axes_order,
                     parent_measurement_path, transformations, additional_metadata
                 )
-                
-                # Close the new connection
-                new_conn.close()
+
+                # Loading verifies the file and inserts many rows: asynchronous submissions run it as a job
+                if _wants_job():
+                    return _submit_job('xct_measurement', _load_measurement, load.load_xct_measurement, arguments)
+
+                result = _load_measurement(None, load.load_xct_measurement, arguments)
 
                 if result == -1:
                     flash(f'Error loading XCT measurement.', 'error')
@@ -817,12 +857,10 @@ def xct_measurements_submit():
                 return redirect(url_for('xct_measurements_page'))
 
             except Exception as e:
-                flash(f'Error: {str(e)}', 'error')
-                return redirect(url_for('xct_measurements_page'))
+                return _form_error(f'Error: {str(e)}', 'xct_measurements_page')
                 
         except Exception as e:
-            flash(f'Error processing form: {str(e)}', 'error')
-            return redirect(url_for('xct_measurements_page'))
+            return _form_error(f'Error processing form: {str(e)}', 'xct_measurements_page')
     
     # GET request - just show the form
     return redirect(url_for('xct_measurements_page'))
@@ -835,6 +873,47 @@ def view_xct_measurements():
                           secondary_table_name='samples', 
                           relational_table='sample_measurements'))
 
+@app.route('/measurements/upload')
+def measurements_upload_page():
+    """Render the measurement manifest upload page."""
+    return render_template('measurement_upload.html')
+
+@app.route('/measurements/upload', methods=['POST'])
+def measurements_upload_submit():
+    """Load a CSV manifest of UT or XCT measurements in one transaction and report every row."""
+    kind = request.form.get('kind')
+    on_conflict = request.form.get('on_conflict') or None
+    manifest_file = request.files.get('manifest')
+
+    if kind not in manifest.REQUIRED:
+        return _form_error('Please select the type of the measurements.', 'measurements_upload_page')
+    if on_conflict not in load.ON_CONFLICT_MODES:
+        return _form_error('Please select what to do with existing measurements.', 'measurements_upload_page')
+    if manifest_file is None or not manifest_file.filename:
+        return _form_error('Please choose a manifest file.', 'measurements_upload_page')
+    try:
+        # utf-8-sig drops the byte order mark spreadsheet programs write
+        text = manifest_file.read().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return _form_error('The manifest must be a UTF-8 encoded CSV file.', 'measurements_upload_page')
+
+    # Reading the files and loading many measurements take long: asynchronous submissions run it as a job
+    if _wants_job():
+        return _submit_job('measurement_upload', _upload_measurements, kind, text, on_conflict)
+
+    try:
+        report = _upload_measurements(None, kind, text, on_conflict)
+    except Exception as e:
+        return _form_error(f'Error loading the manifest: {str(e)}', 'measurements_upload_page')
+
+    if report['rows'] == 0:
+        return _form_error('The manifest has no rows.', 'measurements_upload_page')
+    if report['committed']:
+        flash(f"{report['loaded']} measurements successfully added to the database!", 'success')
+    else:
+        flash(f"Nothing was loaded: {report['failed']} of {report['rows']} rows failed.", 'error')
+    return render_template('measurement_upload.html', report=report)
+
 @app.route('/get_file_info', methods=['POST'])
 def get_file_info():
     """API endpoint to extract file information from UT measurement files."""
@@ -845,39 +924,20 @@ def get_file_info():
         
         if not file_path:
             return jsonify({'error': 'No file path provided'}), 400
+
+        # Reading the headers of a large stack can take long: asynchronous requests run it as a job
+        if _wants_job():
+            return _submit_job('file_info', _read_file_info, file_path)
         
-        # Check file extension
-        file_type = os.path.splitext(file_path)[1]
-        if not file_type:  # If it's a directory of TIFFs
-            file_type = 'folder'
-        
-        # Load file and extract properties
+        # Extract properties from the file headers without loading the volume,
+        # reusing the cached result if the file has not changed
         try:
-            from preprocess_tools import io
-            
-            # Load the file using preprocess_tools.io
-            file = io.load_tif(file_path)
-            
-            # Extract dimensions
-            if len(file.shape) == 3:
-                height, width, depth = file.shape
-            elif len(file.shape) == 2:
-                height, width = file.shape
-                depth = 1
-            else:
-                return jsonify({'error': f'Unsupported file shape: {file.shape}'}), 400
-            
-            # Get data type
-            dtype = str(file.dtype)
-            
-            return jsonify({
-                'height': height,
-                'width': width,
-                'depth': depth,
-                'dtype': dtype,
-                'file_type': file_type
-            })
+            with tracing.span('read_file_info'):
+                file_info = fileinfo.cached_file_info(file_path, FILE_INFO_CACHE)
+            return jsonify(file_info)
             
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         except ImportError as import_error:
             return jsonify({'error': f'Required module not installed: {str(import_error)}'}), 500
         except Exception as e:
@@ -886,6 +946,57 @@ def get_file_info():
     except Exception as e:
         return jsonify({'error': f'Error processing request: {str(e)}'}), 500
 
+@app.route('/search/<table_name>')
+def search(table_name):
+    """
+    Typeahead search of the form selectors: the rows whose name contains ?q=,
+    names starting with it first, at most ?limit= rows, as JSON.
+    """
+    if table_name not in SEARCH_QUERIES:
+        return jsonify({'error': f'Search is not available for {table_name}'}), 404
+
+    text = request.args.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.args.get('limit', SEARCH_LIMIT)), MAX_SEARCH_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    # Wildcards typed by the user match literally
+    pattern = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    query, column = SEARCH_QUERIES[table_name]
+
+    try:
+        global conn
+        if conn is None or conn.closed:
+            conn = dbt.connect()
+
+        cursor = conn.cursor()
+        # ILIKE '%text%' is served by the trigram index; the shortest names are the closest matches
+        cursor.execute(
+            f"""{query}
+            WHERE {column} ILIKE %(contains)s
+            ORDER BY {column} ILIKE %(prefix)s DESC, length({column}), {column}
+            LIMIT %(limit)s""",
+            {'contains': f'%{pattern}%', 'prefix': f'{pattern}%', 'limit': limit}
+        )
+        columns = [desc[0] for desc in cursor.description]
+        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        cursor.close()
+        return jsonify({'results': results})
+
+    except Exception as e:
+        if conn is not None and not conn.closed:
+            conn.rollback()
+        return jsonify({'error': f'Error searching {table_name}: {str(e)}'}), 500
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """State, progress and result of a background job, polled by the forms."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown or expired job: {job_id}'}), 404
+    return jsonify(job.to_dict())
+
 @app.route('/fabrication')
 def fabrication_page():
     """Render the fabrication form page."""
@@ -1046,14 +1157,15 @@ def view_table(table_name):
         # Use the reference view_table approach
         table_df = dbt.get_data_metadata(table_name)
         
-        # Handle NaN values for JSON serialization
-        table_df = table_df.fillna('')
-        
-        # Convert DataFrame to dictionary format for JSON serialization
-        table_data = {
-            'columns': table_df.columns.tolist(),
-            'data': table_df.values.tolist()
-        }
+        with tracing.span('table_data'):
+            # Handle NaN values for JSON serialization
+            table_df = table_df.fillna('')
+
+            # Convert DataFrame to dictionary format for JSON serialization
+            table_data = {
+                'columns': table_df.columns.tolist(),
+                'data': table_df.values.tolist()
+            }
         
         # Create a title from table name (capitalize and handle plurals)
         table_title = table_name.replace('_', ' ').title()
@@ -1061,7 +1173,8 @@ def view_table(table_name):
         return render_template('view_table_interactive.html', 
                              table_data=table_data, 
                              table_name=table_name,
-                             table_title=table_title)
+                             table_title=table_title,
+                             export_url=url_for('export_table', table_name=table_name))
         
     except Exception as e:
         flash(f'Error fetching data from {table_name}: {str(e)}', 'error')
@@ -1089,14 +1202,15 @@ def view_relational_table(main_table_name, secondary_table_name, relational_tabl
         # Use the relational metadata function
         table_df = dbt.relation_metadata(main_table_name, secondary_table_name, relational_table)
         
-        # Handle NaN values for JSON serialization
-        table_df = table_df.fillna('')
-        
-        # Convert DataFrame to dictionary format for JSON serialization
-        table_data = {
-            'columns': table_df.columns.tolist(),
-            'data': table_df.values.tolist()
-        }
+        with tracing.span('table_data'):
+            # Handle NaN values for JSON serialization
+            table_df = table_df.fillna('')
+
+            # Convert DataFrame to dictionary format for JSON serialization
+            table_data = {
+                'columns': table_df.columns.tolist(),
+                'data': table_df.values.tolist()
+            }
         
         # Create a title for the relational view
         table_title = f"{main_table_name.title()} with Related {secondary_table_name.title()}"
@@ -1104,12 +1218,76 @@ def view_relational_table(main_table_name, secondary_table_name, relational_tabl
         return render_template('view_table_interactive.html', 
                              table_data=table_data, 
                              table_name=f"{main_table_name}_{secondary_table_name}",
-                             table_title=table_title)
+                             table_title=table_title,
+                             export_url=url_for('export_relational_table',
+                                                main_table_name=main_table_name,
+                                                secondary_table_name=secondary_table_name,
+                                                relational_table=relational_table))
         
     except Exception as e:
         flash(f'Error fetching data from {main_table_name} and {secondary_table_name}: {str(e)}', 'error')
         return redirect(url_for('index'))
 
+def _export_response(stream, filename, fmt):
+    """Wrap an export byte stream in a chunked download response."""
+    return Response(stream,
+                    mimetype=export.FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}.{fmt}'})
+
+@app.route('/export/<table_name>')
+def export_table(table_name):
+    """Stream a table with its metadata as CSV, NDJSON or Parquet (?format=csv|ndjson|parquet)."""
+    try:
+        # Validate table name to prevent SQL injection
+        valid_tables = ['materials', 'fabrications', 'panels', 'samples', 'measurements', 'measurementtypes']
+        if table_name not in valid_tables:
+            flash(f'Invalid table name: {table_name}', 'error')
+            return redirect(url_for('index'))
+
+        fmt = request.args.get('format', 'csv')
+        if fmt not in export.FORMATS:
+            flash(f'Invalid export format: {fmt}', 'error')
+            return redirect(url_for('view_table', table_name=table_name))
+
+        # The stream reads the table through a server-side cursor chunk by chunk
+        stream = export.stream_table(table_name, fmt)
+        return _export_response(stream, table_name, fmt)
+
+    except Exception as e:
+        flash(f'Error exporting {table_name}: {str(e)}', 'error')
+        return redirect(url_for('index'))
+
+@app.route('/export_relational/<main_table_name>/<secondary_table_name>/<relational_table>')
+def export_relational_table(main_table_name, secondary_table_name, relational_table):
+    """Stream a relational view as CSV, NDJSON or Parquet (?format=csv|ndjson|parquet)."""
+    try:
+        # Validate table names to prevent SQL injection
+        valid_tables = ['samples', 'measurements']
+        valid_relational_tables = ['sample_measurements']
+
+        if (main_table_name not in valid_tables or
+            secondary_table_name not in valid_tables or
+            relational_table not in valid_relational_tables):
+            flash(f'Invalid table combination: {main_table_name}, {secondary_table_name}, {relational_table}', 'error')
+            return redirect(url_for('index'))
+
+        fmt = request.args.get('format', 'csv')
+        if fmt not in export.FORMATS:
+            flash(f'Invalid export format: {fmt}', 'error')
+            return redirect(url_for('index'))
+
+        stream = export.stream_relation(main_table_name, secondary_table_name, relational_table, fmt)
+        return _export_response(stream, f"{main_table_name}_{secondary_table_name}", fmt)
+
+    except Exception as e:
+        flash(f'Error exporting {main_table_name} and {secondary_table_name}: {str(e)}', 'error')
+        return redirect(url_for('index'))
+
+@app.route('/metrics')
+def metrics():
+    """Query and connection statistics of dbtools in the Prometheus text format."""
+    return Response(instrument.prometheus_text(), mimetype='text/plain; version=0.0.4')
+
 @app.teardown_appcontext
 def close_connection(exception):
     """Close the database connection when the application context ends."""
@@ -0,0 +1,212 @@
+"""
+Background Jobs for the Web Interface
+
+Some requests do heavy work: reading the headers of large volume files or
+loading a measurement, which verifies its file and inserts many rows. This
+module runs such work in a bounded pool of worker threads, so the request
+returns at once with a job id and the server keeps answering other users:
+
+    job = queue.submit('ut_measurement', load_measurement, loader, arguments)
+    return jsonify(job.to_dict()), 202
+
+The page then polls /jobs/<job_id> until the job is 'done' (its result is
+set) or 'failed' (its error is set). Jobs report their progress with
+job.update(). Finished jobs are kept for a retention period and then
+forgotten.
+
+Each job runs in a worker thread, so it must open its own database
+connection instead of using the connection of the requests.
+"""
+
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import dbtools.tracing as tracing
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobQueueFull(Exception):
+    """Raised by JobQueue.submit when the maximum number of pending jobs is reached."""
+
+
+class Job:
+    """
+    A unit of work run by a JobQueue.
+
+    Attributes:
+    -----------
+    id : str
+        Identifier of the job.
+    kind : str
+        Type of work (e.g. 'file_info', 'ut_measurement').
+    status : str
+        'queued', 'running', 'done' or 'failed'.
+    progress : float
+        Fraction of the work done, from 0 to 1.
+    message : str
+        Description of the current step.
+    result : object
+        Return value of the job function once done, JSON-serializable.
+    error : str or None
+        Error message if the job failed.
+    created, started, finished : float or None
+        Times of the state changes (seconds since the epoch).
+    """
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = 'Waiting for a worker'
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def update(self, progress=None, message=None):
+        """
+        Report the progress of the job.
+
+        Parameters:
+        -----------
+        progress : float, optional
+            Fraction of the work done, from 0 to 1.
+        message : str, optional
+            Description of the current step.
+        """
+        if progress is not None:
+            self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    @property
+    def is_finished(self):
+        """Whether the job has finished, successfully or not."""
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self):
+        """The state of the job as a JSON-serializable dictionary."""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class JobQueue:
+    """
+    Runs jobs in a bounded pool of worker threads and keeps their state.
+
+    Parameters:
+    -----------
+    workers : int
+        Number of jobs run at the same time.
+    max_pending : int
+        Maximum number of queued and running jobs; submit() raises
+        JobQueueFull beyond it.
+    retention : float
+        Seconds a finished job is kept before it is forgotten.
+    """
+
+    def __init__(self, workers=4, max_pending=100, retention=3600):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dbtools-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _purge(self):
+        """Forget the jobs finished for longer than the retention period. Called with the lock held."""
+        limit = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished is not None and job.finished < limit]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def pending(self):
+        """Number of queued and running jobs."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.is_finished)
+
+    def submit(self, kind, func, *args, **kwargs):
+        """
+        Queue a job.
+
+        Parameters:
+        -----------
+        kind : str
+            Type of work, reported with the job state.
+        func : callable
+            Called as func(job, *args, **kwargs) in a worker thread. Its
+            return value becomes the result of the job and an exception
+            makes the job fail with the exception message.
+
+        Returns:
+        --------
+        Job
+            The queued job.
+
+        Raises:
+        -------
+        JobQueueFull
+            If max_pending jobs are already queued or running.
+        """
+        job = Job(kind)
+        with self._lock:
+            self._purge()
+            if sum(1 for other in self._jobs.values() if not other.is_finished) >= self.max_pending:
+                raise JobQueueFull(f"Too many pending jobs ({self.max_pending}), try again later")
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        """The job with the given id, or None if it is unknown or expired."""
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def _run(self, job, func, args, kwargs):
+        """Run a job in a worker thread and record its outcome."""
+        job.started = time.time()
+        job.status = RUNNING
+        job.message = 'Running'
+        try:
+            # Each job is a trace of its own when tracing is enabled
+            with tracing.span(f'job {job.kind}', job_id=job.id):
+                result = func(job, *args, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e) or type(e).__name__
+            job.message = 'Failed'
+            status = FAILED
+        else:
+            job.result = result
+            job.progress = 1.0
+            job.message = 'Done'
+            status = DONE
+        # The status changes last, so a finished job is complete when it is polled
+        job.finished = time.time()
+        job.status = status
+
+    def shutdown(self, wait=True):
+        """Stop the workers once the queued jobs are done."""
+        self._executor.shutdown(wait=wait)
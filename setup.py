@@ -3,7 +3,7 @@ from setuptools import setup, find_packages
 setup(
     name='dbtools',  # Change this to a valid name, e.g., 'myqueries'
     version='0.1.17',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     install_requires=["psycopg2-binary", "python-dotenv", "pandas"],
     author='Alberto Vicente del Egido',
     description='Database utilities for IMDEA database',
@@ -13,4 +13,7 @@ setup(
         'Operating System :: OS Independent',
     ],
     python_requires='>=3.8',
+    entry_points={
+        'console_scripts': ['dbtools=dbtools.cli:main'],
+    },
 )
@@ -0,0 +1,22 @@
+--
+-- Migration 001: trigram indexes on the searched names
+--
+-- The form selectors of the web interface search samples, panels and
+-- materials by name as the user types (/search/<table_name>), with
+-- name ILIKE '%text%'. The B-tree indexes of the unique name constraints
+-- cannot serve a pattern that does not start at the beginning of the name.
+-- GIN trigram indexes serve both prefix and substring patterns.
+--
+-- Apply in one transaction:
+--     psql -1 -f sql/migrations/001_name_search_indexes.sql
+--
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public;
+
+CREATE INDEX IF NOT EXISTS samples_name_trgm_idx ON public.samples USING gin (name public.gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS panels_name_trgm_idx ON public.panels USING gin (name public.gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS materials_name_trgm_idx ON public.materials USING gin (name public.gin_trgm_ops);
+
+INSERT INTO meta.migrations (version, name) VALUES ('001', 'name_search_indexes') ON CONFLICT (version) DO NOTHING;